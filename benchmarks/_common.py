@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmark scripts (run as python
+benchmarks/bench_*.py, so this directory is on sys.path).
+"""
+
+import subprocess
+import sys
+import time
+
+PEAK_RSS_CASE = """
+import resource, time
+{setup}
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(before, after, elapsed)
+"""
+
+
+def timed(f, *args, **kwargs):
+    """f(*args, **kwargs) and the seconds it took"""
+    start = time.perf_counter()
+    rval = f(*args, **kwargs)
+    return rval, time.perf_counter() - start
+
+
+def peak_rss(setup, statement):
+    """Run setup and then statement in a fresh process, since peak RSS
+    can't be reset: peak RSS in MB before and after the statement, and
+    the seconds it took.
+    """
+    code = PEAK_RSS_CASE.format(setup=setup.strip(), statement=statement.strip())
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                         text=True, check=True).stdout
+    before, after, elapsed = out.split()
+    return int(before) / 1024, int(after) / 1024, float(elapsed)  # kB -> MB
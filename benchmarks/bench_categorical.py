@@ -0,0 +1,73 @@
+"""Categorical recoders (to_categorical, to_noyes, to_sex, to_recist,
+to_other_specify) on low-cardinality string columns: recoding the unique
+values only vs the previous row-wise string operations.
+
+Usage: python benchmarks/bench_categorical.py [nrows]
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import pylbmisc as lb
+
+from _common import timed
+
+
+def rowwise_to_categorical(x, levels=None):
+    if levels is None:
+        levels = x.value_counts(sort=True, ascending=False).index.to_list()
+    return pd.Categorical(x.map(dict(zip(levels, levels))), categories=levels)
+
+
+def rowwise_to_noyes(x):
+    tmp = x.str.strip().str.lower().str[0]
+    tmp[tmp == "s"] = "y"
+    tmp = tmp.replace({"0": "n", "1": "y"})
+    return rowwise_to_categorical(tmp.map({"n": "no", "y": "yes"}),
+                                  levels=["no", "yes"])
+
+
+def rowwise_to_sex(x):
+    tmp = x.str.strip().str.lower().str[0].map({"m": "male", "f": "female"})
+    return rowwise_to_categorical(tmp, levels=["male", "female"])
+
+
+def rowwise_to_recist(x):
+    tmp = x.str.strip().str.upper().str[:2].replace({"RC": "CR", "RP": "PR"})
+    return rowwise_to_categorical(tmp, levels=["CR", "PR", "SD", "PD"])
+
+
+def rowwise_to_other_specify(x):
+    nas = (x.isna()) | (x == "")
+    tmp = x.copy().astype("str").str.strip().str.lower()
+    tmp[nas] = pd.NA
+    return rowwise_to_categorical(tmp, levels=list(tmp.value_counts().index))
+
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    rng = np.random.default_rng(0)
+
+    def column(pool):
+        return pd.Series(np.array(pool, dtype=object)[rng.integers(0, len(pool), nrows)])
+
+    cases = [
+        ("to_categorical", column(["a", "b", "c", "d", np.nan]),
+         rowwise_to_categorical, lb.dm.to_categorical),
+        ("to_noyes", column(["yes", "no", " Si", "N", "", np.nan]),
+         rowwise_to_noyes, lb.dm.to_noyes),
+        ("to_sex", column(["M", "f", " male", "Femmina", np.nan]),
+         rowwise_to_sex, lb.dm.to_sex),
+        ("to_recist", column(["RC", "pd", " sd", "PR", "rp", np.nan]),
+         rowwise_to_recist, lb.dm.to_recist),
+        ("to_other_specify", column(["Foo", "bar ", "baz", "", np.nan]),
+         rowwise_to_other_specify, lb.dm.to_other_specify),
+    ]
+    print(f"{nrows} rows, seconds")
+    for fname, x, old, new in cases:
+        expected, old_time = timed(old, x)
+        result, new_time = timed(new, x)
+        pd.testing.assert_extension_array_equal(result, expected)
+        print(f"{fname:>16}: row-wise {old_time:6.2f}, uniques {new_time:6.2f} "
+              f"(x{old_time / new_time:.1f})")
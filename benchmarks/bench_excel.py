@@ -0,0 +1,71 @@
+"""import_data on a 50-sheet, 200k-row xlsx: the previous path
+(pd.read_excel of every sheet) vs the pandas and stream excel readers, on
+the whole workbook and on a subset (5 sheets, 3 columns, 1000 rows).
+
+The workbook is written once (it takes a while) and reused.
+
+Usage: python benchmarks/bench_excel.py [nsheets] [nrows] [ncols]
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pylbmisc as lb
+
+from _common import timed
+
+
+def make_workbook(fpath, nsheets, nrows, ncols):
+    rng = np.random.default_rng(0)
+    wb = openpyxl.Workbook(write_only=True)
+    for s in range(nsheets):
+        ws = wb.create_sheet(f"sheet{s}")
+        ws.append(["id", "group"] + [f"x{j}" for j in range(ncols - 2)])
+        values = rng.normal(size=(nrows, ncols - 2)).round(3)
+        for i in range(nrows):
+            ws.append([i, f"g{i % 7}"] + values[i].tolist())
+    wb.save(fpath)
+
+
+def check(result, expected, fpath):
+    # import_data names datasets as file_sheet
+    prefix = os.path.splitext(os.path.basename(fpath))[0] + "_"
+    result = {k.removeprefix(prefix): v for k, v in result.items()}
+    assert list(result) == list(expected)
+    for k, v in expected.items():
+        pd.testing.assert_frame_equal(result[k], v)
+
+
+if __name__ == "__main__":
+    nsheets = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    nrows = int(sys.argv[2]) if len(sys.argv) > 2 else 4_000
+    ncols = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    fpath = os.path.join(tempfile.gettempdir(),
+                         f"bench_excel_{nsheets}_{nrows}_{ncols}.xlsx")
+    if not os.path.exists(fpath):
+        make_workbook(fpath, nsheets, nrows, ncols)
+    kwargs = {"dtype_backend": "pyarrow"}
+    subset = {"sheets": [f"sheet{s}" for s in range(0, nsheets, nsheets // 5)],
+              "excel_kwargs": {**kwargs, "usecols": "A:C", "nrows": 1000}}
+    print(f"{nsheets} sheets x {nrows} rows x {ncols} cols, seconds")
+    expected, old_time = timed(lambda: pd.read_excel(fpath, None, **kwargs))
+    print(f"all sheets, read_excel       : {old_time:6.2f}")
+    for reader in ["pandas", "stream"]:
+        result, new_time = timed(lambda: lb.io.import_data(
+            fpath, excel_kwargs=kwargs, excel_reader=reader,
+            rm_common_prefix=False))
+        check(result, expected, fpath)
+        print(f"all sheets, {reader:>6} reader    : {new_time:6.2f} "
+              f"(x{old_time / new_time:.1f})")
+    expected = {k: v.iloc[:1000, :3] for k, v in expected.items()
+                if k in subset["sheets"]}
+    for reader in ["pandas", "stream"]:
+        result, new_time = timed(lambda: lb.io.import_data(
+            fpath, excel_reader=reader, rm_common_prefix=False, **subset))
+        check(result, expected, fpath)
+        print(f"subset,     {reader:>6} reader    : {new_time:6.2f} "
+              f"(x{old_time / new_time:.1f})")
@@ -0,0 +1,43 @@
+"""export_data of a dict of DataFrames in the default formats (xlsx, csv,
+pkl, R, feather): one file after the other (max_workers=1) vs
+concurrently.
+
+Usage: python benchmarks/bench_export.py [ntables] [nrows]
+"""
+
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pylbmisc as lb
+
+from _common import timed
+
+
+def make_tables(ntables, nrows):
+    rng = np.random.default_rng(0)
+    return {f"tab{t}": pd.DataFrame({
+        "id": np.arange(nrows),
+        "x": rng.normal(size=nrows),
+        "group": pd.Categorical.from_codes(rng.integers(0, 3, nrows), ["a", "b", "c"]),
+        "when": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1000, nrows), "D"),
+        "note": rng.choice(["x", "y", "z"], nrows),
+    }) for t in range(ntables)}
+
+
+def export_seconds(tables, max_workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        _, elapsed = timed(lb.io.export_data, tables, tmp + "/tables", max_workers=max_workers)
+    return elapsed
+
+
+if __name__ == "__main__":
+    ntables = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    nrows = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    tables = make_tables(ntables, nrows)
+    print(f"{ntables} tables x {nrows} rows, seconds")
+    old_time = export_seconds(tables, max_workers=1)
+    print(f"sequential : {old_time:6.2f}")
+    new_time = export_seconds(tables, max_workers=None)
+    print(f"concurrent : {new_time:6.2f} (x{old_time / new_time:.1f})")
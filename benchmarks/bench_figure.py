@@ -0,0 +1,53 @@
+"""export_figure of a scatter plot in eps, png and pdf: one savefig per
+format (the previous path) vs export_figure (png from a single Agg
+rendering, vector formats in worker processes) vs an unchanged figure
+(left untouched, as recorded in the artifact manifest).
+
+Usage: python benchmarks/bench_figure.py [nfigures] [npoints]
+"""
+
+import io
+import sys
+import tempfile
+
+import numpy as np
+import pylbmisc as lb
+from matplotlib.figure import Figure
+
+from _common import timed
+
+
+def make_figure(npoints, seed):
+    fig = Figure()
+    ax = fig.subplots()
+    rng = np.random.default_rng(seed)
+    ax.scatter(*rng.normal(size=(2, npoints)), s=2)
+    ax.set_title(f"Figure {seed}")
+    # first draw (text layout caches) out of the timings
+    fig.savefig(io.BytesIO(), format="rgba")
+    return fig
+
+
+def savefig_each(fig, fdir, label):
+    for ext in ["eps", "png", "pdf"]:
+        fig.savefig(f"{fdir}/{label}.{ext}", transparent=True)
+
+
+def export_all(figures, fdir, export):
+    for i, fig in enumerate(figures):
+        export(fig, fdir, f"fig{i}")
+
+
+if __name__ == "__main__":
+    nfigures = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    npoints = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    figures = [make_figure(npoints, i) for i in range(nfigures)]
+    print(f"{nfigures} figures x {npoints} points, seconds")
+    with tempfile.TemporaryDirectory() as tmp:
+        _, old_time = timed(export_all, figures, tmp, savefig_each)
+        print(f"savefig per format : {old_time:6.2f}")
+        for what, kwargs in [("export_figure      ", {"force": True}),
+                             ("unchanged, skipped ", {})]:
+            _, new_time = timed(export_all, figures, tmp, lambda fig, fdir, label: lb.io.export_figure(
+                fig, fdir, label, latex_include=False, **kwargs))
+            print(f"{what}: {new_time:6.2f} (x{old_time / new_time:.1f})")
@@ -0,0 +1,72 @@
+"""Kaplan-Meier estimates over many subgroups: a lifelines fit per group
+(as km did) vs km_estimates, which sorts once and estimates all the
+groups with vectorized operations.
+
+Then plots of many groupings: km(plot=True) and savefig of the pyplot
+figure, one grouping at a time, vs km_many (Agg figures in worker
+processes); the figures left open in pyplot are counted too.
+
+Usage: python benchmarks/bench_km.py [nrows] [ngroups] [ngroupings]
+"""
+
+import os
+import sys
+import tempfile
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pylbmisc as lb
+from lifelines import KaplanMeierFitter
+
+from _common import timed
+
+
+def lifelines_km(t, s, g):
+    rval = {}
+    for categ in g.cat.categories:
+        mask = g == categ
+        fit = KaplanMeierFitter().fit(t[mask], s[mask])
+        rval[categ] = pd.concat([fit.survival_function_,
+                                 fit.confidence_interval_], axis="columns")
+    return rval
+
+
+def pyplot_km(df, groupings, plot_dir):
+    for grouping in groupings:
+        lb.surv.km(df["t"], df["s"], df[grouping])
+        plt.gcf().savefig(os.path.join(plot_dir, f"km_{grouping}.png"))
+
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ngroups = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = np.random.default_rng(0)
+    t = pd.Series(rng.exponential(24, nrows).round(1))
+    s = pd.Series(rng.integers(0, 2, nrows))
+    g = pd.Series(pd.Categorical(rng.integers(0, ngroups, nrows)))
+    print(f"{nrows} rows, {ngroups} groups, seconds")
+    expected, old_time = timed(lifelines_km, t, s, g)
+    result, new_time = timed(lb.surv.km_estimates, t, s, g)
+    for categ, v in expected.items():
+        np.testing.assert_allclose(result["estimates"][categ].iloc[:, 1:],
+                                   v.to_numpy(), rtol=1e-9)
+    print(f"lifelines per group: {old_time:6.2f}, km_estimates {new_time:6.2f} "
+          f"(x{old_time / new_time:.1f})")
+
+    ngroupings = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    matplotlib.use("agg")
+    df = pd.DataFrame({"t": t, "s": s})
+    for i in range(ngroupings):
+        df[f"g{i}"] = pd.Categorical(rng.integers(0, 4, nrows))
+    groupings = [f"g{i}" for i in range(ngroupings)]
+    print(f"{ngroupings} groupings (4 groups each) plotted to png, seconds")
+    with tempfile.TemporaryDirectory() as tmp:
+        _, old_time = timed(pyplot_km, df, groupings, tmp)
+        open_figures = len(plt.get_fignums())
+        plt.close("all")
+        _, new_time = timed(lambda: lb.surv.km_many(
+            df, "t", "s", groups=groupings, plot_dir=tmp))
+    print(f"km + savefig: {old_time:6.2f} ({open_figures} figures left open), "
+          f"km_many {new_time:6.2f} ({len(plt.get_fignums())} left open)")
@@ -0,0 +1,61 @@
+"""Rendering a dict of tables as LaTeX: DataFrame.to_latex per table (the
+previous path, needs jinja2) vs latex_tables; and escaping strings one
+character at a time (previous _latex_escape) vs str.translate.
+
+Usage: python benchmarks/bench_latex.py [ntables] [nrows]
+"""
+
+import importlib.util
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+import pylbmisc as lb
+from pylbmisc.io import _latex_escape, _latex_special_chars
+
+from _common import timed
+
+
+def make_tables(ntables, nrows):
+    rng = np.random.default_rng(0)
+    return {f"Tabella {t}": pd.DataFrame({
+        "n": rng.integers(0, 100, nrows),
+        "mean": rng.normal(size=nrows),
+        "sd": rng.random(nrows),
+        "group": rng.choice(["a_1", "b & c", "50%"], nrows),
+    }, index=[f"var_{i}" for i in range(nrows)]) for t in range(ntables)}
+
+
+def to_latex_tables(tables):
+    out = io.StringIO()
+    for caption, tab in tables.items():
+        label = lb.dm.fix_varnames(caption)
+        print(tab.to_latex(na_rep="", index=True, index_names=False, escape=True,
+                           label="tab:" + label, caption=_latex_escape(caption),
+                           float_format="%.1f", column_format="lrrrr"),
+              file=out)
+    return out
+
+
+def old_escape(s):
+    return "".join(_latex_special_chars.get(c, c) for c in str(s))
+
+
+if __name__ == "__main__":
+    ntables = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    nrows = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    tables = make_tables(ntables, nrows)
+    print(f"{ntables} tables x {nrows} rows, seconds")
+    _, new_time = timed(lb.io.latex_tables, tables, io.StringIO())
+    if importlib.util.find_spec("jinja2") is not None:
+        _, old_time = timed(to_latex_tables, tables)
+        print(f"to_latex     : {old_time:6.2f}")
+        print(f"latex_tables : {new_time:6.2f} (x{old_time / new_time:.1f})")
+    else:
+        print(f"latex_tables : {new_time:6.2f} (to_latex needs jinja2)")
+    strings = [f"var_{i} & 50% ~{{x}}" for i in range(200_000)]
+    _, old_time = timed(lambda: [old_escape(s) for s in strings])
+    _, new_time = timed(lambda: [_latex_escape(s) for s in strings])
+    print(f"escape 200k strings: join {old_time:6.2f}, translate {new_time:6.2f} "
+          f"(x{old_time / new_time:.1f})")
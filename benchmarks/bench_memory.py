@@ -0,0 +1,42 @@
+"""Peak RSS of fix_varnames and Coercer.coerce on a wide synthetic frame,
+copying the data (copy=True) or sharing it (copy=False, with pandas
+Copy-on-Write enabled).
+
+Each case runs in a fresh process, since peak RSS can't be reset.
+
+Usage: python benchmarks/bench_memory.py [nrows] [ncols]
+"""
+
+import sys
+
+from _common import peak_rss
+
+SETUP = """
+import numpy as np, pandas as pd, pylbmisc as lb
+nrows, ncols, copy = {nrows}, {ncols}, {copy}
+pd.set_option("mode.copy_on_write", not copy)
+# filled in place, to avoid transient copies inflating the peak before
+data = np.empty((nrows, ncols))
+np.random.default_rng(0).random(out=data)
+df = pd.DataFrame(data, columns=[f"Var {{i}}" for i in range(ncols)], copy=False)
+"""
+
+STATEMENTS = {
+    "fix_varnames": "res = lb.dm.fix_varnames(df, copy=copy)",
+    "coerce": """
+coercer = lb.dm.Coercer(df, fv={lb.dm.to_numeric: ["Var 0"]}, verbose=False)
+res = coercer.coerce(copy=copy)
+""",
+}
+
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ncols = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    print(f"{nrows} rows x {ncols} cols, peak RSS in MB")
+    for what in ["fix_varnames", "coerce"]:
+        for copy in [True, False]:
+            setup = SETUP.format(nrows=nrows, ncols=ncols, copy=copy)
+            before, after, _ = peak_rss(setup, STATEMENTS[what])
+            print(f"{what:>12} copy={copy!s:<5}: before {before:8.1f}, "
+                  f"after {after:8.1f} (+{after - before:.1f})")
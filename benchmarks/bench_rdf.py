@@ -0,0 +1,40 @@
+"""export_data(ext="R") and export_data(ext="parquet") time and peak RSS
+over the data frame itself, for growing numbers of rows: columns are
+written by chunks, so the extra memory should stay flat.
+
+Each case runs in a fresh process, since peak RSS can't be reset.
+
+Usage: python benchmarks/bench_rdf.py [nrows ...]
+"""
+
+import sys
+
+from _common import peak_rss
+
+SETUP = """
+import tempfile, numpy as np, pandas as pd, pylbmisc as lb
+nrows = {nrows}
+rng = np.random.default_rng(0)
+df = pd.DataFrame({{
+    "id": np.arange(nrows),
+    "x": rng.normal(size=nrows),
+    "group": pd.Categorical.from_codes(rng.integers(0, 3, nrows), ["a", "b", 'c"']),
+    "when": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1000, nrows), "D"),
+    "note": pd.array(rng.choice(["x", 'say "hi"', None], nrows), dtype="string[pyarrow]"),
+}})
+"""
+
+EXPORT = """
+with tempfile.TemporaryDirectory() as tmp:
+    lb.io.export_data(df, tmp + "/df", ext={ext!r})
+"""
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [1_000_000, 10_000_000]
+    print("rows: seconds, peak RSS in MB (data frame, extra for the export)")
+    for ext in ["R", "parquet"]:
+        for nrows in sizes:
+            before, after, elapsed = peak_rss(SETUP.format(nrows=nrows), EXPORT.format(ext=ext))
+            print(f"{ext:>7} {nrows:>10}: {elapsed:6.2f}s, "
+                  f"{before:8.1f} +{after - before:.1f}")
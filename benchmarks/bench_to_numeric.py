@@ -0,0 +1,49 @@
+"""to_numeric/to_integer on string columns: Arrow compute path vs the
+previous pandas one (astype(str).str.replace + pd.to_numeric).
+
+Usage: python benchmarks/bench_to_numeric.py [nrows]
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import pylbmisc as lb
+
+from _common import timed
+
+
+def pandas_replace_comma(x):
+    nas = (x.isna()) | (x == "")
+    rval = x.astype("str").str.replace(",", ".")
+    rval[nas] = pd.NA
+    return rval
+
+
+def pandas_to_numeric(x):
+    return pd.to_numeric(pandas_replace_comma(x), errors="coerce",
+                         dtype_backend="pyarrow")
+
+
+def pandas_to_integer(x):
+    return pd.to_numeric(pandas_replace_comma(x), errors="coerce").astype("Int64")
+
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    rng = np.random.default_rng(0)
+    floats = pd.Series(rng.normal(100, 30, nrows).round(2).astype(str),
+                       dtype="string[pyarrow]").str.replace(".", ",", regex=False)
+    ints = pd.Series(rng.integers(0, 10**6, nrows).astype(str), dtype="string[pyarrow]")
+    floats[::100] = ""
+    ints[::100] = pd.NA
+    cases = [("to_numeric", "floats", floats, pandas_to_numeric, lb.dm.to_numeric),
+             ("to_numeric", "ints", ints, pandas_to_numeric, lb.dm.to_numeric),
+             ("to_integer", "ints", ints, pandas_to_integer, lb.dm.to_integer)]
+    print(f"{nrows} rows, seconds")
+    for fname, data, x, old, new in cases:
+        expected, old_time = timed(old, x)
+        result, new_time = timed(new, x)
+        pd.testing.assert_series_equal(result, expected)
+        print(f"{fname} {data:>6}: pandas {old_time:6.2f}, arrow {new_time:6.2f} "
+              f"(x{old_time / new_time:.1f})")
@@ -0,0 +1,43 @@
+"""export_data(ext="xlsx") time and peak RSS over the data frame itself
+with each xlsx engine: the pandas ExcelWriter keeps every cell in memory,
+the openpyxl and xlsxwriter ones write rows by chunks.
+
+Each case runs in a fresh process, since peak RSS can't be reset.
+
+Usage: python benchmarks/bench_xlsx.py [nrows]
+"""
+
+import importlib.util
+import sys
+
+from _common import peak_rss
+
+SETUP = """
+import tempfile, numpy as np, pandas as pd, pylbmisc as lb
+nrows = {nrows}
+rng = np.random.default_rng(0)
+df = pd.DataFrame({{
+    "id": np.arange(nrows),
+    "x": rng.normal(size=nrows),
+    "group": pd.Categorical.from_codes(rng.integers(0, 3, nrows), ["a", "b", "c"]),
+    "when": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1000, nrows), "D"),
+    "note": rng.choice(["x", "y", "z"], nrows),
+}})
+"""
+
+EXPORT = """
+with tempfile.TemporaryDirectory() as tmp:
+    lb.io.export_data(df, tmp + "/df.xlsx", xlsx_engine={engine!r})
+"""
+
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    engines = ["pandas", "openpyxl"]
+    if importlib.util.find_spec("xlsxwriter") is not None:
+        engines.append("xlsxwriter")
+    print(f"{nrows} rows: seconds, peak RSS in MB (data frame, extra for the export)")
+    setup = SETUP.format(nrows=nrows)
+    for engine in engines:
+        before, after, elapsed = peak_rss(setup, EXPORT.format(engine=engine))
+        print(f"{engine:>10}: {elapsed:6.2f}s, {before:8.1f} +{after - before:.1f}")
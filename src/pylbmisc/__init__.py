@@ -2,11 +2,25 @@
 #
 # SPDX-License-Identifier: MIT
 
-from pylbmisc import datasets, dm, fig, io, iter, rand, r, \
-    stats, surv, tg, utils
+import importlib as _importlib
 
 # from pylbmisc.__about__ import __version__
 
 
 __all__ = ["datasets", "dm", "fig", "io", "iter", "rand", "stats", "surv",
            "tg", "utils", "r"]
+
+
+# submodules are imported lazily (PEP 562): a plain `import pylbmisc` does
+# not pull in pandas/matplotlib/lifelines/scipy until the first time a
+# submodule is actually used (eg lb.dm.to_numeric)
+def __getattr__(name):
+    if name in __all__:
+        return _importlib.import_module(f"pylbmisc.{name}")
+    msg = f"module 'pylbmisc' has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+def __dir__():
+    dunders = [g for g in globals() if g.startswith("__")]
+    return sorted(dunders + __all__)
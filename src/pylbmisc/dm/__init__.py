@@ -2,17 +2,26 @@
 
 import functools as _functools
 import inspect as _inspect
+import json as _json
 import numpy as _np
 import pandas as _pd
+# loaded by pandas anyway (pandas.compat.pyarrow): pyarrow.parquet, which
+# isn't, is imported by the functions using it
 import pyarrow as _pa
+import pyarrow.compute as _pc
 import re as _re
 import string as _string
+import warnings as _warnings
 import datetime as _dt
 
 from collections import Counter as _Counter
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 from functools import singledispatch as _singledispatch
+from pandas.tseries.api import guess_datetime_format as _guess_datetime_format
 from pathlib import Path as _Path
 from pprint import pprint as _pprint
+from pylbmisc.r import match_arg as _match_arg
 
 
 _default_dtype_backend = "pyarrow"
@@ -31,12 +40,6 @@ _fc_re = _re.compile(
 _tel_re = _re.compile(r"(.+)?0[0-9]{1,3}[\. /\-]?[0-9]{6,7}")
 _mobile_re = _re.compile(r"(.+)?3[0-9]{2}[\. /\-]?[0-9]{6,7}")
 
-
-_is_mobile_number = _np.vectorize(lambda x: bool(_mobile_re.match(x)))
-_is_telephone_number = _np.vectorize(lambda x: bool(_tel_re.match(x)))
-_is_email = _np.vectorize(lambda x: bool(_mail_re.match(x)))
-_is_fiscal_code = _np.vectorize(lambda x: bool(_fc_re.match(x)))
-
 # cleaning string that have to contain dates
 _dates_polish = _re.compile(r"[^/\d-]") # keep only numbers, - and /, and just hope for the best
 
@@ -83,17 +86,173 @@ def table2df(df: _pd.DataFrame) -> _pd.DataFrame:
     return x.rename(columns={0: "x"})
 
 
+class _HyperLogLog:
+    """HyperLogLog distinct counter fed with 64 bits hashes"""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.registers = _np.zeros(2**p, dtype="uint8")
+
+    def update(self, hashes: _np.ndarray):
+        hashes = hashes.astype("uint64", copy=False)
+        idx = (hashes >> _np.uint64(64 - self.p)).astype("int64")
+        rest = hashes & _np.uint64(2**(64 - self.p) - 1)
+        # bit length (via frexp exponent), on 53 bits to be exact as float
+        high = rest >> _np.uint64(11)
+        bit_length = _np.where(high > 0,
+                               _np.frexp(high.astype("float64"))[1] + 11,
+                               _np.frexp(rest.astype("float64"))[1])
+        rank = (64 - self.p) - bit_length + 1
+        _np.maximum.at(self.registers, idx, rank.astype("uint8"))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / _np.sum(2.0 ** -self.registers.astype("float64"))
+        zeros = _np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            estimate = m * _np.log(m / zeros)
+        return int(round(estimate))
+
+
+def _json_value(x):
+    # listed values in snapshots: numpy scalars to python, others to str
+    if isinstance(x, _np.generic):
+        x = x.item()
+    if isinstance(x, (str, bool, int, float)):
+        return x
+    return str(x)
+
+
+def _value_counts_chunk(x: _pd.Series) -> tuple[_pd.Series, bool]:
+    """Value counts of a chunk (missing values excluded) and whether values
+    are all strings (counted by pyarrow, much faster than pandas on object
+    data)"""
+    arr = _arrow_string_values(x)
+    if arr is not None:
+        counts = _pc.value_counts(_pc.drop_null(arr))
+        values = counts.field("values").to_numpy(zero_copy_only=False)
+        return _pd.Series(counts.field("counts").to_numpy(),
+                          index=_pd.Index(values, dtype=object)), True
+    counts = x.value_counts(sort=False, dropna=True)
+    counts = counts[counts > 0]  # unused categories
+    return counts.astype("int64"), False
+
+
+def _merge_counts(parts: list[_pd.Series], strings: bool) -> _pd.Series:
+    # values in order of first appearance, as value_counts(sort=False)
+    if len(parts) == 1:
+        return parts[0]
+    counts = _pd.concat(parts)
+    if strings:
+        table = (_pa.table({"value": _pa.array(counts.index, type=_pa.string()),
+                            "n": counts.to_numpy()})
+                 .group_by("value", use_threads=False)
+                 .aggregate([("n", "sum")]))
+        values = table["value"].to_numpy()
+        return _pd.Series(table["n_sum"].to_numpy(),
+                          index=_pd.Index(values, dtype=object))
+    # hash based groupby, no sorting of mixed types needed
+    return counts.groupby(level=0, sort=False, observed=True).sum()
+
+
+def _profile_column(x: _pd.Series,
+                    max_values: int | None,
+                    approx: bool,
+                    chunksize: int) -> dict:
+    """Distinct values of a Series processed by chunks of rows: only the
+    value counts are kept (the most frequent ones if approx, with distinct
+    values counted by HyperLogLog)"""
+    n_missing = 0
+    parts = []
+    strings = True
+    hll = _HyperLogLog() if approx else None
+    keep = None if max_values is None else 10 * max_values
+    for start in range(0, len(x), chunksize):
+        chunk = x.iloc[start:start + chunksize]
+        n_missing += int(chunk.isna().sum())
+        chunk_counts, chunk_strings = _value_counts_chunk(chunk)
+        strings = strings and chunk_strings
+        if approx:
+            # values are already unique, no need to categorize
+            hll.update(_pd.util.hash_array(chunk_counts.index.to_numpy(),
+                                           categorize=False))
+            if keep is not None:
+                # keep only candidates for the most frequent values
+                chunk_counts = chunk_counts.nlargest(keep)
+                counts = _merge_counts(parts + [chunk_counts], strings)
+                parts = [counts.nlargest(keep)]
+                continue
+        parts.append(chunk_counts)
+    if parts:
+        counts = _merge_counts(parts, strings)
+    else:  # no rows
+        counts = x.value_counts(sort=False)
+    n_distinct = hll.count() if approx else len(counts)
+    if is_string(x):
+        # strings by decreasing frequency
+        values = counts.sort_values(ascending=False, kind="stable").index
+    else:
+        try:
+            values = counts.index.sort_values()
+        except TypeError:  # mixed types
+            values = counts.sort_values(ascending=False, kind="stable").index
+    values = values.to_list()
+    truncated = max_values is not None and n_distinct > max_values
+    if max_values is not None:
+        values = values[:max_values]
+    return {"dtype": str(x.dtype),
+            "n": len(x),
+            "n_missing": n_missing,
+            "n_distinct": n_distinct,
+            "approx": approx,
+            "truncated": truncated,
+            "values": [_json_value(v) for v in values]}
+
+
 def dump_unique_values(dfs: _pd.DataFrame | dict[str, _pd.DataFrame],
-                       fpath: str | _Path = "data/uniq.txt"):
+                       fpath: str | _Path = "data/uniq.txt",
+                       max_values: int | None = 100,
+                       approx: bool = False,
+                       chunksize: int = 1_000_000,
+                       snapshot: str | _Path | None = None) -> dict:
     """Save unique value of a (dict of) dataframe for inspection and monitor
     during time.
 
+    Columns are processed by chunks of rows keeping only the (hash based)
+    value counts; with approx=True the number of distinct values is
+    estimated by HyperLogLog and only the most frequent values are kept, so
+    that memory stays bounded with high-cardinality columns (eg ids).
+
     Parameters
     ----------
     dfs:
         dataframe or dict of dataframes to be dumped
     fpath:
         path where to save the unique values
+    max_values:
+        maximum number of values listed per column (strings by decreasing
+        frequency, other types sorted); None to list them all
+    approx:
+        approximate distinct counting (HyperLogLog)
+    chunksize:
+        number of rows processed at once
+    snapshot:
+        path of a machine readable snapshot (.json or .parquet) to be
+        compared later with diff_unique_values
+
+    Returns
+    -------
+    the snapshot, as a dict
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> df = pd.DataFrame({"x": ["a", "b", "a"]})
+    >>> snap = dump_unique_values(df, fpath="/tmp/uniq.txt")
+    >>> snap["frames"]["df"]["x"]["values"]
+    ['a', 'b']
     """
     if not isinstance(dfs, (_pd.DataFrame, dict)):
         msg = "x deve essere un pd.DataFrame o un dict di pd.DataFrame"
@@ -101,29 +260,129 @@ def dump_unique_values(dfs: _pd.DataFrame | dict[str, _pd.DataFrame],
     # normalize single dataframe
     if isinstance(dfs, _pd.DataFrame):
         dfs = {"df": dfs}
-        # output
+    frames = {}
+    for df_lab, df in dfs.items():
+        frames[df_lab] = {str(col): _profile_column(df[col], max_values,
+                                                    approx, chunksize)
+                          for col in df}
+    rval = {"created": _dt.datetime.now().isoformat(timespec="seconds"),
+            "frames": frames}
+    # output
     outfile = _Path(fpath)
     with outfile.open("w") as f:
-        for df_lab, df in dfs.items():
-            for col in df:
+        for df_lab, profiles in frames.items():
+            for col, prof in profiles.items():
                 # Header
+                n_distinct = ("~" if prof["approx"] else "") + str(prof["n_distinct"])
                 print(f"DataFrame: '{df_lab}', "
                       f"Column: '{col}', "
-                      f"Dtype: {df[col].dtype}, "
-                      f"Unique values:",
+                      f"Dtype: {prof['dtype']}, "
+                      f"Unique values ({n_distinct}, "
+                      f"{prof['n_missing']} missing):",
                       file=f)
-                # Dati: non sortati perché ci sono problemi se i dati sono metà
-                # numerici e meta stringa? bah ci riprovo
-                if is_string(df[col]):
-                    _pprint(df[col].value_counts().index.to_list(),
-                            stream=f,
-                            compact=True)
-                else:
-                    _pprint(df[col].sort_values().unique().tolist(),
-                            stream=f,
-                            compact=True)
+                _pprint(prof["values"], stream=f, compact=True)
+                if prof["truncated"]:
+                    print(f"... (first {len(prof['values'])} listed)", file=f)
                 print(file=f)
             print("-"*80 + "\n\n", file=f)
+    if snapshot is not None:
+        _write_snapshot(rval, snapshot)
+    return rval
+
+
+_snapshot_columns = ["frame", "column", "dtype", "n", "n_missing",
+                     "n_distinct", "approx", "truncated", "values"]
+
+
+def _write_snapshot(snap: dict, fpath: str | _Path):
+    fpath = _Path(fpath)
+    if fpath.suffix == ".parquet":
+        rows = [{"frame": df_lab, "column": col, **prof,
+                 "values": _json.dumps(prof["values"])}
+                for df_lab, profiles in snap["frames"].items()
+                for col, prof in profiles.items()]
+        table = _pa.Table.from_pandas(
+            _pd.DataFrame(rows, columns=_snapshot_columns), preserve_index=False
+        ).replace_schema_metadata({"created": snap["created"]})
+        import pyarrow.parquet as _pq
+        _pq.write_table(table, fpath)
+    else:
+        with fpath.open("w") as f:
+            _json.dump(snap, f, indent=1)
+
+
+def _read_snapshot(snap: dict | str | _Path) -> dict:
+    if isinstance(snap, dict):
+        return snap
+    fpath = _Path(snap)
+    if fpath.suffix == ".parquet":
+        import pyarrow.parquet as _pq
+        table = _pq.read_table(fpath)
+        frames = {}
+        for row in table.to_pylist():
+            prof = {k: row[k] for k in _snapshot_columns[2:]}
+            prof["values"] = _json.loads(prof["values"])
+            frames.setdefault(row["frame"], {})[row["column"]] = prof
+        created = (table.schema.metadata or {}).get(b"created", b"").decode()
+        return {"created": created, "frames": frames}
+    with fpath.open() as f:
+        return _json.load(f)
+
+
+def diff_unique_values(old: dict | str | _Path,
+                       new: dict | str | _Path) -> _pd.DataFrame:
+    """Compare two snapshots made by dump_unique_values (without rescanning
+    the data)
+
+    Listed values are compared only for columns whose values were all
+    listed in both snapshots.
+
+    Parameters
+    ----------
+    old:
+        previous snapshot (dict or path to .json/.parquet)
+    new:
+        current snapshot (dict or path to .json/.parquet)
+
+    Returns
+    -------
+    a DataFrame with a row for each change found (frame, column, change,
+    old, new)
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> old = dump_unique_values(pd.DataFrame({"x": ["a", "b"]}), "/tmp/uniq.txt")
+    >>> new = dump_unique_values(pd.DataFrame({"x": ["a", "c"]}), "/tmp/uniq.txt")
+    >>> diff_unique_values(old, new)
+      frame column          change   old  new
+    0    df      x      new values  None  [c]
+    1    df      x  dropped values  None  [b]
+    """
+    old = _read_snapshot(old)["frames"]
+    new = _read_snapshot(new)["frames"]
+    rows = []
+    for df_lab in list(dict.fromkeys([*old, *new])):
+        old_cols, new_cols = old.get(df_lab, {}), new.get(df_lab, {})
+        for col in list(dict.fromkeys([*old_cols, *new_cols])):
+            if col not in new_cols:
+                rows.append((df_lab, col, "removed column", None, None))
+                continue
+            if col not in old_cols:
+                rows.append((df_lab, col, "added column", None, None))
+                continue
+            o, n = old_cols[col], new_cols[col]
+            for what in ["dtype", "n", "n_missing", "n_distinct"]:
+                if o[what] != n[what]:
+                    rows.append((df_lab, col, what, o[what], n[what]))
+            if not (o["truncated"] or n["truncated"]):
+                added = [v for v in n["values"] if v not in o["values"]]
+                dropped = [v for v in o["values"] if v not in n["values"]]
+                if added:
+                    rows.append((df_lab, col, "new values", None, added))
+                if dropped:
+                    rows.append((df_lab, col, "dropped values", None, dropped))
+    return _pd.DataFrame(rows, columns=["frame", "column", "change", "old", "new"])
 
 
 def names_list(dfs):
@@ -252,7 +511,7 @@ def is_categorical(x: _pd.Series) -> bool:
     x:
         the Series to be checked
     """
-    return _pd.api.types.is_categorical_dtype(x)
+    return isinstance(x.dtype, _pd.CategoricalDtype)
 
 
 def is_datetime(x: _pd.Series) -> bool:
@@ -280,7 +539,7 @@ def is_date(x: _pd.Series) -> bool:
 
     # otherwise check if all the times are zero; fix na for the sake of god:
     # don't put in all the comparison based on NA
-    zero_time = (x.dt.time == _dt.time(0, 0))
+    zero_time = (x.dt.normalize() == x)
     zero_time = zero_time[~ x.isna()]
     return zero_time.all()
 
@@ -301,80 +560,181 @@ def _columns_match(df_columns, searched):
     return perfect_match
 
 
+# Searching by data: all the patterns are screened in a single pass with one
+# combined (re.match-like, so anchored) regex, then only the hits are
+# classified by kind
+_pii_patterns = {
+    "email": _mail_re.pattern,
+    "fiscal_code": _fc_re.pattern,
+    "telephone": _tel_re.pattern,
+    "mobile": _mobile_re.pattern,
+}
+_pii_screen_re = "^(?:" + "|".join(_pii_patterns.values()) + ")"
+
+_pii_messages = {
+    "surname": "'{}' matches 'surname'/'cognome'.",
+    "name": "'{}' matches 'name'/'nome'.",
+    "email": "{} probably contains emails.",
+    "fiscal_code": "{} probably contains fiscal codes.",
+    "telephone": "{} probably contains telephone numbers.",
+    "mobile": "{} probably contains mobile phones numbers.",
+}
+
+
+def _as_arrow_strings(x: _pd.Series):
+    """Arrow string array of a string Series (zero-copy if already arrow)"""
+    try:
+        rval = _pa.array(x, from_pandas=True)
+    except (_pa.ArrowInvalid, _pa.ArrowTypeError):
+        # mixed object columns (eg strings and numbers)
+        rval = _pa.array(x.astype("string[pyarrow]"), from_pandas=True)
+    if not (_pa.types.is_string(rval.type) or _pa.types.is_large_string(rval.type)):
+        rval = rval.cast(_pa.string())
+    return rval
 
-def _has_emails(x: _pd.Series) -> bool:
-    """ Check if a Series has e-mail address
-
-    Parameters
-    ----------
-    x:
-        the Series to be checked
-
-    """
-    if is_string(x):
-        check = _is_email(x)
-        return bool(_np.any(check))
-    else:
-        return False
-
-
-
-def _has_fiscal_codes(x: _pd.Series) -> bool:
-    """Check if a Series has fiscal codes
-
-    Parameters
-    ----------
-    x:
-        the Series to be checked
-    """
-    if is_string(x):
-        check = _is_fiscal_code(x)
-        return bool(_np.any(check))
-    else:
-        return False
 
+def _pii_screen(arr) -> dict[str, _np.ndarray]:
+    """Return the positions in arr of the values matching each PII kind"""
+    hit_pos = _pc.indices_nonzero(_pc.match_substring_regex(arr, _pii_screen_re))
+    if len(hit_pos) == 0:
+        return {}
+    hits = arr.take(hit_pos)
+    hit_pos = hit_pos.to_numpy()
+    rval = {}
+    for kind, pattern in _pii_patterns.items():
+        is_kind = _pc.match_substring_regex(hits, f"^(?:{pattern})")
+        is_kind = is_kind.to_numpy(zero_copy_only=False)
+        if is_kind.any():
+            rval[kind] = hit_pos[is_kind]
+    return rval
 
 
-def _has_telephone_numbers(x: _pd.Series) -> bool:
-    """Check if a Series has telephone numbers
+def _pii_scan_column(arr,
+                     sample_size: int | None,
+                     seed: int,
+                     stop_early: bool,
+                     chunksize: int) -> dict[str, _np.ndarray]:
+    n = len(arr)
+    # screen a random sample first: columns with PII are usually caught
+    # here, the others are confirmed by the full scan below
+    if stop_early and (sample_size is not None) and (n > sample_size):
+        rng = _np.random.default_rng(seed)
+        idx = _np.sort(rng.choice(n, size=sample_size, replace=False))
+        found = _pii_screen(arr.take(idx))
+        if found:
+            return {kind: idx[pos] for kind, pos in found.items()}
+    # full scan, chunk by chunk
+    found = {}
+    for start in range(0, n, chunksize):
+        chunk_found = _pii_screen(arr.slice(start, chunksize))
+        for kind, pos in chunk_found.items():
+            found.setdefault(kind, []).append(pos + start)
+        if found and stop_early:
+            break
+    return {kind: _np.concatenate(pos) for kind, pos in found.items()}
+
+
+def pii_scan(x: _pd.DataFrame,
+             sample_size: int | None = None,
+             seed: int = 0,
+             stop_early: bool = True,
+             chunksize: int = 100_000,
+             max_rows: int = 5) -> _pd.DataFrame:
+    """Scan a DataFrame for probable piis (Personally Identifiable
+    Informations) and return a report.
+
+    Columns are checked by name (name/surname) and, if string, by data
+    (emails, fiscal codes, telephone and mobile numbers); data are scanned
+    in chunks with a single combined regex on Arrow strings.
 
     Parameters
     ----------
     x:
-        the Series to be checked
-
-    """
-    if is_string(x):
-        check = _is_telephone_number(x)
-        return bool(_np.any(check))
-    else:
-        return False
-
-
+        The DataFrame to check
+    sample_size:
+        if given (and stop_early), first screen a random sample of this size
+        for each column; columns without hits in the sample are then
+        fully scanned for confirmation
+    seed:
+        seed used for sampling
+    stop_early:
+        stop scanning a column at the first chunk (or sample) with hits;
+        if False the whole column is scanned and hits are exact counts
+    chunksize:
+        number of rows screened at a time
+    max_rows:
+        maximum number of row indexes reported for each column/kind
 
-def _has_mobile_numbers(x: _pd.Series) -> bool:
-    """Check if a Series has mobile numbers
+    Returns
+    -------
+    A pd.DataFrame with a row for each column/kind of PII found and
+    variables "column", "kind", "hits" (number of matching values found,
+    missing for name-based matches) and "rows" (list of index labels of
+    some matching rows)
 
-    Parameters
-    ----------
-    x:
-        the Series to be checked
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> df = pd.DataFrame({
+    ...     "id" : [1,2,3],
+    ...     "cognome": ["brazorv", "gigetti", "ginetti"],
+    ...     "mail": ["lgasd@asdkj.com", " asòdlk@asd.com", "aaaa"],
+    ...     "cel": ["3921231231", "aa", "eee"]
+    ...     })
+    >>> pii_scan(df)
+        column     kind  hits    rows
+    0  cognome  surname  <NA>      []
+    1     mail    email     2  [0, 1]
+    2      cel   mobile     1     [0]
     """
-    if is_string(x):
-        check = _is_mobile_number(x)
-        return bool(_np.any(check))
-    else:
-        return False
+    if not isinstance(x, _pd.DataFrame):
+        msg = "x must be a pd.DataFrame"
+        raise ValueError(msg)
 
+    col = list(x.columns.values)
+    col_clean = [str(c).lower().strip() for c in col]
+    surname_match = _columns_match(col_clean, ["cognome", "surname"])
+    name_match = _columns_match(col_clean, ["nome", "name"])
 
-def pii_find(x: _pd.DataFrame) -> list[str]:
+    report = []
+    for i, var in enumerate(col):
+        if surname_match[i]:
+            report.append((var, "surname", _pd.NA, []))
+        if name_match[i]:
+            report.append((var, "name", _pd.NA, []))
+        data = x.iloc[:, i]
+        if not is_string(data):
+            continue
+        found = _pii_scan_column(_as_arrow_strings(data),
+                                 sample_size=sample_size,
+                                 seed=seed,
+                                 stop_early=stop_early,
+                                 chunksize=chunksize)
+        for kind in _pii_patterns:  # keep kinds order
+            if kind in found:
+                pos = found[kind]
+                rows = data.index[pos[:max_rows]].to_list()
+                report.append((var, kind, len(pos), rows))
+    rval = _pd.DataFrame(report, columns=["column", "kind", "hits", "rows"])
+    return rval.astype({"hits": "Int64"})
+
+
+def pii_find(x: _pd.DataFrame,
+             sample_size: int | None = None,
+             seed: int = 0) -> list[str]:
     """Find columns with probable piis (Personally Identifiable
     Informations) and return the colnames for further processing.
 
+    See pii_scan for a structured report.
+
     Parameters
     ----------
     x:
         The DataFrame to check
+    sample_size:
+        as in pii_scan
+    seed:
+        as in pii_scan
 
     Returns
     -------
@@ -411,65 +771,10 @@ def pii_find(x: _pd.DataFrame) -> list[str]:
     2   3
     """
 
-    if not isinstance(x, _pd.DataFrame):
-        msg = "x must be a pd.DataFrame"
-        raise ValueError(msg)
-
-    col = list(x.columns.values)
-
-    # name and surname (looking at columns names)
-    col_clean = [c.lower().strip() for c in col]
-    surname_match = _columns_match(col_clean, ["cognome", "surname"])
-    name_match = _columns_match(col_clean, ["nome", "name"])
-
-    # finding other pii loking at data
-    has_mails = [_has_emails(x[c]) for c in col]
-    has_fcs = [_has_fiscal_codes(x[c]) for c in col]
-    has_telephones = [_has_telephone_numbers(x[c]) for c in col]
-    has_mobiles = [_has_mobile_numbers(x[c]) for c in col]
-
-    probable_pii = []
-    zipped = zip(
-        col,
-        surname_match,
-        name_match,
-        has_mails,
-        has_fcs,
-        has_telephones,
-        has_mobiles,
-    )
-    for (
-        var,
-        is_surname,
-        is_name,
-        has_mail,
-        has_fc,
-        has_telephone,
-        has_mobile,
-    ) in zipped:
-        pii_sum = (
-            is_surname
-            + is_name
-            + has_mail
-            + has_fc
-            + has_telephone
-            + has_mobile
-        )
-        if pii_sum:
-            probable_pii.append(var)
-            if is_surname:
-                print(f"'{var}' matches 'surname'/'cognome'.")
-            if is_name:
-                print(f"'{var}' matches 'name'/'nome'.")
-            if has_mail:
-                print(f"{var} probably contains emails.")
-            if has_fc:
-                print(f"{var} probably contains fiscal codes.")
-            if has_telephone:
-                print(f"{var} probably contains telephone numbers.")
-            if has_mobile:
-                print(f"{var} probably contains mobile phones numbers.")
-    return probable_pii
+    report = pii_scan(x, sample_size=sample_size, seed=seed)
+    for var, kind in zip(report["column"], report["kind"]):
+        print(_pii_messages[kind].format(var))
+    return list(dict.fromkeys(report["column"]))
 
 
 # -------------------------------------------------------------------------
@@ -477,6 +782,14 @@ def pii_find(x: _pd.DataFrame) -> list[str]:
 # -------------------------------------------------------------------------
 
 
+def _copy_needed(copy: bool | None) -> bool:
+    """Resolve a copy argument: by default data are copied unless pandas
+    Copy-on-Write is enabled (and sharing them is safe)"""
+    if copy is None:
+        return _pd.get_option("mode.copy_on_write") is not True
+    return copy
+
+
 def _compose(f, g):
     return lambda x: f(g(x))
 
@@ -556,6 +869,7 @@ def _fix_varnames_worker(vnames: list[str],
 def fix_varnames(x: str | list[str] | _pd.Series | _pd.DataFrame | dict[str, _pd.DataFrame],
                  return_tfd: bool = False,
                  make_unique: bool = True,
+                 copy: bool | None = None,
                  ):
     """The good-old R preprocess_varnames, working with strings,
     lists, pd.DataFrame or dicts of pd.DataFrames.
@@ -568,6 +882,9 @@ def fix_varnames(x: str | list[str] | _pd.Series | _pd.DataFrame | dict[str, _pd
         bool, return a dict of to/from descriptions
     make_unique:
         bool, assure returned varnames are unique by adding a progressive number as postfix
+    copy:
+        for DataFrame(s), copy the data or only relabel the columns sharing
+        the data with x; if None copy unless pandas Copy-on-Write is enabled
 
     Examples
     --------
@@ -604,8 +921,7 @@ def fix_varnames(x: str | list[str] | _pd.Series | _pd.DataFrame | dict[str, _pd
     elif isinstance(x, _pd.DataFrame):
         from_name = list(x.columns.values)
         to_name = _fix_varnames_worker(from_name, make_unique=make_unique)
-        df = x.copy()
-        df.columns = to_name
+        df = x.set_axis(to_name, axis="columns", copy=_copy_needed(copy))
         if return_tfd:
             tf = {t: f for t, f in zip(to_name, from_name)}
             return df, tf
@@ -617,8 +933,7 @@ def fix_varnames(x: str | list[str] | _pd.Series | _pd.DataFrame | dict[str, _pd
         for k, v in x.items():
             from_name = list(v.columns.values)
             to_name = _fix_varnames_worker(from_name, make_unique=make_unique)
-            df = v.copy()
-            df.columns = to_name
+            df = v.set_axis(to_name, axis="columns", copy=_copy_needed(copy))
             tf = {t: f for t, f in zip(to_name, from_name)}
             dfs[k] = df
             tfs[k] = tf
@@ -636,17 +951,25 @@ def fix_varnames(x: str | list[str] | _pd.Series | _pd.DataFrame | dict[str, _pd
 # -------------------------------------------------------------------------
 # Coercion stuff below
 # -------------------------------------------------------------------------
-# decorators
-def _verboser(f):
-    def transformer(x: _pd.Series):
-        coerced = f(x)
-        report = _pd.DataFrame({"original": x, "coerced": coerced})
-        new_na = (~_pd.isna(x)) & (_pd.isna(coerced))
-        if _np.any(new_na):
-            print("Please check if the following coercions are ok:")
-            print(report[new_na])
-        return coerced
-    return transformer
+# diagnostics
+_new_na_report_columns = ["variable", "new_na", "value", "count"]
+
+
+def _new_na_report(var, original: _pd.Series, coerced: _pd.Series,
+                   max_values: int) -> _pd.DataFrame | None:
+    """Tidy report of the (most frequent) values made missing by a coercion,
+    None if no missing values were introduced"""
+    new_na = _pd.notna(original).to_numpy() & _pd.isna(coerced).to_numpy()
+    n_new_na = int(new_na.sum())
+    if n_new_na == 0:
+        return None
+    counts = original[new_na].value_counts().head(max_values)
+    return _pd.DataFrame({
+        "variable": var,
+        "new_na": n_new_na,
+        "value": counts.index.astype(object),
+        "count": counts.to_numpy(),
+    })
 
 
 # --------------- coercion workers ----------------------------------------
@@ -708,8 +1031,78 @@ def to_bool(x=None) -> _pd.Series:
     return rval
 
 
+# Arrow fast path for strings to numbers: string columns are parsed with
+# pyarrow.compute, with validity masks reproducing pd.to_numeric(...,
+# errors="coerce") (anything not looking like a number becomes NA, a single
+# float-looking value makes the result double); values pyarrow can't decide
+# (eg "inf", integers overflowing int64) fall back to pd.to_numeric
+_int_re = r"^[0-9]+$"
+_float_re = r"^(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?$"
+
+
+def _arrow_string_values(x: _pd.Series):
+    """Arrow array of a Series made of strings only (and missing values),
+    None otherwise"""
+    if not is_string(x):
+        return None
+    try:
+        rval = _pa.array(x, from_pandas=True)
+    except (_pa.ArrowInvalid, _pa.ArrowTypeError):
+        return None
+    if _pa.types.is_null(rval.type):
+        return rval.cast(_pa.string())
+    if _pa.types.is_string(rval.type) or _pa.types.is_large_string(rval.type):
+        return rval
+    return None
+
+
+def _is_arrow_string(x: _pd.Series) -> bool:
+    return (isinstance(x.dtype, _pd.ArrowDtype)
+            and (_pa.types.is_string(x.dtype.pyarrow_dtype)
+                 or _pa.types.is_large_string(x.dtype.pyarrow_dtype)))
+
+
+def _parse_numbers_arrow(arr):
+    """Arrow strings (commas already replaced) to int64 or double, None if
+    pd.to_numeric is needed"""
+    arr = _pc.utf8_trim_whitespace(arr)
+    # the sign is handled apart, so that the same regexes work for casts
+    negative = _pc.starts_with(arr, "-")
+    unsigned = _pc.utf8_ltrim(arr, characters="+-")
+    signs = _pc.utf8_length(arr) - _pc.utf8_length(unsigned)
+    one_sign = _pc.less_equal(signs, 1)
+    is_float = _pc.and_kleene(_pc.match_substring_regex(unsigned, _float_re), one_sign)
+    is_float = _pc.fill_null(is_float, False)
+    # values which are not numbers: NA unless pd.to_numeric thinks otherwise
+    others = _pc.and_(_pc.is_valid(arr), _pc.invert(is_float))
+    if _pc.any(others).as_py():
+        uniques = _pc.unique(arr.filter(others)).to_pylist()
+        parsed = _pd.to_numeric(_pd.Series(uniques, dtype=object), errors="coerce")
+        if parsed.notna().any():
+            return None
+    is_int = _pc.and_(is_float, _pc.match_substring_regex(unsigned, _int_re))
+    all_int = _pc.sum(is_int).as_py() == _pc.sum(is_float).as_py()
+    valid = _pc.if_else(is_float, unsigned, _pa.scalar(None, unsigned.type))
+    if all_int:
+        try:
+            rval = _pc.cast(valid, _pa.int64())
+        except _pa.ArrowInvalid:  # overflow
+            return None
+        return _pc.if_else(negative, _pc.negate(rval), rval)
+    rval = _pc.cast(valid, _pa.float64(), safe=False)
+    # numbers out of double range are NA for pd.to_numeric
+    rval = _pc.if_else(_pc.is_inf(rval), _pa.scalar(None, _pa.float64()), rval)
+    return _pc.if_else(negative, _pc.negate(rval), rval)
+
+
 def _replace_comma(x: _pd.Series):
-    if is_string(x):
+    arr = _arrow_string_values(x)
+    if arr is not None:
+        arr = _pc.replace_substring(arr, ",", ".")
+        arr = _pc.if_else(_pc.equal(arr, ""), _pa.scalar(None, arr.type), arr)
+        return _pd.Series(_pd.arrays.ArrowExtensionArray(arr),
+                          index=x.index, name=x.name)
+    elif is_string(x):
         # nas = x.isin(["", _pd.NA, _np.nan])
         nas = (x.isna()) | (x == "")
         rval = x.astype("str").str.replace(",", ".")
@@ -719,6 +1112,20 @@ def _replace_comma(x: _pd.Series):
         return x
 
 
+def _replace_comma_many(xs: list[_pd.Series]) -> list[_pd.Series]:
+    """_replace_comma of several string Series with a single pass over
+    their concatenated values"""
+    replaced = _replace_comma(_pd.concat(xs, ignore_index=True))
+    rval = []
+    start = 0
+    for x in xs:
+        part = replaced.iloc[start:start + len(x)]
+        part.index = x.index
+        rval.append(part.rename(x.name))
+        start += len(x)
+    return rval
+
+
 # actually to_integer is used only by tteep to ensure, otherwise to_numeric
 # with pyarrow backend should handle both integers and floats gracefully and
 # there's no need for another function
@@ -755,7 +1162,22 @@ def to_integer(x=None) -> _pd.Series:
         raise ValueError(msg)
     if not isinstance(x, _pd.Series):
         x = _pd.Series(x)
-    s = _replace_comma(x)
+    return _to_integer_worker(_replace_comma(x))
+
+
+def _to_integer_worker(s: _pd.Series) -> _pd.Series:
+    # to_integer after _replace_comma
+    if _is_arrow_string(s):
+        num = _parse_numbers_arrow(_pa.array(s))
+        if num is not None and _pa.types.is_integer(num.type):
+            values = _pc.fill_null(num, 0).to_numpy()
+            mask = _pc.is_null(num).to_numpy(zero_copy_only=False)
+            return _pd.Series(_pd.arrays.IntegerArray(values, mask),
+                              index=s.index, name=s.name)
+        elif num is not None:
+            return _pd.Series(num.to_numpy(zero_copy_only=False),
+                              index=s.index, name=s.name).astype("Int64")
+        s = s.astype(object)
     # return _np.floor(_pd.to_numeric(s, errors='coerce')).astype('Int64')
     # mi fido piu di quella di sotto anche se fallisce con i numeri con virgola
     # (che ci può stare, per i quale bisogna usare np.floor)
@@ -809,7 +1231,17 @@ def to_numeric(x=None) -> _pd.Series:
         raise ValueError(msg)
     if not isinstance(x, _pd.Series):
         x = _pd.Series(x)
-    s = _replace_comma(x)
+    return _to_numeric_worker(_replace_comma(x))
+
+
+def _to_numeric_worker(s: _pd.Series) -> _pd.Series:
+    # to_numeric after _replace_comma
+    if _is_arrow_string(s):
+        num = _parse_numbers_arrow(_pa.array(s))
+        if num is not None:
+            return _pd.Series(_pd.arrays.ArrowExtensionArray(num),
+                              index=s.index, name=s.name)
+        s = s.astype(object)
     return _pd.to_numeric(s, errors="coerce",
                           dtype_backend=_default_dtype_backend)
 
@@ -873,21 +1305,80 @@ def to_date(x=None, *args, **kwargs) -> _pd.Series:
 
 
 def _extract_dates_worker(x):
-    if isinstance(x, str): # handle missing values (sono float)
-        polished = _dates_polish.sub("", x)
-        return _pd.to_datetime(polished)
-    else:
-        # return _np.nan
-        return _pd.NA
+    # single (polished) string to date, NaT if not parseable
+    with _warnings.catch_warnings():
+        _warnings.simplefilter("ignore")
+        return _pd.to_datetime(x, errors="coerce")
+
+
+def _guess_date_formats(uniques: _np.ndarray,
+                        counts: _np.ndarray,
+                        sample_size: int) -> list[str]:
+    """Date formats guessed from a sample of unique strings, by decreasing
+    number of rows"""
+    step = max(1, len(uniques) // sample_size)
+    freqs = {}
+    with _warnings.catch_warnings():
+        _warnings.simplefilter("ignore")
+        for u, n in zip(uniques[::step], counts[::step]):
+            fmt = _guess_datetime_format(u)
+            if fmt is not None:
+                freqs[fmt] = freqs.get(fmt, 0) + n
+    return sorted(freqs, key=freqs.get, reverse=True)
+
+
+def _parse_dates(uniques: _np.ndarray,
+                 counts: _np.ndarray,
+                 sample_size: int) -> _np.ndarray:
+    """Parse unique strings: groups sharing a format are parsed with one
+    to_datetime(format=...) call, dominant formats first; strings matching
+    no guessed format are parsed one by one"""
+    rval = _np.full(len(uniques), _np.datetime64("NaT"), dtype="datetime64[ns]")
+    todo = _np.arange(len(uniques))
+    tried = set()
+    while len(todo):
+        formats = [f for f in _guess_date_formats(uniques[todo], counts[todo], sample_size)
+                   if f not in tried]
+        if not formats:
+            break
+        for fmt in formats:
+            tried.add(fmt)
+            parsed = _pd.to_datetime(uniques[todo], format=fmt, errors="coerce")
+            ok = ~_np.asarray(parsed.isna())
+            rval[todo[ok]] = parsed[ok].as_unit("ns").to_numpy()
+            todo = todo[~ok]
+            if not len(todo):
+                break
+    for i in todo:
+        parsed = _extract_dates_worker(uniques[i])
+        if not _pd.isna(parsed):
+            rval[i] = parsed.as_unit("ns").to_datetime64()
+    return rval
 
 
-def extract_dates(x=None) -> _pd.Series:
+def extract_dates(x=None, sample_size: int = 1000) -> _pd.Series:
     """Try to extract dates from shitty strings and convert them to proper
 
+    Strings are cleaned (only numbers, - and / are kept) in bulk, the
+    dominant format(s) are guessed from a sample of the unique strings and
+    each unique string is parsed once (data have usually few distinct dates
+    repeated many times). Not parseable strings and non string data become
+    NaT.
+
+    Ambiguous dates (such as 01/02/2020) are read in the format of the
+    column, not on their own: formats are tried by decreasing number of
+    rows they are guessed for, and each string takes the first one it
+    parses with. An ambiguous string counts as month first (pandas'
+    guess), so in a column where day-first dates such as 13/02/2020 are
+    the majority 01/02/2020 is the 1st of February, otherwise it is the
+    2nd of January (and 13/02/2020 is still read day first).
+
     Parameters
     ----------
     x: Series or something coercible to
         data to be coerced
+    sample_size: int
+        number of unique strings used to guess formats
 
     Examples
     --------
@@ -905,7 +1396,60 @@ def extract_dates(x=None) -> _pd.Series:
         raise ValueError(msg)
     if not isinstance(x, _pd.Series):
         x = _pd.Series(x)
-    return x.apply(_extract_dates_worker)
+    arr = _arrow_string_values(x)
+    if arr is None:
+        # mixed data: dates only from strings (the others are missing)
+        is_str = _np.fromiter((isinstance(v, str) for v in x), bool, len(x))
+        arr = _pa.array(x.where(is_str), type=_pa.string(), from_pandas=True)
+    polished = _pc.replace_substring_regex(arr, _dates_polish.pattern, "")
+    codes, uniques = _pd.factorize(_pd.arrays.ArrowExtensionArray(polished))
+    uniques = _np.asarray(uniques, dtype=object)
+    counts = _np.bincount(codes[codes >= 0], minlength=len(uniques))
+    parsed = _parse_dates(uniques, counts, sample_size)
+    # trailing NaT: missing values (code -1) pick the last element
+    parsed = _np.append(parsed, _np.datetime64("NaT", "ns"))
+    rval = parsed[codes]
+    return _pd.Series(rval, index=x.index, name=x.name, dtype="datetime64[ns]")
+
+
+# Categorical recoders work on the unique values only: columns have usually
+# a handful of distinct values repeated many times, so x is factorized once,
+# the (string) recoding is applied to the uniques and the result is rebuilt
+# from the codes
+def _factorize(x: _pd.Series) -> tuple[_np.ndarray, _pd.Series, _np.ndarray]:
+    """Codes, unique values (missing ones included, in order of appearance)
+    and their counts"""
+    codes, uniques = _pd.factorize(x, use_na_sentinel=False)
+    counts = _np.bincount(codes, minlength=len(uniques))
+    return codes, _pd.Series(uniques), counts
+
+
+def _categorical_from_uniques(codes: _np.ndarray,
+                              uniques: _pd.Series,
+                              counts: _np.ndarray,
+                              levels=None,
+                              labels=None,
+                              ordered: bool = False) -> _pd.Categorical:
+    """to_categorical on the recoded uniques of a factorized Series"""
+    if levels is None:
+        # take levels as from frequencies: same as uniques.value_counts() on
+        # the expanded data (for object uniques, recoded ones may be
+        # repeated)
+        freqs = _pd.Series(counts).groupby(uniques, sort=False).sum()
+        levels = freqs.sort_values(ascending=False).index.to_list()
+    if labels is None:
+        labels = levels
+
+    if len(levels) != len(labels):
+        raise ValueError("levels and labels must have the "
+                         "same number of elements")
+
+    levlabs_mapping = {lev: lab for lev, lab in zip(levels, labels)}
+    recoded = uniques.map(levlabs_mapping)
+    # ensure labels are unique, https://stackoverflow.com/questions/480214
+    unique_labels = list(dict.fromkeys(labels))
+    rval = _pd.Categorical(recoded, categories=unique_labels, ordered=ordered)
+    return _pd.Categorical.from_codes(rval.codes[codes], dtype=rval.dtype)
 
 
 def to_categorical(x=None,
@@ -947,21 +1491,12 @@ def to_categorical(x=None,
         raise ValueError(msg)
     if not isinstance(x, _pd.Series):
         x = _pd.Series(x)
-    if levels is None:
-        # take levels as from frequencies
+    if levels is None and not isinstance(x.dtype, _np.dtype):
+        # take levels as from frequencies (extension dtypes have their own
+        # value_counts, eg listing unused categories too)
         levels = x.value_counts(sort=True, ascending=False).index.to_list()
-    if labels is None:
-        labels = levels
-
-    if len(levels) != len(labels):
-        raise ValueError("levels and labels must have the "
-                         "same number of elements")
-
-    levlabs_mapping = {lev: lab for lev, lab in zip(levels, labels)}
-    recoded = x.map(levlabs_mapping)
-    # ensure labels are unique, https://stackoverflow.com/questions/480214
-    unique_labels = list(dict.fromkeys(labels))
-    return _pd.Categorical(recoded, categories=unique_labels, ordered=ordered)
+    return _categorical_from_uniques(*_factorize(x), levels=levels,
+                                     labels=labels, ordered=ordered)
 
 
 def mc(levels=None,
@@ -992,12 +1527,12 @@ def mc(levels=None,
     ... }
     >>>
     """
-    def f(x):
-        return to_categorical(x=x,
+    # a partial rather than a closure, so that it can be pickled (eg by
+    # Coercer.coerce with a process executor)
+    return _functools.partial(to_categorical,
                               levels=levels,
                               labels=labels,
                               ordered=ordered)
-    return f
 
 
 def to_noyes(x=None) -> _pd.Categorical:
@@ -1026,17 +1561,18 @@ def to_noyes(x=None) -> _pd.Categorical:
         raise ValueError(msg)
     if not isinstance(x, _pd.Series):
         x = _pd.Series(x)
+    codes, uniques, counts = _factorize(x)
     if is_string(x):
         # take only the first character and map to n/y
-        tmp = x.str.strip().str.lower().str[0]
+        tmp = uniques.str.strip().str.lower().str[0]
         tmp[tmp == "s"] = "y"
         tmp = tmp.replace({"0": "n", "1": "y"})  # 0/1 for strings
     else:
         # try to convert to boolean and map to n/y
-        tmp = to_bool(x).map({False: "n", True: "y"})
+        tmp = to_bool(uniques).map({False: "n", True: "y"})
 
-    return to_categorical(tmp.map({"n": "no", "y": "yes"}),
-                          levels=["no", "yes"])
+    return _categorical_from_uniques(codes, tmp.map({"n": "no", "y": "yes"}),
+                                     counts, levels=["no", "yes"])
 
 
 def to_sex(x=None) -> _pd.Categorical:
@@ -1064,9 +1600,11 @@ def to_sex(x=None) -> _pd.Categorical:
         raise Exception(msg)
 
     # take the first letter (Mm/Ff)
-    tmp = x.str.strip().str.lower().str[0]
+    codes, uniques, counts = _factorize(x)
+    tmp = uniques.str.strip().str.lower().str[0]
     tmp = tmp.map({"m": "male", "f": "female"})
-    return to_categorical(tmp, levels=["male", "female"])
+    return _categorical_from_uniques(codes, tmp, counts,
+                                     levels=["male", "female"])
 
 
 def to_recist(x=None) -> _pd.Categorical:
@@ -1094,11 +1632,12 @@ def to_recist(x=None) -> _pd.Categorical:
         raise Exception(msg)
 
     # rm spaces and uppercase and take the first two letters
-    tmp = x.str.strip().str.upper().str[:2]
+    codes, uniques, counts = _factorize(x)
+    tmp = uniques.str.strip().str.upper().str[:2]
     # uniform italian to english
     ita2eng = {"RC": "CR", "RP": "PR"}
-    return to_categorical(tmp.replace(ita2eng),
-                          levels=["CR", "PR", "SD", "PD"])
+    return _categorical_from_uniques(codes, tmp.replace(ita2eng), counts,
+                                     levels=["CR", "PR", "SD", "PD"])
 
 
 def to_other_specify(x=None) -> _pd.Categorical:
@@ -1121,12 +1660,16 @@ def to_other_specify(x=None) -> _pd.Categorical:
     if not isinstance(x, _pd.Series):
         x = _pd.Series(x)
 
-    nas = (x.isna()) | (x == "")
-    tmp = x.copy().astype("str").str.strip().str.lower()
+    codes, uniques, counts = _factorize(x)
+    if any(not isinstance(u, str) for u in uniques.dropna()):
+        # factorize merges equal values of different types (eg 3 and 3.0)
+        # which are stringified differently: stringify before
+        codes, uniques, counts = _factorize(x.astype("str").where(x.notna()))
+    nas = (uniques.isna()) | (uniques == "")
+    tmp = uniques.astype("str").str.strip().str.lower()
     tmp[nas] = _pd.NA
     # categs ordered by decreasing counts
-    categs = list(tmp.value_counts().index)
-    return to_categorical(tmp, levels=categs)
+    return _categorical_from_uniques(codes, tmp, counts)
 
 
 def to_string(x=None) -> _pd.Series:
@@ -1164,8 +1707,9 @@ class Coercer:
 
     Given directives as a dict (variable name as key, function/coercer
     as value) it applies all the function on a copy of the DataFrame
-    and return it.  If verbose print a report of the introduced
-    missing values with the coercion for check
+    and return it.  A report of the missing values introduced by the
+    coercions is kept in the diagnostics attribute (and printed if
+    verbose) for check
 
     Parameters
     ----------
@@ -1178,6 +1722,14 @@ class Coercer:
     verbose:
         be verbose about operations applied
 
+    Attributes
+    ----------
+    diagnostics:
+        after coerce(), a pd.DataFrame with a row for each value made
+        missing by the coercions (only the max_values most frequent for each
+        variable): "variable", "new_na" (total number of missing values
+        introduced in the variable), "value" and "count"
+
     Examples
     --------
     >>> import pylbmisc as lb
@@ -1259,113 +1811,407 @@ class Coercer:
     ):
         self._df = df
         self._verbose = verbose
-        if fv is None:
-            msg = "fv can't be None"
-            raise ValueError(msg)
-        else:
-            # Experimental below
-            parent_frame = _inspect.currentframe().f_back
-            # put it in the vf_dict format evaluating the f in
-            # parent frame variable dict
-            reversed = {}
-            for f, vars in fv.items():
-                # if f is a string change it to function taking from the enclosing
-                # environment
-                f = (
-                    eval(f, parent_frame.f_locals, parent_frame.f_globals)
-                    if isinstance(f, str)
-                    else f
-                )
-                for v in vars:
-                    reversed.update({v: f})
-            self._directives = reversed
-
-    def coerce(self, keep_coerced_only: bool = False) -> _pd.DataFrame:
+        self.diagnostics = None
+        # Experimental below
+        parent_frame = _inspect.currentframe().f_back
+        self._directives = _resolve_fv(fv, parent_frame)
+
+    def coerce(self,
+               keep_coerced_only: bool = False,
+               n_jobs: int = 1,
+               executor: str = "thread",
+               copy: bool | None = None,
+               max_values: int = 10) -> _pd.DataFrame:
         """Method to apply programmed coercions
 
+        Only the coerced columns are passed to the coercers: the others are
+        copied as they are (or shared, see copy) and the result is
+        assembled keeping the input columns order.
+
         Parameters
         ----------
         keep_coerced_only:
             if True keep only variables in fv dictionary, after coercion
+        n_jobs:
+            number of columns coerced concurrently (-1 to let the
+            executor choose, typically the number of cpus)
+        executor:
+            "thread" or "process", pool used when n_jobs != 1. Threads
+            are fine for coercers releasing the GIL (to_numeric, to_date,
+            pyarrow casts); processes need picklable coercers (module level
+            functions, mc)
+        copy:
+            copy the columns which are not coerced; if False they share data
+            with the input DataFrame (safe only with pandas Copy-on-Write
+            enabled, pd.set_option("mode.copy_on_write", True)); if None
+            copy unless Copy-on-Write is enabled
+        max_values:
+            maximum number of distinct values made missing reported for
+            each variable in diagnostics
+        """
+        rval, self.diagnostics = _coerce(self._df,
+                                         self._directives,
+                                         keep_coerced_only=keep_coerced_only,
+                                         n_jobs=n_jobs,
+                                         executor=executor,
+                                         copy=copy,
+                                         max_values=max_values,
+                                         verbose=self._verbose)
+        return rval
+
+
+class CoercionPlan:
+    """Coercion directives compiled once against a schema.
+
+    Like Coercer, but directives are resolved and validated once against
+    the schema (column names and dtypes) of the data to be coerced, so the
+    plan can be reused on several DataFrames (eg daily exports) and, being
+    picklable if its coercers are (module level functions, mc), sent to
+    other processes. Compatible steps are fused: string columns coerced
+    with to_numeric or to_integer share a single _replace_comma pass.
+
+    Parameters
+    ----------
+    fv:
+        function-variable dict, as in Coercer
+    schema:
+        a DataFrame (only its dtypes are kept) or a dict/Series of dtypes
+        by column name
+    verbose:
+        be verbose about operations applied
+
+    Attributes
+    ----------
+    diagnostics:
+        after coerce(), as in Coercer
+
+    Examples
+    --------
+    >>> import pylbmisc as lb
+    >>> import pandas as pd
+    >>> raw = pd.DataFrame({"idx": ["1", "2,0", "a"], "sex": ["m", "f", "M"]})
+    >>> plan = lb.dm.CoercionPlan({lb.dm.to_integer: ["idx"],
+    ...                            lb.dm.to_sex: ["sex"]},
+    ...                           schema=raw, verbose=False)
+    >>> plan.coerce(raw)
+        idx     sex
+    0     1    male
+    1     2  female
+    2  <NA>    male
+    """
+
+    def __init__(self,
+                 fv: dict,
+                 schema: _pd.DataFrame | _pd.Series | dict,
+                 verbose: bool = True):
+        parent_frame = _inspect.currentframe().f_back
+        directives = _resolve_fv(fv, parent_frame)
+        if isinstance(schema, _pd.DataFrame):
+            schema = schema.dtypes
+        schema = dict(schema)
+        # validation
+        for var, f in directives.items():
+            if var not in schema:
+                msg = f"{var} not in schema, aborting."
+                raise ValueError(msg)
+            if (f in {to_sex, to_recist}) and (schema[var] not in ["O", "string[pyarrow]"]):
+                msg = f"{var}: {f.__name__} only for strings vectors, not {schema[var]}."
+                raise ValueError(msg)
+        # fusion: columns whose comma replacement is done at once
+        fused = {var: _fused_workers[f]
+                 for var, f in directives.items()
+                 if f in _fused_workers and schema[var] in ["O", "string[pyarrow]"]}
+        self._directives = {**directives, **fused}
+        self._fused = list(fused.keys())
+        self._schema = {var: schema[var] for var in directives.keys()}
+        self._verbose = verbose
+        self.diagnostics = None
+
+    def validate(self, df: _pd.DataFrame) -> None:
+        """Check that df matches the schema of the plan
+
+        Parameters
+        ----------
+        df:
+            the DataFrame to be checked
         """
-        # do not modify the input data
-        df = self._df.copy()
-        # keep order of the input variables
-        varorder = df.columns.to_list()
-        directives = self._directives
-        # make verbose all the functions by decorating them
-        if self._verbose:
-            for var in directives.keys():
-                directives[var] = _verboser(directives[var])
-        # apply the coercers, but first modify the pd printing options temporarily to
-        # handle long reporting of changes
-        old_nrows = _pd.get_option("display.max_rows")
-        _pd.set_option("display.max_rows", None)
-        for var, fun in directives.items():
+        for var, dtype in self._schema.items():
             if var not in df.columns:
                 msg = f"{var} not in df.columns, aborting."
                 raise ValueError(msg)
-            if self._verbose:
+            if df[var].dtype != dtype:
+                msg = f"{var} has dtype {df[var].dtype}, plan was compiled for {dtype}."
+                raise ValueError(msg)
+
+    def coerce(self,
+               df: _pd.DataFrame,
+               keep_coerced_only: bool = False,
+               n_jobs: int = 1,
+               executor: str = "thread",
+               copy: bool | None = None,
+               max_values: int = 10) -> _pd.DataFrame:
+        """Apply the plan to a DataFrame
+
+        Parameters
+        ----------
+        df:
+            the DataFrame to be coerced, matching the plan schema
+        keep_coerced_only, n_jobs, executor, copy, max_values:
+            as in Coercer.coerce
+        """
+        self.validate(df)
+        inputs = {var: df[var] for var in self._directives.keys()}
+        if self._fused:
+            replaced = _replace_comma_many([inputs[var] for var in self._fused])
+            inputs.update(zip(self._fused, replaced))
+        rval, self.diagnostics = _coerce(df,
+                                         self._directives,
+                                         inputs=inputs,
+                                         keep_coerced_only=keep_coerced_only,
+                                         n_jobs=n_jobs,
+                                         executor=executor,
+                                         copy=copy,
+                                         max_values=max_values,
+                                         verbose=self._verbose)
+        return rval
+
+
+# coercers whose _replace_comma step can be fused in CoercionPlan, with the
+# worker doing the rest
+_fused_workers = {
+    to_numeric: _to_numeric_worker,
+    to_integer: _to_integer_worker,
+}
+
+
+def _resolve_fv(fv: dict, frame) -> dict:
+    """Put directives in the variable-function format evaluating the string
+    keys in the frame variable dict"""
+    if fv is None:
+        msg = "fv can't be None"
+        raise ValueError(msg)
+    reversed = {}
+    for f, vars in fv.items():
+        # if f is a string change it to function taking from the enclosing
+        # environment
+        f = (
+            eval(f, frame.f_locals, frame.f_globals)
+            if isinstance(f, str)
+            else f
+        )
+        for v in vars:
+            reversed.update({v: f})
+    return reversed
+
+
+def _coerce(df: _pd.DataFrame,
+            directives: dict,
+            inputs: dict | None = None,
+            keep_coerced_only: bool = False,
+            n_jobs: int = 1,
+            executor: str = "thread",
+            copy: bool | None = None,
+            max_values: int = 10,
+            verbose: bool = False) -> tuple[_pd.DataFrame, _pd.DataFrame]:
+    """Coercion worker for Coercer/CoercionPlan: return the coerced DataFrame
+    and the diagnostics"""
+    copy = _copy_needed(copy)
+    # keep order of the input variables
+    varorder = df.columns.to_list()
+    for var in directives.keys():
+        if var not in df.columns:
+            msg = f"{var} not in df.columns, aborting."
+            raise ValueError(msg)
+    if inputs is None:
+        inputs = {var: df[var] for var in directives.keys()}
+    coerced = _apply_coercers(inputs, directives,
+                              n_jobs=n_jobs,
+                              executor=executor,
+                              verbose=verbose,
+                              copy=copy)
+    # return results: coerced columns are already new data, the others
+    # are copied (if needed) so that input data are never modified
+    columns = []
+    reports = []
+    for pos, var in enumerate(varorder):
+        if var in coerced:
+            col = _as_column(coerced[var], df.index, var)
+            columns.append(col)
+            report = _new_na_report(var, df.iloc[:, pos], col, max_values)
+            if report is not None:
+                reports.append(report)
+                if verbose:
+                    print(f"{var}: {report.new_na[0]} missing values introduced, "
+                          "please check if the following coercions are ok:")
+                    print(report[["value", "count"]].to_string(index=False))
+        elif not keep_coerced_only:
+            col = df.iloc[:, pos]
+            columns.append(col.copy() if copy else col)
+    diagnostics = (
+        _pd.concat(reports, ignore_index=True) if reports
+        else _pd.DataFrame(columns=_new_na_report_columns)
+    )
+    if not columns:
+        return _pd.DataFrame(index=df.index), diagnostics
+    return _pd.concat(columns, axis="columns", copy=False), diagnostics
+
+
+def _apply_coercers(inputs: dict,
+                    directives: dict,
+                    n_jobs: int = 1,
+                    executor: str = "thread",
+                    verbose: bool = False,
+                    copy: bool = True) -> dict:
+    """Apply the coercers to their input columns (possibly concurrently)
+    and return a dict of coerced data"""
+    executor = _match_arg(executor, ["thread", "process"])
+    rval = {}
+    if n_jobs == 1:
+        for var, f in directives.items():
+            if verbose:
                 print(f"Processing {var}.")
-            df[var] = fun(df[var])
-        _pd.set_option("display.max_rows", old_nrows)
-        # return results
-        if keep_coerced_only:
-            keep = list(directives.keys())
-            kept_in_order = [v for v in varorder if v in keep]
-            return df[kept_in_order]
-        else:
-            return df[varorder]
+            rval[var] = f(inputs[var])
+    else:
+        pool = _ThreadPoolExecutor if executor == "thread" else _ProcessPoolExecutor
+        max_workers = None if n_jobs == -1 else n_jobs
+        with pool(max_workers=max_workers) as ex:
+            futures = {var: ex.submit(f, inputs[var])
+                       for var, f in directives.items()}
+            for var, future in futures.items():
+                if verbose:
+                    print(f"Processing {var}.")
+                rval[var] = future.result()
+    # coercers returning their input (eg identity) must not share data
+    # with it
+    if copy:
+        for var, res in rval.items():
+            if res is inputs[var]:
+                rval[var] = res.copy()
+    return rval
+
+
+def _as_column(x, index: _pd.Index, name) -> _pd.Series:
+    """Coerced data as a Series with the given index, as in df[name] = x"""
+    if isinstance(x, _pd.Series):
+        if not x.index.equals(index):
+            x = x.reindex(index)
+        return x.rename(name)
+    return _pd.Series(x, index=index, name=name)
 
 
 @_singledispatch
-def group_prog_id(x):
+def group_prog_id(x, *args, **kwargs):
     """Count the number of times each id was already seen
 
     Parameters
     ----------
-    x: list or np.array or pd.Dataframe
+    x: list or np.array or pd.Series or pd.DataFrame
         group indicator
+    by: list of str
+        (DataFrame only) key columns, all but sort_by if missing
+    sort_by: str
+        (DataFrame only) column giving the order of the rows within groups
+        (eg visit date); if missing the order of the rows is used
 
     Examples
     --------
+    >>> import numpy as np
+    >>> import pandas as pd
     >>> # no missings
-    >>> group_prog_id(3)
     >>> group_prog_id([0, 1, 1, 1, 2, 0, 2, 0])
+    [1, 1, 2, 3, 1, 2, 2, 3]
     >>> group_prog_id(np.array([0, 1, 1, 1, 2, 0, 2, 0]))
-    >>> group_prog_id(pd.Series([0, 1, 1, 1, 2, 0, 2, 0]))
+    array([1., 1., 2., 3., 1., 2., 2., 3.])
+    >>> group_prog_id(pd.Series([0, 1, 1, 1, 2, 0, 2, 0])).to_list()
+    [1, 1, 2, 3, 1, 2, 2, 3]
     >>> # with missing
     >>> group_prog_id(np.array([1, 1, 0, np.nan, np.nan]))
-    >>> group_prog_id(pd.Series([1, 1, 0, pd.NA, pd.NA]))
+    array([ 1.,  2.,  1., nan, nan])
+    >>> group_prog_id(pd.Series([1, 1, 0, pd.NA, pd.NA])).to_list()
+    [1, 2, 1, <NA>, <NA>]
+    >>> # visit number of each patient in each center
+    >>> df = pd.DataFrame({"center": ["a", "a", "b", "a"],
+    ...                    "id": [1, 1, 1, 1],
+    ...                    "date": pd.to_datetime(["2020-02-01", "2020-01-01",
+    ...                                            "2020-01-01", "2020-03-01"])})
+    >>> group_prog_id(df, by=["center", "id"], sort_by="date").to_list()
+    [2, 1, 1, 3]
     """
     raise NotImplementedError(f"{type(x)} is not handled.")
 
 
-def _group_prog_id_worker(x):
-    seen = _Counter()
-    rval = []
-    for elem in x:
-        seen[elem] += 1
-        rval.append(seen[elem])
+def _argsort_codes(codes: _np.ndarray) -> _np.ndarray:
+    """Stable argsort of non negative integer codes, as a LSD radix sort on
+    16 bits digits (numpy uses radix sort for 16 bits integers, much faster
+    than timsort on large arrays)"""
+    order = _np.argsort((codes & 0xFFFF).astype(_np.uint16), kind="stable")
+    top = codes.max(initial=0) >> 16
+    shift = 16
+    while top:
+        digit = ((codes[order] >> shift) & 0xFFFF).astype(_np.uint16)
+        order = order[_np.argsort(digit, kind="stable")]
+        top >>= 16
+        shift += 16
+    return order
+
+
+def _group_prog_id_worker(codes: _np.ndarray,
+                          order: _np.ndarray | None = None) -> _np.ndarray:
+    """1-based position of each element within its group, given the group
+    codes (as returned by pd.factorize, missing values are counted apart)
+    and eventually the order of the elements"""
+    if order is not None:
+        codes = codes[order]
+    # stable sort by group: each group is contiguous and in the original
+    # order, so positions are offsets from the start of the group
+    by_group = _argsort_codes(codes + 1)
+    counts = _np.bincount(codes + 1)
+    starts = _np.cumsum(counts) - counts
+    rval = _np.empty(len(codes), dtype="int64")
+    rval[by_group] = _np.arange(len(codes)) - _np.repeat(starts, counts) + 1
+    if order is not None:
+        rval[order] = rval.copy()
     return rval
 
 
 @group_prog_id.register
 def _(x: list):
-    return _group_prog_id_worker(x)
+    codes = _pd.factorize(_np.asarray(x, dtype=object), use_na_sentinel=False)[0]
+    return _group_prog_id_worker(codes).tolist()
 
 
 @group_prog_id.register
 def _(x: _np.ndarray):
-    res = _np.array(_group_prog_id_worker(x))
-    return _np.where(_np.isnan(x), _np.nan, res)
+    codes = _pd.factorize(x)[0]
+    res = _group_prog_id_worker(codes)
+    return _np.where(codes == -1, _np.nan, res)
 
 
 @group_prog_id.register
 def _(x: _pd.Series):
-    rval = _pd.Series(_group_prog_id_worker(x))
-    rval[_pd.isna(x)] = _pd.NA
-    return to_integer(rval)
+    codes = _pd.factorize(x)[0]
+    res = _group_prog_id_worker(codes)
+    return _pd.Series(_pd.arrays.IntegerArray(res, codes == -1), index=x.index)
+
+
+@group_prog_id.register
+def _(x: _pd.DataFrame, by: list[str] | None = None, sort_by: str | None = None):
+    if by is None:
+        by = [c for c in x.columns if c != sort_by]
+    if sort_by is not None and sort_by in by:
+        msg = "sort_by can't be one of the key columns."
+        raise ValueError(msg)
+    # rows with a missing key are left out (-1) as in the other methods
+    codes = x.groupby(by, sort=False, dropna=True).ngroup().to_numpy()
+    codes = _np.where(_np.isnan(codes), -1, codes).astype("int64")
+    order = None
+    if sort_by is not None:
+        # sort by rank (missing values last), ties kept in row order
+        ranks = _pd.factorize(x[sort_by], sort=True)[0]
+        ranks[ranks == -1] = ranks.max(initial=-1) + 1
+        order = _argsort_codes(ranks)
+    res = _group_prog_id_worker(codes, order)
+    return _pd.Series(_pd.arrays.IntegerArray(res, codes == -1), index=x.index)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,20 @@
-import matplotlib.pyplot as _plt
+from __future__ import annotations
+
 import numpy as _np
 import pandas as _pd
 from collections.abc import Callable as _Callable
 from pathlib import Path as _Path
-from matplotlib.figure import Figure as _Figure
-from matplotlib.axes import Axes as _Axes
 from typing import Optional as _Optional
 from typing import Tuple as _Tuple
+from typing import TYPE_CHECKING as _TYPE_CHECKING
 from pylbmisc.stats import p_format as _p_format
 
+# matplotlib.pyplot is imported inside the plotting functions, so that
+# `import pylbmisc.fig` stays cheap
+if _TYPE_CHECKING:
+    from matplotlib.figure import Figure as _Figure
+    from matplotlib.axes import Axes as _Axes
+
 
 def fun2d(f: _Callable = lambda x: x**2,
           xlim: list[int | float] = [-5, 5],
@@ -50,6 +56,8 @@ def fun2d(f: _Callable = lambda x: x**2,
     >>> fig, ax = fun2d()
 
     """
+    import matplotlib.pyplot as _plt
+
     if (ax is None) or (fig is None):
         fig, ax = _plt.subplots()
     x = _np.linspace(start=xlim[0], stop=xlim[1], num=npoints)
@@ -108,6 +116,8 @@ def fun3d(f: _Callable = lambda x, y: x**2 + y**2,
     >>> fig, ax = fun3d()
 
     """
+    import matplotlib.pyplot as _plt
+
     if (ax is None) or (fig is None):
         fig, ax = _plt.subplots(subplot_kw={"projection": "3d"})
     x = _np.arange(start=xlim[0],
@@ -214,6 +224,8 @@ def forestplot(
     >>> fp_os = lb.fig.forestplot(os_flat, forest_title = "OS")
     >>> lb.io.export_figure(fp_os, fdir="/tmp",fname = "fp_os")
     """
+    import matplotlib.pyplot as _plt
+
     # breakpoint()
     df = df.copy()
     n_rows = len(df)
@@ -2,12 +2,28 @@
 Data, figures/tables IO handy utilities.
 """
 
+import hashlib as _hashlib
+import io as _io
+import json as _json
+import numpy as _np
 import os as _os
 import pandas as _pd
+# pyarrow and pyarrow.compute are loaded by pandas anyway; pyarrow.csv and
+# pyarrow.parquet are imported by the functions using them
+import pyarrow as _pa
+import pyarrow.compute as _pc
+import re as _re
+import shutil as _shutil
+import sys as _sys
 import tempfile as _tempfile
 import zipfile as _zipfile
 
 # from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+from contextlib import ExitStack as _ExitStack
+from contextlib import contextmanager as _contextmanager
+from functools import partial as _partial
 from pathlib import Path as _Path
 from pylbmisc.dm import _default_dtype_backend
 from pylbmisc.dm import fix_varnames as _fix_varnames
@@ -21,12 +37,201 @@ from pylbmisc.dm import is_string as _is_string
 from pylbmisc.dm import is_all_missing as _is_all_missing
 from pylbmisc.dm import to_categorical as _to_categorical
 from pylbmisc.dm import to_date as _to_date
+from pylbmisc.dm import to_datetime as _to_datetime
+from pylbmisc.io._xlsx import read_xlsx as _read_xlsx
+from pylbmisc.r import match_arg as _match_arg
+from typing import Callable as _Callable
 from typing import Sequence as _Sequence
 
 
+# ------------------------------------
+# Report artifacts (figures and tables)
+# ------------------------------------
+def _artifacts_version() -> str:
+    """Versions of pylbmisc and pandas (which render the artifacts): the
+    manifest written by other versions is not trusted"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        pylbmisc_version = version("pylbmisc")
+    except PackageNotFoundError:
+        pylbmisc_version = "unknown"
+    return f"pylbmisc {pylbmisc_version}, pandas {_pd.__version__}"
+
+
+@_contextmanager
+def _dir_lock(path: _Path):
+    """Exclusive lock of a directory, held by one process at a time; no
+    locking where fcntl is not available (Windows)"""
+    try:
+        import fcntl as _fcntl
+    except ImportError:
+        yield
+        return
+    fd = _os.open(path, _os.O_RDONLY)
+    try:
+        _fcntl.flock(fd, _fcntl.LOCK_EX)
+        yield
+    finally:
+        _os.close(fd)  # releases the lock
+
+
+class _ArtifactManifest:
+    """Content hash of the artifacts written in a directory (a hidden
+    .artifacts.json manifest), to leave untouched the files whose inputs
+    (data and rendering parameters) didn't change since they were
+    written by the same pylbmisc version"""
+
+    def __init__(self, fdir: str | _Path):
+        self.path = _Path(fdir) / ".artifacts.json"
+        self.version = _artifacts_version()
+        self.hashes = self._load()
+
+    def _load(self) -> dict[str, str]:
+        try:
+            manifest = _json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get("version") != self.version:
+            return {}
+        return manifest.get("artifacts", {})
+
+    def current(self, fpath: str | _Path, fingerprint: str | None) -> bool:
+        """fpath exists and was written from the same inputs"""
+        fpath = _Path(fpath)
+        return (fingerprint is not None and fpath.exists()
+                and self.hashes.get(fpath.name) == fingerprint)
+
+    def update(self, fpaths: list[str | _Path], fingerprint: str | None):
+        # merged with the manifest on disk (written by other processes):
+        # locked from loading to replacing, with a temporary file of ours
+        with _dir_lock(self.path.parent):
+            self.hashes = self._load()
+            if fingerprint is None:
+                for fpath in fpaths:
+                    self.hashes.pop(_Path(fpath).name, None)
+            else:
+                self.hashes.update({_Path(f).name: fingerprint for f in fpaths})
+            manifest = {"version": self.version, "artifacts": self.hashes}
+            fd, tmp = _tempfile.mkstemp(dir=self.path.parent,
+                                        prefix=self.path.name + ".")
+            try:
+                with _os.fdopen(fd, "w") as f:
+                    f.write(_json.dumps(manifest, indent=0, sort_keys=True))
+                _os.replace(tmp, self.path)
+            except BaseException:
+                _os.remove(tmp)
+                raise
+
+
+def _force_export(force: bool) -> bool:
+    """force, or PYLBMISC_FORCE_EXPORT set (to rewrite all the artifacts
+    of a document build)"""
+    return force or _os.environ.get("PYLBMISC_FORCE_EXPORT", "") not in {"", "0"}
+
+
 # ------------------------------------
 # Figure and images stuff
 # ------------------------------------
+# export_figure renders raster formats (Agg) once, from the same rgba
+# buffer which gives the content hash of the figure; vector formats are
+# rendered by their own backends, concurrently in worker processes
+_raster_formats = {"png", "jpg", "jpeg", "tif", "tiff", "webp"}
+
+
+def _savefig_dpi(fig) -> float:
+    """dpi savefig uses when not given: rcParams["savefig.dpi"], or the
+    figure one if that is 'figure'"""
+    import matplotlib as _mpl
+
+    dpi = _mpl.rcParams["savefig.dpi"]
+    return fig.dpi if dpi == "figure" else dpi
+
+
+def _figure_rgba(fig, transparent: bool,
+                 dpi: float) -> tuple[_np.ndarray, float] | None:
+    """Figure rendered by Agg at dpi as savefig does (rows x cols x rgba)
+    and the dpi; None if the buffer size is not the expected one"""
+    buf = _io.BytesIO()
+    fig.savefig(buf, format="rgba", transparent=transparent, dpi=dpi)
+    # Agg canvas size (see FigureCanvasAgg.get_renderer)
+    width, height = int(fig.get_figwidth() * dpi), int(fig.get_figheight() * dpi)
+    if width * height * 4 != buf.getbuffer().nbytes:
+        return None
+    rgba = _np.frombuffer(buf.getbuffer(), dtype=_np.uint8)
+    return rgba.reshape(height, width, 4), dpi
+
+
+def _save_figure_worker(pickled: bytes, path: str, transparent: bool,
+                        dpi: float, rc: dict):
+    """savefig of a pickled figure in a worker process (non-interactive
+    backend, with the rcParams of the caller: lost with spawned
+    processes)"""
+    import matplotlib as _mpl
+    import pickle
+
+    _mpl.use("agg", force=True)
+    with _mpl.rc_context(rc):
+        fig = pickle.loads(pickled)
+        fig.savefig(path, transparent=transparent, dpi=dpi)
+
+
+def _save_figure(fig,
+                 paths: dict[str, str],
+                 transparent: bool = True,
+                 max_workers: int | None = None,
+                 force: bool = False):
+    """Save fig in the formats (extension: path) given: raster ones from a
+    single Agg rendering, vector ones in worker processes if more than
+    one; unless forced, files written from the same rendering (artifact
+    manifest) are left untouched"""
+    import matplotlib as _mpl
+    import matplotlib.image as _mpimg
+
+    manifest = _ArtifactManifest(_Path(next(iter(paths.values()))).parent)
+    dpi = _savefig_dpi(fig)
+    rendered = _figure_rgba(fig, transparent, dpi)
+    fingerprint = None
+    todo = dict(paths)
+    if rendered is not None:
+        rgba, dpi = rendered
+        fingerprint = _hashlib.blake2b(digest_size=16)
+        fingerprint.update(repr((rgba.shape, dpi, transparent)).encode())
+        fingerprint.update(rgba)
+        fingerprint = fingerprint.hexdigest()
+        if not force:
+            todo = {ext: path for ext, path in paths.items()
+                    if not manifest.current(path, fingerprint)}
+    stale = list(todo.values())
+    if rendered is not None:
+        for ext in [ext for ext in todo if ext in _raster_formats]:
+            _mpimg.imsave(todo.pop(ext), rgba, format=ext, dpi=dpi)
+    # worker processes only if they can run in parallel, and the figure
+    # can be sent to them
+    workers = max_workers if max_workers is not None else _os.cpu_count() or 1
+    pickled = None
+    if len(todo) > 1 and workers > 1:
+        import pickle
+
+        try:
+            pickled = pickle.dumps(fig)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            pass  # eg lambdas in formatters: saved here
+    if pickled is not None:
+        rc = {k: v for k, v in _mpl.rcParams.items() if k != "backend"}
+        with _ProcessPoolExecutor(max_workers=min(workers, len(todo))) as ex:
+            futures = [ex.submit(_save_figure_worker, pickled, path,
+                                 transparent, dpi, rc)
+                       for path in todo.values()]
+            for future in futures:
+                future.result()
+    else:
+        for path in todo.values():
+            fig.savefig(path, transparent=transparent, dpi=dpi)
+    if stale:
+        manifest.update(stale, fingerprint)
+
+
 def export_figure(fig,
                   fdir: str = "outputs",
                   fname: str = "",
@@ -34,13 +239,21 @@ def export_figure(fig,
                   latex_include=True,
                   label: str = "",
                   caption: str = "",
-                  scale: float = 1
+                  scale: float = 1,
+                  max_workers: int | None = None,
+                  force: bool = False
                   ) -> None:
     """Dump a figure (save to file, include in LaTeX)
 
     Save to png, eps and pdf and include in Latex an image;
     intended to be used inside pythontex pycode.
 
+    Raster formats (png) are written from a single rendering of the
+    figure, vector formats (eps, pdf) by concurrent worker processes.
+    Files already written from an identical figure (same content hash of
+    its rendering, in the .artifacts.json manifest of fdir) by the same
+    pylbmisc and pandas versions are left untouched, unless forced.
+
     Parameters
     ----------
     fig: matplotlib.figure.Figure
@@ -60,6 +273,12 @@ def export_figure(fig,
         caption LaTeX, se mancante viene riadattata label
     scale: float
         scale di includegraphics di LaTeX
+    max_workers: int or None
+        number of vector formats written at once (None: number of cpus,
+        1: no worker processes)
+    force: bool
+        rewrite files even if unchanged (as with the environment variable
+        PYLBMISC_FORCE_EXPORT=1)
     """
     # fdir not existing, using /tmp
     if not _os.path.isdir(fdir):
@@ -78,17 +297,13 @@ def export_figure(fig,
 
     # produce the file paths
     base_path = _os.path.join(fdir, fname)
-    eps_path = base_path + ".eps"
-    png_path = base_path + ".png"
-    pdf_path = base_path + ".pdf"
 
     # save figures to hard drive
-    if "eps" in fext:
-        fig.savefig(eps_path, transparent=True)
-    if "png" in fext:
-        fig.savefig(png_path, transparent=True)  # , dpi = 600)
-    if "pdf" in fext:
-        fig.savefig(pdf_path, transparent=True)
+    paths = {ext: f"{base_path}.{ext}" for ext in ["eps", "png", "pdf"]
+             if ext in fext}
+    if paths:
+        _save_figure(fig, paths, transparent=True, max_workers=max_workers,
+                     force=_force_export(force))
 
     # latex stuff
     if latex_include:
@@ -122,6 +337,34 @@ def export_figure(fig,
 # from pylbmisc.dm import is_numeric as _is_numeric
 
 
+# redcap columns are processed all together, stacked (one after the other)
+# in a single array
+def _redcap_floats(df: _pd.DataFrame) -> _np.ndarray:
+    """Numeric columns of df as a float (nrows, ncols) array, nan if missing"""
+    rval = _np.empty(df.shape, order="F")
+    for i in range(df.shape[1]):
+        col = _pa.array(df.iloc[:, i], from_pandas=True).cast(_pa.float64())
+        rval[:, i] = col.to_numpy(zero_copy_only=False)
+    return rval
+
+
+def _redcap_strings(df: _pd.DataFrame) -> _pa.ChunkedArray:
+    """String columns of df stacked in an arrow array"""
+    chunks = []
+    for i in range(df.shape[1]):
+        # arrow backed columns come as chunked arrays
+        col = _pa.array(df.iloc[:, i], type=_pa.string(), from_pandas=True)
+        chunks += col.chunks if isinstance(col, _pa.ChunkedArray) else [col]
+    return _pa.chunked_array(chunks, type=_pa.string())
+
+
+def _redcap_unstack(x: _np.ndarray, df: _pd.DataFrame) -> dict[str, _pd.Series]:
+    """Stacked values back to the columns of df"""
+    x = x.reshape(df.shape, order="F")
+    return {v: _pd.Series(x[:, i], index=df.index, name=v)
+            for i, v in enumerate(df.columns)}
+
+
 def _make_rec_dict(f, t):
     rec_df = (
         _pd.DataFrame({"from": f, "to": t})
@@ -135,82 +378,597 @@ def _make_rec_dict(f, t):
     return ft
 
 
+def _redcap_rec_dicts(raws: _pd.DataFrame,
+                      recs: _pd.DataFrame) -> list[dict]:
+    """raw -> label mappings of numeric columns recoded by redcap (sorted by
+    raw value), deduplicating all the columns at once; columns where a raw
+    value has different labels are done one by one by _make_rec_dict,
+    which picks the label as it always did"""
+    nrows, ncols = raws.shape
+    # (column, raw, label) triples as integer keys
+    from_codes, from_values = _pd.factorize(_redcap_floats(raws).ravel(order="F"))
+    to_codes, to_labels = _pd.factorize(
+        _pd.arrays.ArrowExtensionArray(_redcap_strings(recs)))
+    cols = _np.repeat(_np.arange(ncols), nrows)
+    valid = (from_codes >= 0) & (to_codes >= 0)
+    nfrom, nto = len(from_values), len(to_labels)
+    keys = (cols[valid] * nfrom + from_codes[valid]) * nto + to_codes[valid]
+    # unique triples and columns with a raw value recoded in different ways
+    keys = _pd.unique(keys)
+    pairs = keys // nto
+    conflicts = set(_np.unique(pairs[_pd.Series(pairs).duplicated().to_numpy()]
+                               // nfrom).tolist())
+    keys = keys[~_pd.Series(pairs).duplicated().to_numpy()]
+    cols, from_codes, to_codes = keys // nto // nfrom, keys // nto % nfrom, keys % nto
+    froms = _np.asarray(from_values)[from_codes]
+    order = _np.lexsort((froms, cols))
+    bounds = _np.searchsorted(cols[order], _np.arange(ncols + 1))
+    froms = froms[order].tolist()
+    tos = _np.asarray(to_labels, dtype=object)[to_codes[order]].tolist()
+    return [_make_rec_dict(raws.iloc[:, i], recs.iloc[:, i]) if i in conflicts
+            else dict(zip(froms[bounds[i]:bounds[i + 1]], tos[bounds[i]:bounds[i + 1]]))
+            for i in range(ncols)]
+
+
+_redcap_date_re = r"^\d{4}-\d{2}-\d{2}$"
+
+
+def _redcap_match_dates(df: _pd.DataFrame) -> _np.ndarray:
+    """Columns of df whose values are all YYYY-MM-DD (or missing)"""
+    matched = _pc.match_substring_regex(_redcap_strings(df), _redcap_date_re)
+    matched = _pc.fill_null(matched, True).to_numpy()
+    return matched.reshape(df.shape, order="F").all(axis=0)
+
+
+def _redcap_dates(data: _pd.DataFrame, sample_size: int = 1000) -> list[str]:
+    """String columns holding dates (YYYY-MM-DD, missing values allowed):
+    the first sample_size rows discard most of the others, the remaining
+    ones are checked in full"""
+    strings = data[[c for c, dtype in data.dtypes.items()
+                    if dtype in ["O", "string[pyarrow]"]]]
+    candidates = strings.loc[:, _redcap_match_dates(strings.iloc[:sample_size])]
+    if len(candidates) > sample_size:
+        candidates = candidates.loc[:, _redcap_match_dates(candidates)]
+    return candidates.columns.to_list()
+
+
+def _redcap_to_dates(data: _pd.DataFrame) -> dict[str, _pd.Series]:
+    """Columns of YYYY-MM-DD strings to dates (as to_date, NaT if not
+    valid), parsed all at once"""
+    dates = _pc.strptime(_redcap_strings(data), format="%Y-%m-%d", unit="s",
+                         error_is_null=True)
+    dates = dates.to_numpy().astype("datetime64[ns]")
+    return _redcap_unstack(dates, data)
+
+
+def _redcap_factors(data: _pd.DataFrame,
+                    factors: dict[str, tuple]) -> dict[str, _pd.Categorical]:
+    """Categoricals of data columns given their {column: (levels, labels)}:
+    numeric columns are coded all at once, joining their stacked values with
+    the (column, level) pairs"""
+    rval = {}
+    numeric = [v for v in factors if _is_integer(data[v]) or _is_numeric(data[v])]
+    for v in factors:
+        if v not in numeric:
+            levels, labels = factors[v]
+            rval[v] = _to_categorical(data[v], levels=[str(lev) for lev in levels],
+                                      labels=labels)
+    if not numeric:
+        return rval
+    map_cols, map_levels, map_codes, categories = [], [], [], []
+    for i, v in enumerate(numeric):
+        levels, labels = factors[v]
+        levels = _pd.to_numeric(_pd.Series(levels), errors="coerce")
+        # ensure labels are unique (as to_categorical)
+        unique_labels = list(dict.fromkeys(labels))
+        categories.append(unique_labels)
+        mapping = dict(zip(levels.to_list(), labels))
+        for lev, lab in mapping.items():
+            if not _np.isnan(lev):
+                map_cols.append(i)
+                map_levels.append(lev)
+                map_codes.append(unique_labels.index(lab))
+    values = _redcap_floats(data[numeric])
+    cols = _np.repeat(_np.arange(len(numeric)), values.shape[0])
+    mapping = _pd.MultiIndex.from_arrays(
+        [map_cols, _np.array(map_levels, dtype="float64")])
+    pos = mapping.get_indexer(
+        _pd.MultiIndex.from_arrays([cols, values.ravel(order="F")]))
+    codes = _np.append(_np.array(map_codes, dtype="int64"), -1)[pos]
+    codes = codes.reshape(values.shape, order="F")
+    for i, v in enumerate(numeric):
+        rval[v] = _pd.Categorical.from_codes(codes[:, i], categories=categories[i])
+    return rval
+
+
+# data dictionary: fields are identified by position (csv downloaded from
+# the web interface and api exports have different headers)
+_redcap_dict_cols = {"field": 0, "form": 1, "type": 3, "label": 4,
+                     "choices": 5, "validation": 7}
+_redcap_yesno = {"yesno": ([0, 1], ["No", "Yes"]),
+                 "truefalse": ([0, 1], ["False", "True"])}
+_redcap_checkbox = ([0, 1], ["Unchecked", "Checked"])
+_redcap_complete = ([0, 1, 2], ["Incomplete", "Unverified", "Complete"])
+
+
+def _redcap_choices(choices: str) -> tuple[list[str], list[str]]:
+    """Codes and labels of a "1, Male | 2, Female" choices string"""
+    codes, labels = [], []
+    for choice in choices.split("|"):
+        code, _, label = choice.partition(",")
+        codes.append(code.strip())
+        labels.append(label.strip())
+    return codes, labels
+
+
+def _redcap_metadata(dictionary: _pd.DataFrame) -> tuple[dict, dict]:
+    """Coercion of the exported columns described by a data dictionary, as
+    {column: ("factor", levels, labels) | ("date", ) | ("datetime", )},
+    and their descriptions"""
+    dictionary = dictionary.astype(object).where(dictionary.notna(), None)
+    coercions, descriptions = {}, {}
+    forms = []
+    for row in dictionary.itertuples(index=False):
+        field, form, ftype, label, choices, validation = (
+            row[i] for i in _redcap_dict_cols.values())
+        label = label or ""
+        if form not in forms:
+            forms.append(form)
+        if ftype in ("radio", "dropdown") and choices:
+            coercions[field] = ("factor", *_redcap_choices(choices))
+        elif ftype in _redcap_yesno:
+            coercions[field] = ("factor", *_redcap_yesno[ftype])
+        elif ftype == "checkbox" and choices:
+            for code, choice in zip(*_redcap_choices(choices)):
+                # exported as field___code, one 0/1 column by choice
+                column = field + "___" + _re.sub(r"\W", "_", code.lower())
+                coercions[column] = ("factor", *_redcap_checkbox)
+                descriptions[column] = f"{label} (choice={choice})"
+            continue
+        elif ftype == "text" and validation and validation.startswith("date_"):
+            coercions[field] = ("date", )
+        elif ftype == "text" and validation and validation.startswith("datetime_"):
+            coercions[field] = ("datetime", )
+        descriptions[field] = label
+    for form in forms:
+        coercions[f"{form}_complete"] = ("factor", *_redcap_complete)
+        descriptions[f"{form}_complete"] = "Complete?"
+    return coercions, descriptions
+
+
 def import_redcap(
         data_fpath: str | _Path = "data/DATA.csv",
-        labels_fpath: str | _Path = "data/LABELS.csv",
+        labels_fpath: str | _Path | None = "data/LABELS.csv",
         csv_kwargs: dict = {"dtype_backend": _default_dtype_backend},
-        verbose=False
+        verbose=False,
+        cache: str | _Path | None = None,
+        cache_max_size: int = 2 * 1024**3,
+        dictionary_fpath: str | _Path | None = None
 ) -> _pd.DataFrame:
     """
     Import dataset exported from redcap adding labels
 
     The idea is adding names as data['var'].name = labels['var'].column
 
+    Columns described in the data dictionary (if given) are coerced as
+    stated there (choices fields to categorical, date/datetime validated
+    text to dates); for the others raw -> label recodings are inferred
+    from the labelled export (all the columns at once) and dates are
+    recognized by their content.
+
     Parameters
     ----------
     data_path: str | Path
         csv of raw data export
-    labels_path: str | Path
-        csv of labelled data export
+    labels_path: str | Path | None
+        csv of labelled data export; it can be None if the data dictionary
+        is given (variables descriptions are taken from it)
+    cache: str, Path or None
+        directory of an on-disk cache of parsed files (see import_data)
+    cache_max_size: int
+        cache size (bytes) beyond which least recently used files are
+        removed
+    dictionary_fpath: str | Path | None
+        csv of the project data dictionary
 
     Examples
     --------
     >>> df = import_redcap("data/DATA.csv", "data/LABELS.csv")
+    >>> df = import_redcap("data/DATA.csv", None,
+    ...                    dictionary_fpath="data/DICTIONARY.csv")
     """
-    data = _pd.read_csv(data_fpath, **csv_kwargs)
-    labels = _pd.read_csv(labels_fpath, **csv_kwargs)
+    if labels_fpath is None and dictionary_fpath is None:
+        msg = "labels_fpath and dictionary_fpath can't be both None."
+        raise ValueError(msg)
+    if cache is not None:
+        cache = _ImportCache(cache, cache_max_size)
+    fpaths = [f for f in (data_fpath, labels_fpath, dictionary_fpath)
+              if f is not None]
+    data, *others = [_read_source("csv", (str(f),), csv_kwargs, {}, cache)
+                     for f in fpaths]
+    if cache is not None:
+        cache.evict()
+    labels = others.pop(0) if labels_fpath is not None else None
+    if dictionary_fpath is not None:
+        coercions, description_dict = _redcap_metadata(others.pop(0))
+    else:
+        coercions, description_dict = {}, {}
 
     varnames = data.columns.to_list()
-    comments = labels.columns.to_list()
-
-    if (data.shape[1] != labels.shape[1]):
-        msg = "I dataframe passati debbono avere lo stesso numero di colonne"
-        raise Exception(msg)
-
-    final_df = data.copy()
-    description_dict = dict()
-
-    # process column by column
-    for ncol in range(data.shape[1]):
-        varname = varnames[ncol]
-        comment = comments[ncol]
-        description_dict[varname] = comment
-        if verbose:
-            print(f"Doing {varname}")
-
-        # do recoding if needed
-        raw = data.iloc[:, ncol]    # raw variable (before recoding)
-        rec = labels.iloc[:, ncol]  # recoded variable (after recoding)
-
-        # factor: raw stringa/intero/numerico e ricodificato a stringa
-        probable_factor = ((_is_integer(raw) or _is_numeric(raw))
-                           and
-                           _is_string(rec))
-        probable_date = (_is_string(raw) and
-                         raw.str.fullmatch(r"\d{4}-\d{2}-\d{2}").all())
-
-        if probable_date:
-            final_df[varname] = _to_date(raw)
-        elif probable_factor:
-            rec_dict = _make_rec_dict(raw, rec)
-            final_df[varname] = _to_categorical(
-                raw,
-                levels=list(rec_dict.keys()),
-                labels=list(rec_dict.values()))
-        else:
-            pass  # do nothing but in the previous cases
+    if labels is not None:
+        if (data.shape[1] != labels.shape[1]):
+            msg = "I dataframe passati debbono avere lo stesso numero di colonne"
+            raise Exception(msg)
+        description_dict = dict(zip(varnames, labels.columns.to_list()))
+    else:
+        description_dict = {v: description_dict.get(v, v) for v in varnames}
+
+    # columns without metadata: recodings and dates inferred
+    others = [i for i, v in enumerate(varnames) if v not in coercions]
+    if labels is not None:
+        factors = [i for i in others
+                   if ((_is_integer(data.iloc[:, i]) or _is_numeric(data.iloc[:, i]))
+                       and _is_string(labels.iloc[:, i]))]
+        rec_dicts = _redcap_rec_dicts(data.iloc[:, factors],
+                                      labels.iloc[:, factors])
+        for i, rec_dict in zip(factors, rec_dicts):
+            coercions[varnames[i]] = ("factor", list(rec_dict.keys()),
+                                      list(rec_dict.values()))
+    dates = _redcap_dates(data.iloc[:, others])
+    coercions.update({v: ("date", ) for v in dates})
+
+    coercions = {v: c for v, c in coercions.items() if v in data.columns}
+    if verbose:
+        for varname, coercion in coercions.items():
+            print(f"Doing {varname} ({coercion[0]})")
+    columns = dict(data.items())
+    columns.update(_redcap_factors(data, {v: c[1:] for v, c in coercions.items()
+                                          if c[0] == "factor"}))
+    columns.update(_redcap_to_dates(data[[v for v, c in coercions.items()
+                                          if c[0] == "date"]]))
+    columns.update({v: _to_datetime(data[v]) for v, c in coercions.items()
+                    if c[0] == "datetime"})
+    final_df = _pd.DataFrame(columns, index=data.index)
 
     return final_df, description_dict
 
 
+_import_exts = {".csv", ".xls", ".xlsx", ".zip"}
+
+
+def _import_plan(fpaths: list[str], zip_chain: tuple = ()) -> list[tuple]:
+    """Files to be imported as (kind, name, source) tuples: source is the
+    path, or for zip members the chain (zip path, [inner zip, ...]
+    member); zip archives are listed (not read) and their entries are in
+    place of the source"""
+    plan = []
+    for fpath in fpaths:
+        fname, fext = _os.path.splitext(_os.path.basename(fpath))
+        fext = fext.lower()
+        if fext not in _import_exts:
+            continue
+        source = zip_chain + (fpath,)
+        if fext == ".csv":
+            plan.append(("csv", fname, source))
+        elif fext in {".xls", ".xlsx"}:
+            plan.append(("excel", fname, source))
+        else:
+            with _open_source(source) as f, _zipfile.ZipFile(f) as myzip:
+                # top level members only (as listing the extracted archive)
+                members = [m for m in myzip.namelist() if "/" not in m]
+            plan.append(("zip", fname, _import_plan(members, source)))
+    return plan
+
+
+@_contextmanager
+def _open_source(source: tuple):
+    """Binary file object of a file or zip member, zip members are streamed
+    from the archive (not extracted to disk)"""
+    with _ExitStack() as stack:
+        if len(source) == 1:
+            yield stack.enter_context(open(source[0], "rb"))
+            return
+        myzip = stack.enter_context(_zipfile.ZipFile(source[0]))
+        for inner in source[1:-1]:
+            # nested archive: read in memory
+            inner_bytes = _io.BytesIO(myzip.read(inner))
+            myzip = stack.enter_context(_zipfile.ZipFile(inner_bytes))
+        yield stack.enter_context(myzip.open(source[-1]))
+
+
+class _ImportCache:
+    """On-disk cache of parsed files (a directory of parquet files for each
+    file read), invalidated when the file changes (size, mtime or content
+    hash) and evicted least recently used beyond max_size bytes"""
+
+    def __init__(self, path: str | _Path, max_size: int = 2 * 1024**3):
+        self.path = _Path(path)
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, kind: str, source: tuple, kwargs: dict) -> _Path:
+        key = repr((kind, str(_Path(source[0]).resolve()), source[1:],
+                    sorted(kwargs.items(), key=lambda kv: kv[0]),
+                    _pd.__version__))
+        return self.path / _hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _fingerprint(fpath: str) -> dict:
+        stat = _os.stat(fpath)
+        content_hash = _hashlib.blake2b(digest_size=16)
+        with open(fpath, "rb") as f:
+            while block := f.read(1 << 20):
+                content_hash.update(block)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "hash": content_hash.hexdigest()}
+
+    def load(self, kind: str, source: tuple, kwargs: dict, read):
+        """Cached data if the file didn't change, otherwise read() and
+        cache it"""
+        entry = self._entry(kind, source, kwargs)
+        fingerprint = self._fingerprint(source[0])
+        try:
+            with (entry / "manifest.json").open() as f:
+                manifest = _json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is not None and manifest["fingerprint"] == fingerprint:
+            frames = [self._read_frame(entry / f"{i}.parquet", arrow_cols)
+                      for i, arrow_cols in enumerate(manifest["arrow_columns"])]
+            # last use, for eviction
+            _os.utime(entry / "manifest.json")
+            if manifest["sheets"] is None:
+                return frames[0]
+            return dict(zip(manifest["sheets"], frames))
+        data = read()
+        self._write(entry, fingerprint, data)
+        return data
+
+    @staticmethod
+    def _read_frame(fpath: _Path, arrow_cols: list[int]) -> _pd.DataFrame:
+        import pyarrow.parquet as _pq
+
+        table = _pq.read_table(fpath)
+        rval = table.to_pandas()
+        # ArrowDtype columns would come back as (pyarrow) StringDtype & co
+        for i in arrow_cols:
+            rval.isetitem(i, _pd.arrays.ArrowExtensionArray(table.column(i)))
+        return rval
+
+    def _write(self, entry: _Path, fingerprint: dict, data):
+        frames = data if isinstance(data, dict) else {None: data}
+        tmp = _Path(_tempfile.mkdtemp(dir=self.path, prefix=".tmp"))
+        try:
+            arrow_columns = []
+            for i, df in enumerate(frames.values()):
+                df.to_parquet(tmp / f"{i}.parquet")
+                arrow_columns.append([j for j, dtype in enumerate(df.dtypes)
+                                      if isinstance(dtype, _pd.ArrowDtype)])
+            manifest = {"fingerprint": fingerprint,
+                        "sheets": list(frames) if isinstance(data, dict) else None,
+                        "arrow_columns": arrow_columns}
+            with (tmp / "manifest.json").open("w") as f:
+                _json.dump(manifest, f)
+            # replace a stale entry
+            _shutil.rmtree(entry, ignore_errors=True)
+            _os.replace(tmp, entry)
+        except (ValueError, TypeError, OSError, _pa.ArrowException):
+            # not storable as parquet (eg mixed types columns): not cached
+            _shutil.rmtree(tmp, ignore_errors=True)
+
+    def evict(self):
+        """Remove least recently used entries beyond max_size"""
+        entries = []
+        for entry in self.path.iterdir():
+            manifest = entry / "manifest.json"
+            if entry.name.startswith(".") or not manifest.exists():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((manifest.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_size:
+                break
+            _shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def _read_excel_pandas(f, sheets: list[str | int] | None = None,
+                       **kwargs) -> dict[str, _pd.DataFrame]:
+    """read_excel of the sheets given (names or positions, None for all):
+    the workbook is opened read-only and only these are parsed"""
+    engine = kwargs.pop("engine", None)
+    engine_kwargs = kwargs.pop("engine_kwargs", None)
+    with _pd.ExcelFile(f, engine=engine, engine_kwargs=engine_kwargs) as xl:
+        names = xl.sheet_names
+        if sheets is not None:
+            names = [names[s] if isinstance(s, int) else s for s in sheets]
+        return xl.parse(names, **kwargs)
+
+
+def _read_excel_stream(f, sheets: list[str | int] | None = None,
+                       **kwargs) -> dict[str, _pd.DataFrame]:
+    """xlsx worksheets parsed as a stream of xml rows, with usecols and
+    nrows pushed down (cells outside them are not converted, rows after
+    nrows are not read); other formats (.xls) are read by pandas"""
+    if not _zipfile.is_zipfile(f):
+        f.seek(0)
+        return _read_excel_pandas(f, sheets, **kwargs)
+    return _read_xlsx(f, sheets, **kwargs)
+
+
+# excel readers: reader(file, sheets, **excel_kwargs) returning a dict of
+# DataFrame by sheet name
+_excel_readers = {
+    "pandas": _read_excel_pandas,
+    "calamine": _partial(_read_excel_pandas, engine="calamine"),
+    "stream": _read_excel_stream,
+}
+
+
+def _read_source(kind: str, source: tuple, csv_kwargs: dict, excel_kwargs: dict,
+                 cache: _ImportCache | None = None):
+    """Read a csv (as DataFrame) or excel file (as dict of DataFrame);
+    excel_kwargs "reader" and "sheets" items choose the excel reader and
+    the sheets to be read"""
+    if cache is not None:
+        kwargs = csv_kwargs if kind == "csv" else excel_kwargs
+        return cache.load(kind, source, kwargs,
+                          lambda: _read_source(kind, source, csv_kwargs, excel_kwargs))
+    if kind == "csv":
+        with _open_source(source) as f:
+            return _pd.read_csv(f, **csv_kwargs)
+    kwargs = dict(excel_kwargs)
+    reader = kwargs.pop("reader", "pandas")
+    if isinstance(reader, str):
+        reader = _excel_readers[reader]
+    sheets = kwargs.pop("sheets", None)
+    # excel readers need a seekable file, cheap in memory
+    with _open_source(source) as f:
+        return reader(_io.BytesIO(f.read()), sheets, **kwargs)
+
+
+def _arrow_csv_chunks(f, chunksize: int, csv_kwargs: dict):
+    """DataFrames of chunksize rows from a csv streamed by pyarrow (the
+    pandas pyarrow engine can't read by chunks)"""
+    import pyarrow.csv as _pa_csv
+
+    kwargs = {k: v for k, v in csv_kwargs.items() if k != "engine"}
+    dtype_backend = kwargs.pop("dtype_backend", None)
+    # leading lines skipped (before the header), as read_csv does
+    skiprows = kwargs.pop("skiprows", None)
+    if not isinstance(skiprows, int | None):
+        kwargs["skiprows"] = skiprows
+    if kwargs or dtype_backend not in {None, "pyarrow"}:
+        unsupported = list(kwargs) + ([] if dtype_backend in {None, "pyarrow"}
+                                      else ["dtype_backend"])
+        msg = ("csv_kwargs not supported by the arrow engine with chunksize: "
+               f"{', '.join(unsupported)}.")
+        raise ValueError(msg)
+    types_mapper = _pd.ArrowDtype if dtype_backend == "pyarrow" else None
+    pending = []
+    nrows = 0
+    start = 0
+
+    def to_pandas(table):
+        rval = table.to_pandas(types_mapper=types_mapper)
+        # continuing index, as pandas chunks
+        rval.index = _pd.RangeIndex(start, start + len(rval))
+        return rval
+
+    # missing values as read_csv(engine="pyarrow")
+    null_values = _pa_csv.ConvertOptions().null_values + ["<NA>", "None"]
+    convert_options = _pa_csv.ConvertOptions(null_values=null_values,
+                                             strings_can_be_null=True)
+    read_options = _pa_csv.ReadOptions(skip_rows=skiprows or 0)
+    for batch in _pa_csv.open_csv(f, read_options=read_options,
+                                  convert_options=convert_options):
+        pending.append(batch)
+        nrows += batch.num_rows
+        while nrows >= chunksize:
+            table = _pa.Table.from_batches(pending)
+            yield to_pandas(table.slice(0, chunksize))
+            start += chunksize
+            rest = table.slice(chunksize)
+            pending = rest.to_batches()
+            nrows = rest.num_rows
+    if nrows:
+        yield to_pandas(_pa.Table.from_batches(pending))
+
+
+def _read_csv_chunks(source: tuple, csv_kwargs: dict, chunksize: int):
+    # lazy: the file is opened when the first chunk is requested
+    start = 0
+    if csv_kwargs.get("engine") == "pyarrow":
+        with _open_source(source) as f:
+            try:
+                for chunk in _arrow_csv_chunks(f, chunksize, csv_kwargs):
+                    yield chunk
+                    start += len(chunk)
+                return
+            except _pa.ArrowInvalid:
+                # arrow infers column types from the first block only: if a
+                # column changes type later, the rows not yet returned are
+                # read by the pandas reader
+                pass
+        # lines already read: the ones skipped, the header and the rows
+        # returned
+        skip = csv_kwargs.get("skiprows") or 0
+        csv_kwargs = {k: v for k, v in csv_kwargs.items()
+                      if k not in {"engine", "skiprows"}}
+        if skip or start:
+            csv_kwargs["skiprows"] = lambda i: i < skip or skip < i <= skip + start
+    with _open_source(source) as f:
+        with _pd.read_csv(f, chunksize=chunksize, **csv_kwargs) as reader:
+            for chunk in reader:
+                chunk.index = chunk.index + start
+                yield chunk
+
+
+def _plan_sources(plan: list[tuple]) -> list[tuple]:
+    rval = []
+    for kind, _, source in plan:
+        if kind == "zip":
+            rval += _plan_sources(source)
+        else:
+            rval.append((kind, source))
+    return rval
+
+
+def _rm_common_prefix(x: dict) -> dict:
+    common_prefix = _os.path.commonprefix(list(x.keys()))
+    return {k.removeprefix(common_prefix): v for k, v in x.items()}
+
+
+def _assemble_import(plan: list[tuple], data: dict) -> dict[str, _pd.DataFrame]:
+    """Name the data read as import_data does"""
+    rval: dict[str, _pd.DataFrame] = {}
+    for kind, fname, source in plan:
+        if kind == "csv":
+            dfname = fname
+            if dfname not in rval.keys():  # check for duplicates
+                rval[dfname] = data[source]
+            else:
+                msg = f"{dfname} is duplicated, skipping to avoid overwriting"
+                raise Warning(msg)
+        elif kind == "excel":
+            sheets = {
+                f"{fname}_{k}": v for k, v in data[source].items()
+            }  # add xlsx to sheet names
+            rval.update(sheets)
+        else:
+            zipped_data = _assemble_import(source, data)
+            if not zipped_data:
+                msg = "No data to be imported."
+                raise ValueError(msg)
+            if len(zipped_data) > 1:
+                zipped_data = _rm_common_prefix(zipped_data)
+            # prepend zip name to fname (as keys) and update results
+            zipped_data = {
+                f"{fname}_{k}": v for k, v in zipped_data.items()
+            }
+            rval.update(zipped_data)
+    return rval
+
+
 def import_data(fpaths: str | _Path | _Sequence[str | _Path],
                 csv_kwargs: dict = {"dtype_backend": _default_dtype_backend},
                 excel_kwargs: dict = {"dtype_backend": _default_dtype_backend},
-                rm_common_prefix: bool = True
-                ) -> _pd.DataFrame | dict[str, _pd.DataFrame]:
+                rm_common_prefix: bool = True,
+                max_workers: int | None = None,
+                executor: str = "thread",
+                engine: str = "pandas",
+                chunksize: int | None = None,
+                cache: str | _Path | None = None,
+                cache_max_size: int = 2 * 1024**3,
+                excel_reader: str | _Callable = "pandas",
+                sheets: _Sequence[str | int] | None = None
+                ):
     '''Import data
 
-    Can be used to import data from one or several filepaths
+    Can be used to import data from one or several filepaths; files (and
+    members of zip archives, read without extracting them) are read
+    concurrently.
 
     Parameters
     ----------
@@ -222,60 +980,95 @@ def import_data(fpaths: str | _Path | _Sequence[str | _Path],
         parameter passed to read_excel
     rm_common_prefix: bool
         if dataset share the same common prefix, remove it
+    max_workers: int or None
+        number of files read at once (None: executor default, 1: no
+        concurrency)
+    executor: str
+        "thread" or "process" (better for excel files, parsed in python)
+    engine: str
+        csv parser: "pandas" (read_csv defaults, or the engine given in
+        csv_kwargs) or "arrow" (multithreaded pyarrow.csv reader)
+    chunksize: int or None
+        if given, csv are read lazily by chunks of rows: each dataset is an
+        iterator of DataFrames, to process files larger than memory (excel
+        sheets are read at once and yielded as a single chunk); with the
+        arrow engine (csv_kwargs limited to dtype_backend and an integer
+        skiprows), column types are guessed from the first block, and if
+        one changes later the remaining chunks are read by pandas
+    cache: str, Path or None
+        directory of an on-disk cache of parsed files (as parquet): unchanged
+        files (same path, size, mtime, content and reader kwargs) are not
+        parsed again; csv read by chunks are not cached
+    cache_max_size: int
+        cache size (bytes) beyond which least recently used files are
+        removed
+    excel_reader: str or callable
+        "pandas" (read_excel with openpyxl/xlrd), "calamine" (read_excel
+        with python-calamine) or "stream" (xlsx xml parsed as a stream,
+        faster on big sheets; usecols/nrows in excel_kwargs limit the
+        cells converted and the rows read); or a
+        reader(file, sheets, **excel_kwargs) returning a dict of DataFrame
+        by sheet name
+    sheets: sequence of str/int or None
+        sheets to be imported from excel files (names or positions), None
+        for all of them; the others are not parsed
 
     Returns
     -------
-    A dict of DataFrame
+    A dict of DataFrame (or of iterators of DataFrame if chunksize is given)
 
+    Examples
+    --------
+    >>> # first rows of two columns of a sheet of a big workbook
+    >>> df = import_data("data/big.xlsx", excel_reader="stream",
+    ...                  sheets=["visits"],
+    ...                  excel_kwargs={"usecols": "A:B", "nrows": 100})
+    >>> # coerce a big file by chunks
+    >>> plan = lb.dm.CoercionPlan(directives, schema=schema_df)
+    >>> for chunk in import_data("data/big.csv", engine="arrow",
+    ...                          chunksize=1_000_000):
+    ...     export_data(plan.coerce(chunk), ...)
     '''
+    executor = _match_arg(executor, ["thread", "process"])
+    engine = _match_arg(engine, ["pandas", "arrow"])
+    if engine == "arrow":
+        csv_kwargs = {**csv_kwargs, "engine": "pyarrow"}
+    if isinstance(excel_reader, str):
+        excel_reader = _match_arg(excel_reader, list(_excel_readers))
+    if excel_reader != "pandas" or sheets is not None:
+        excel_kwargs = {**excel_kwargs, "reader": excel_reader,
+                        "sheets": None if sheets is None else list(sheets)}
     # uniform 1 to many and clean input
     if isinstance(fpaths, str) or isinstance(fpaths, _Path):
         fpaths = [fpaths]
-    accepted_fpaths = [
-        str(f)
-        for f in fpaths
-        if _os.path.splitext(f)[1].lower() in {".csv", ".xls", ".xlsx", ".zip"}
-    ]
-
-    rval: dict[str, _pd.DataFrame] = {}
-
-    for fpath in accepted_fpaths:
-        fname = _os.path.splitext(_os.path.basename(fpath))[0]
-        fext = _os.path.splitext(fpath)[1].lower()
-        if fext == ".csv":
-            dfname = fname
-            data = _pd.read_csv(fpath, **csv_kwargs)
-            if dfname not in rval.keys():  # check for duplicates
-                rval[dfname] = data
+    plan = _import_plan([str(f) for f in fpaths])
+    sources = _plan_sources(plan)
+    if cache is not None:
+        cache = _ImportCache(cache, cache_max_size)
+
+    if chunksize is not None:
+        data = {}
+        for kind, source in sources:
+            if kind == "csv":
+                data[source] = _read_csv_chunks(source, csv_kwargs, chunksize)
             else:
-                msg = f"{dfname} is duplicated, skipping to avoid overwriting"
-                raise Warning(msg)
-        elif fext in {".xls", ".xlsx"}:
-            sheets = _pd.read_excel(
-                fpath, None, **excel_kwargs
-            )  # import all the sheets as a dict of DataFrame
-            sheets = {
-                f"{fname}_{k}": v for k, v in sheets.items()
-            }  # add xlsx to sheet names
-            rval.update(sheets)
-        elif (
-            fext == ".zip"
-        ):  # unzip in temporary directory and go by recursion
-            with _tempfile.TemporaryDirectory() as tempdir:
-                with _zipfile.ZipFile(fpath) as myzip:
-                    myzip.extractall(tempdir)
-                    zipped_fpaths = [
-                        _os.path.join(tempdir, f) for f in _os.listdir(tempdir)
-                    ]
-                    zipped_data = import_data(zipped_fpaths)
-            # prepend zip name to fname (as keys) and update results
-            zipped_data = {
-                f"{fname}_{k}": v for k, v in zipped_data.items()
-            }
-            rval.update(zipped_data)
-        else:
-            msg = f"File format not supported for {fext}. Ignoring it."
-            raise Warning(msg)
+                sheets = _read_source(kind, source, csv_kwargs, excel_kwargs,
+                                      cache)
+                data[source] = {k: iter([v]) for k, v in sheets.items()}
+    elif max_workers == 1 or len(sources) <= 1:
+        data = {source: _read_source(kind, source, csv_kwargs, excel_kwargs,
+                                     cache)
+                for kind, source in sources}
+    else:
+        pool = _ThreadPoolExecutor if executor == "thread" else _ProcessPoolExecutor
+        with pool(max_workers=max_workers) as ex:
+            futures = {source: ex.submit(_read_source, kind, source,
+                                         csv_kwargs, excel_kwargs, cache)
+                       for kind, source in sources}
+            data = {source: future.result() for source, future in futures.items()}
+    if cache is not None:
+        cache.evict()
+    rval = _assemble_import(plan, data)
 
     if len(rval) == 1:
         # a single dataset: return the data directly
@@ -284,9 +1077,7 @@ def import_data(fpaths: str | _Path | _Sequence[str | _Path],
     elif len(rval) > 1:
         # multiple dataset return the dict and remove common name prefix
         if rm_common_prefix:
-            keys = list(rval.keys())
-            common_prefix = _os.path.commonprefix(keys)
-            rval = {k.removeprefix(common_prefix) : rval[k] for k in rval.keys()}
+            rval = _rm_common_prefix(rval)
         return rval
     else:
         msg = "No data to be imported."
@@ -295,190 +1086,487 @@ def import_data(fpaths: str | _Path | _Sequence[str | _Path],
 
 # _rdf: pd.DataFrame to R data.frame converter (a-la dput)
 # --------------------------------------------------------
-def _rdf_missing(x: _pd.Series, xn: str):
-    rval = f"{xn} = c(NA)"
-    return rval
+# columns are formatted (as arrow arrays of R literals) and written by
+# chunks of rows, so that memory doesn't grow with the data
+_rdf_chunksize = 100_000
 
 
-def _rdf_integer(x: _pd.Series, xn: str):
-    data_str = x.to_string(
-        na_rep="NA",
-        index=False,
-        header=False,
-    ).replace("\n", ", ")
-    rval = f"{xn} = c({data_str})"
+def _rdf_arrow(x: _pd.Series, type=None) -> _pa.Array:
+    rval = _pa.array(x, type=type, from_pandas=True)
+    if isinstance(rval, _pa.ChunkedArray):
+        rval = rval.combine_chunks()
     return rval
 
 
-# placeholder
-_rdf_numeric = _rdf_integer
+def _rdf_quote(x: _pa.Array, quote: str) -> _pa.Array:
+    return _pc.binary_join_element_wise(quote, x, quote, "")
 
 
-def _rdf_factor(x: _pd.Series, xn: str):
-    # to be safe it's seems to be better rather than
-    # pd.Categorical
-    x = _pd.Series(x, dtype="category")
-    # raw data (integers)
-    data = x.cat.codes
-    data_str = "c({})".format(
-        data.to_string(
-            na_rep="NA",
-            index=False,
-            header=False,
-        ).replace("\n", ", ")
-    )
-    # unique categories and labels
+def _rdf_integer(x: _pd.Series) -> _pa.Array:
+    return _pc.fill_null(_rdf_arrow(x).cast(_pa.string()), "NA")
+
+
+def _rdf_numeric(x: _pd.Series) -> _pa.Array:
+    # shortest repr which round trips, inf as R's Inf
+    floats = _rdf_arrow(x).cast(_pa.float64())
+    rval = floats.cast(_pa.string())
+    if _pc.any(_pc.is_inf(floats)).as_py():
+        rval = _pc.replace_substring_regex(rval, "^(-?)inf$", r"\1Inf")
+    return _pc.fill_null(rval, "NA")
+
+
+def _rdf_bool(x: _pd.Series) -> _pa.Array:
+    rval = _pc.if_else(_rdf_arrow(x, _pa.bool_()), "TRUE", "FALSE")
+    return _pc.fill_null(rval, "NA")
+
+
+def _rdf_escape(x: _pa.Array) -> _pa.Array:
+    """R double quoted string literals"""
+    for char, escaped in [("\\", "\\\\"), ('"', '\\"'), ("\n", "\\n"),
+                          ("\r", "\\r")]:
+        x = _pc.replace_substring(x, char, escaped)
+    return _rdf_quote(x, '"')
+
+
+def _rdf_strings(x: _pd.Series) -> _pa.Array:
+    # non strings and empty strings as null
+    try:
+        rval = _rdf_arrow(x, _pa.string())
+    except (_pa.ArrowInvalid, _pa.ArrowTypeError):
+        rval = _pa.array([v if isinstance(v, str) else None for v in x],
+                         _pa.string())
+    return _pc.if_else(_pc.equal(rval, ""), _pa.scalar(None, _pa.string()), rval)
+
+
+def _rdf_object(x: _pd.Series) -> _pa.Array:
+    return _pc.fill_null(_rdf_escape(_rdf_strings(x)), "NA")
+
+
+def _rdf_codes(x: _pd.Series) -> _pa.Array:
+    # 0-based codes, levels/labels in the factor call (see _rdf)
+    codes = x.cat.codes.to_numpy()
+    return _pa.array(codes, mask=codes < 0)
+
+
+def _rdf_factor(x: _pd.Series) -> _pa.Array:
+    return _pc.fill_null(_rdf_codes(x).cast(_pa.string()), "NA")
+
+
+def _rdf_factor_args(x: _pd.Series) -> str:
     categs = x.cat.categories
-    levels = []
-    labels = []
-    for lev, lab in enumerate(categs):
-        levels.append(str(lev))
-        labels.append(f'"{lab}"')
-
-    levs = ", ".join(levels)
-    labs = ", ".join(labels)
-    levels_str = f"levels = c({levs})"
-    labels_str = f"labels = c({labs})"
-    rval = f"{xn} = factor({data_str}, {levels_str}, {labels_str})"
+    levels = ", ".join(str(lev) for lev in range(len(categs)))
+    labels = _rdf_escape(_pa.array([str(c) for c in categs], _pa.string()))
+    labels = ", ".join(labels.to_pylist())
+    return f"levels = c({levels}), labels = c({labels})"
+
+
+def _rdf_wallclock(x: _pd.Series, dates: bool) -> _pa.Array:
+    # wall clock time to the second (or date)
+    if x.dt.tz is not None:
+        x = x.dt.tz_localize(None)
+    rval = _rdf_arrow(x).cast(_pa.timestamp("s"), safe=False)
+    if dates:
+        rval = rval.cast(_pa.date32())
     return rval
 
 
-def _rdf_object(x: _pd.Series, xn: str):
-    data_l = x.to_list()
-    data_l2 = []
-    for s in data_l:
-        if isinstance(s, str) and s != "":
-            data_l2.append(f'"{s}"')
-        else:
-            data_l2.append("NA")
-    data_str = ", ".join(data_l2)
-    rval = f"{xn} = c({data_str})"
-    return rval
+def _rdf_timestamps(x: _pd.Series, dates: bool) -> _pa.Array:
+    # as iso strings
+    rval = _rdf_wallclock(x, dates).cast(_pa.string())
+    return _pc.fill_null(_rdf_quote(rval, "'"), "NA")
 
 
-def _rdf_bool(x: _pd.Series, xn: str):
-    ft = {True: "TRUE", False: "FALSE"}
-    data_str = (
-        x.map(ft).to_string(
-            na_rep="NA",
-            index=False,
-            header=False,
-        ).replace("\n", ", ")
-    )
-    rval = f"{xn} = c({data_str})"
-    return rval
+def _rdf_date(x: _pd.Series) -> _pa.Array:
+    return _rdf_timestamps(x, dates=True)
 
 
-def _datetimemap(x):
-    if _pd.isna(x):
-        return "NA"
-    else:
-        return x.strftime("'%Y-%m-%d %H:%M:%S'")
+def _rdf_datetime(x: _pd.Series) -> _pa.Array:
+    return _rdf_timestamps(x, dates=False)
 
-    
-def _rdf_datetime(x: _pd.Series, xn: str):
-    recoded = x.map(_datetimemap)
-    val = ", ".join(recoded)
-    rval = f"{xn} = c({val})"
-    return rval
 
+def _rdf_join(x: _pa.Array) -> str:
+    """x elements joined by ", " (in arrow)"""
+    as_list = _pa.ListArray.from_arrays(_pa.array([0, len(x)], _pa.int32()), x)
+    return _pc.binary_join(as_list, ", ")[0].as_py()
 
-def _datemap(x):
-    if _pd.isna(x):
-        return "NA"
-    else:
-        return x.strftime("'%Y-%m-%d'")
-    
 
-def _rdf_date(x: _pd.Series, xn: str):
-    recoded = x.map(_datemap)
-    val = ", ".join(recoded)
-    rval = f"{xn} = c({val})"
-    return rval
+def _rdf_vector(f, x: _pd.Series, fmt, chunksize: int = _rdf_chunksize):
+    """Write x as a R c(...) vector, formatting it by chunks of rows"""
+    f.write("c(")
+    for start in range(0, len(x), chunksize):
+        if start:
+            f.write(", ")
+        f.write(_rdf_join(fmt(x.iloc[start:start + chunksize])))
+    f.write(")")
 
 
-def _rdf_datetime_coercion_code(varlist, are_dates=True):
+def _rdf_datetime_coercion_code(varlist, are_dates=True, dfname="df"):
     v2 = [f"'{v}'" for v in varlist]
     v2 = ", ".join(v2)
     if are_dates:
         # dates code
         varlist = f"datevars <- c({v2});"
-        importcmd = "df[, datevars] <- lapply(df[, datevars], as.Date);"
+        importcmd = f"{dfname}[datevars] <- lapply({dfname}[datevars], as.Date);"
         cleaning = "rm(datevars);"
         return [varlist, importcmd, cleaning]
     else:
         # datetimes code
         varlist = f"dt_vars <- c({v2});"
         importfun = "imp_dt <- function(x) as.POSIXct(x, format='%Y-%m-%d %H:%M:%S');"
-        importcmd = "df[, dt_vars] <- lapply(df[, dt_vars], imp_dt);"
+        importcmd = f"{dfname}[dt_vars] <- lapply({dfname}[dt_vars], imp_dt);"
         cleaning = "rm(dt_vars, imp_dt);"
         return [varlist, importfun, importcmd, cleaning, ""]
 
 
-def _rdf(df: _pd.DataFrame,
-         path: str | _Path,
-         dfname: str = "df"):
-    """
-    pd.DataFrame to R data.frame 'converter'
-    """
-    path = _Path(path)
-
-    r_code = []
+def _rdf_formats(df: _pd.DataFrame) -> tuple[list, list, list]:
+    """Formatter of each column (None for all missing ones), date and
+    datetime variables: all checked before writing anything"""
+    formats = []
     date_vars = []
     datetime_vars = []
-    r_code.append(f"{dfname} <- data.frame(")
     for var in df.columns:
         x = df[var]
         if _is_bool(x):
-            r_code.append(_rdf_bool(x, var))
+            formats.append(_rdf_bool)
         elif _is_integer(x):
-            r_code.append(_rdf_integer(x, var))
+            formats.append(_rdf_integer)
         elif _is_numeric(x):
-            r_code.append(_rdf_numeric(x, var))
+            formats.append(_rdf_numeric)
         elif _is_categorical(x):
-            r_code.append(_rdf_factor(x, var))
+            formats.append(_rdf_factor)
         elif _is_date(x):
-            r_code.append(_rdf_date(x, var))
+            formats.append(_rdf_date)
             date_vars.append(var)
         elif _is_datetime(x):
-            r_code.append(_rdf_datetime(x, var))
+            formats.append(_rdf_datetime)
             datetime_vars.append(var)
         elif _is_string(x):
-            r_code.append(_rdf_object(x, var))
+            formats.append(_rdf_object)
         elif _is_all_missing(x):
-            r_code.append(_rdf_missing(x, var))
+            formats.append(None)
         else:
             msg = f"{var}: il tipo {x.dtype!r} non è ancora gestito."
             raise ValueError(msg)
-        is_last = var == df.columns[-1]
-        if is_last:
-            r_code.append(")\n")
-        else:
-            r_code.append(",\n")
+    return formats, date_vars, datetime_vars
+
 
-    # fix some NA
-    r_code = [line.replace("<NA>", "NA") for line in r_code]
-    # add code for date/datetime import
+def _rdf(df: _pd.DataFrame,
+         path: str | _Path,
+         dfname: str = "df"):
+    """
+    pd.DataFrame to R data.frame 'converter'
+    """
+    path = _Path(path)
+    formats, date_vars, datetime_vars = _rdf_formats(df)
+    with path.open(mode="w") as f:
+        f.write(f"{dfname} <- data.frame(")
+        for i, (var, fmt) in enumerate(zip(df.columns, formats)):
+            if i:
+                f.write(",\n")
+            x = df.iloc[:, i]
+            f.write(f"{var} = ")
+            if fmt is None:
+                f.write("c(NA)")
+            elif fmt is _rdf_factor:
+                f.write("factor(")
+                _rdf_vector(f, x, fmt)
+                f.write(f", {_rdf_factor_args(x)})")
+            else:
+                _rdf_vector(f, x, fmt)
+        f.write(")\n")
+        # add code for date/datetime import
+        if date_vars:
+            f.writelines(_rdf_datetime_coercion_code(date_vars, True, dfname))
+        if datetime_vars:
+            f.writelines(_rdf_datetime_coercion_code(datetime_vars, False, dfname))
+
+
+# _rbin: pd.DataFrame to parquet/arrow ipc files + R loader script
+# ----------------------------------------------------------------
+# columns are stored as the _rdf literals would be read by R (factor
+# codes, wall clock datetimes as strings) and the loader script turns
+# them into factors, Date and POSIXct as _rdf does
+_rbin_formats = {"parquet": "read_parquet", "arrow": "read_ipc_file"}
+
+
+def _rbin_column(x: _pd.Series, fmt) -> _pa.Array:
+    if fmt is None:
+        return _pa.nulls(len(x))
+    if fmt is _rdf_bool:
+        return _rdf_arrow(x, _pa.bool_())
+    if fmt is _rdf_integer:
+        return _rdf_arrow(x)
+    if fmt is _rdf_numeric:
+        return _rdf_arrow(x).cast(_pa.float64())
+    if fmt is _rdf_factor:
+        return _rdf_codes(x)
+    if fmt is _rdf_date:
+        return _rdf_wallclock(x, dates=True)
+    if fmt is _rdf_datetime:
+        return _rdf_wallclock(x, dates=False).cast(_pa.string())
+    return _rdf_strings(x)
+
+
+def _rbin_loader(df: _pd.DataFrame,
+                 path: str | _Path,
+                 fname: str,
+                 dfname: str = "df",
+                 fmt: str = "parquet"):
+    """Write the R code reading fname (relative to the working directory,
+    or to the script with source(..., chdir = TRUE)) in a data.frame"""
+    def literal(s):
+        return _rdf_escape(_pa.array([str(s)])).to_pylist()[0]
+
+    formats, date_vars, datetime_vars = _rdf_formats(df)
+    reader = _rbin_formats[fmt]
+    lines = [f"{dfname} <- as.data.frame(arrow::{reader}({literal(fname)}));"]
+    for i, fmt in enumerate(formats):
+        if fmt is _rdf_factor:
+            var = literal(df.columns[i])
+            lines.append(f"{dfname}[[{var}]] <- factor({dfname}[[{var}]], "
+                         f"{_rdf_factor_args(df.iloc[:, i])});")
     if date_vars:
-        r_code += _rdf_datetime_coercion_code(date_vars, are_dates=True)
+        lines.extend(_rdf_datetime_coercion_code(date_vars, True, dfname))
     if datetime_vars:
-        r_code += _rdf_datetime_coercion_code(datetime_vars, are_dates=False)
-    # finally export the surce code
-    with path.open(mode="w") as f:
-        f.writelines(r_code)
+        lines.extend(_rdf_datetime_coercion_code(datetime_vars, False, dfname))
+    _Path(path).write_text("\n".join(lines).rstrip("\n") + "\n")
+
+
+def _rbin(df: _pd.DataFrame,
+          path: str | _Path,
+          fmt: str = "parquet"):
+    """
+    pd.DataFrame to parquet/arrow ipc file, with the same column types of
+    _rdf (see _rbin_loader for the R side)
+    """
+    formats = _rdf_formats(df)[0]
+    names = [str(var) for var in df.columns]
+    with _ExitStack() as stack:
+        writer = None
+        for start in range(0, max(len(df), 1), _rdf_chunksize):
+            chunk = df.iloc[start:start + _rdf_chunksize]
+            arrays = [_rbin_column(chunk.iloc[:, i], f)
+                      for i, f in enumerate(formats)]
+            batch = _pa.RecordBatch.from_arrays(arrays, names=names)
+            if writer is None:
+                schema = batch.schema
+                if fmt == "parquet":
+                    import pyarrow.parquet as _pq
+
+                    writer = _pq.ParquetWriter(path, schema)
+                else:
+                    writer = _pa.ipc.new_file(path, schema)
+                stack.enter_context(writer)
+            writer.write_batch(batch.cast(schema))
+
+
+# export_data: each output file is written by a job (in a thread pool) in
+# a temporary directory, and moved in place only when all succeeded
+_xlsx_max_rows = 1_048_576
+_xlsx_chunksize = 10_000
+
+
+def _xlsx_sheets(x: _pd.DataFrame | dict[str, _pd.DataFrame],
+                 index: bool = False) -> list[tuple[str, _pd.DataFrame]]:
+    """(sheet name, rows) of each sheet: DataFrames longer than an excel
+    sheet continue in the following ones ("Foglio 2", "name_2", ...)"""
+    rval = []
+    frames = {None: x} if isinstance(x, _pd.DataFrame) else x
+    for k, v in frames.items():
+        if isinstance(v, _pd.Series):
+            v = v.to_frame()
+        # header rows (and the index names one of multiindex columns)
+        header = v.columns.nlevels + (1 if v.columns.nlevels > 1 and index else 0)
+        per_sheet = _xlsx_max_rows - header
+        for n, start in enumerate(range(0, max(len(v), 1), per_sheet), 1):
+            if k is None:
+                name = f"Foglio {n}"
+            else:
+                # preprocess the key of the dict, it must be an accepted excel
+                # sheetname. Trim it to the first x characters
+                name = _fix_varnames(k)[:31]
+                if n > 1:
+                    suffix = f"_{n}"
+                    name = name[:31 - len(suffix)].rstrip("_") + suffix
+            rval.append((name, v.iloc[start:start + per_sheet]))
+    return rval
+
+
+def _write_xlsx_pandas(x: _pd.DataFrame | dict[str, _pd.DataFrame],
+                       path: str | _Path,
+                       index: bool = False):
+    with _pd.ExcelWriter(path) as writer:
+        for name, v in _xlsx_sheets(x, index):
+            v.to_excel(writer, sheet_name=name, index=index)
+
+
+def _xlsx_rows(df: _pd.DataFrame, index: bool = False):
+    """Header and rows of df as lists of python values (missing as None,
+    infinites as strings, as to_excel does), converted by chunks"""
+    if df.columns.nlevels > 1:
+        msg = "Multiindex columns are not supported by streaming xlsx engines."
+        raise ValueError(msg)
+    names = [str(c) for c in df.columns]
+    if index:
+        names = ["" if n is None else str(n) for n in df.index.names] + names
+    yield names
+    for start in range(0, len(df), _xlsx_chunksize):
+        chunk = df.iloc[start:start + _xlsx_chunksize]
+        if index:
+            chunk = chunk.reset_index(allow_duplicates=True)
+        columns = []
+        for i in range(chunk.shape[1]):
+            x = chunk.iloc[:, i]
+            if _is_datetime(x) and x.dt.tz is not None:
+                msg = ("Excel does not support datetimes with timezones. "
+                       "Please ensure that datetimes are timezone unaware "
+                       "before writing to Excel.")
+                raise ValueError(msg)
+            values = x.astype(object).where(x.notna(), None)
+            if _is_numeric(x) and not _is_integer(x) and not _is_bool(x):
+                floats = x.to_numpy(dtype=float, na_value=_np.nan)
+                values[_np.isposinf(floats)] = "inf"
+                values[_np.isneginf(floats)] = "-inf"
+            columns.append(values.tolist())
+        yield from (list(row) for row in zip(*columns))
+
+
+def _write_xlsx_openpyxl(x: _pd.DataFrame | dict[str, _pd.DataFrame],
+                         path: str | _Path,
+                         index: bool = False):
+    """openpyxl write only workbook: rows are serialized as they are
+    appended"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, v in _xlsx_sheets(x, index):
+        ws = wb.create_sheet(name)
+        for row in _xlsx_rows(v, index):
+            ws.append(row)
+    wb.save(path)
+
+
+def _write_xlsx_xlsxwriter(x: _pd.DataFrame | dict[str, _pd.DataFrame],
+                           path: str | _Path,
+                           index: bool = False):
+    """xlsxwriter constant memory workbook: each row is flushed to disk
+    when the next one is written"""
+    import xlsxwriter
+
+    options = {"constant_memory": True,
+               "default_date_format": "yyyy-mm-dd hh:mm:ss"}
+    with xlsxwriter.Workbook(path, options) as wb:
+        for name, v in _xlsx_sheets(x, index):
+            ws = wb.add_worksheet(name)
+            for i, row in enumerate(_xlsx_rows(v, index)):
+                ws.write_row(i, 0, row)
+
+
+# xlsx writers: writer(x, path, index) of a DataFrame or dict of them
+_xlsx_writers = {
+    "pandas": _write_xlsx_pandas,
+    "openpyxl": _write_xlsx_openpyxl,
+    "xlsxwriter": _write_xlsx_xlsxwriter,
+}
+
+
+def _export_plan(x: _pd.DataFrame | dict[str, _pd.DataFrame],
+                 path: _Path,
+                 used_formats: list[str],
+                 index: bool,
+                 dfname: str,
+                 xlsx_engine: str = "pandas") -> list[tuple[_Path, _Callable]]:
+    """(output path, writer taking the path to write) of each file"""
+    path_has_suffix = path.suffix != ""
+    frames = {None: x} if isinstance(x, _pd.DataFrame) else x
+
+    def out_path(k, ext):
+        if k is None:
+            # a DataFrame
+            return path if path_has_suffix else path.with_suffix(f".{ext}")
+        # a dict: use dict key as postfix
+        return path.parent / (str(path.stem) + f"_{k}.{ext}")
+
+    jobs = []
+    if "xlsx" in used_formats:
+        xlsx_path = path if path_has_suffix else path.with_suffix(".xlsx")
+        jobs.append((xlsx_path,
+                     _partial(_xlsx_writers[xlsx_engine], x, index=index)))
+    for k, v in frames.items():
+        name = dfname if k is None else k
+        if "csv" in used_formats:
+            jobs.append((out_path(k, "csv"), _partial(v.to_csv, index=index)))
+        if "pkl" in used_formats:
+            jobs.append((out_path(k, "pkl"), v.to_pickle))
+        if "R" in used_formats:
+            jobs.append((out_path(k, "R"), _partial(_rdf, v, dfname=name)))
+        if "feather" in used_formats:
+            jobs.append((out_path(k, "feather"), v.to_feather))
+        for fmt in _rbin_formats:
+            if fmt in used_formats:
+                bin_path = out_path(k, fmt)
+                jobs.append((bin_path, _partial(_rbin, v, fmt=fmt)))
+                jobs.append((bin_path.with_name(bin_path.name + ".R"),
+                             _partial(_rbin_loader, v, fname=bin_path.name,
+                                      dfname=name, fmt=fmt)))
+    return jobs
+
+
+def _run_export(jobs: list[tuple[_Path, _Callable]],
+                max_workers: int | None = None):
+    """Run the writers of jobs on temporary files, then move them all in
+    place: if any writer fails, no output is touched"""
+    if not jobs:
+        return
+    parent = jobs[0][0].parent
+    tmp = _Path(_tempfile.mkdtemp(dir=parent, prefix=".export"))
+    try:
+        # same file name (extension selects the engine of some writers)
+        tmp_paths = [tmp / str(i) / out.name for i, (out, _) in enumerate(jobs)]
+        for tmp_path in tmp_paths:
+            tmp_path.parent.mkdir()
+        if max_workers == 1 or len(jobs) <= 1:
+            for (_, write), tmp_path in zip(jobs, tmp_paths):
+                write(tmp_path)
+        else:
+            with _ThreadPoolExecutor(max_workers=max_workers) as ex:
+                futures = [ex.submit(write, tmp_path)
+                           for (_, write), tmp_path in zip(jobs, tmp_paths)]
+                # wait for all, then raise the first error
+                for future in futures:
+                    future.exception()
+                for future in futures:
+                    future.result()
+        for (out, _), tmp_path in zip(jobs, tmp_paths):
+            _os.replace(tmp_path, out)
+    finally:
+        _shutil.rmtree(tmp, ignore_errors=True)
 
 
 def export_data(x: _pd.DataFrame | dict[str, _pd.DataFrame],
                 path: str | _Path,
                 ext: str | list[str] = ["xlsx", "csv", "pkl", "R", "feather"],
                 index=False,
-                dfname="df"
+                dfname="df",
+                max_workers: int | None = None,
+                xlsx_engine: str = "pandas"
                 ) -> None:
     """Export a DataFrame or a dict of DataFrames as csv/xlsx
 
     In case of a dict is used and a csv path is given, the path is
     suffixed with dict names
 
+    Besides the R source dump ("R"), data can be given to R as "parquet"
+    or "arrow" (ipc) files: each comes with a loader script (path +
+    ".R", to be source()d with chdir = TRUE) which reads it with the arrow
+    package and restores factors, dates and datetimes as the "R" format
+    does, but much faster for large data.
+
+    Files (each format, and each DataFrame of a dict) are written
+    concurrently to a temporary directory and moved in place only when
+    all of them have been written: if one fails, no previous output is
+    overwritten and no partial file is left.
+
     Parameters
     ----------
     x:
@@ -486,11 +1574,21 @@ def export_data(x: _pd.DataFrame | dict[str, _pd.DataFrame],
     fpath:
         file path, if extension is provided it will overwrite formats otherwise formats is considered
     ext:
-        str or list of string with file extensions
+        str or list of string with file extensions (xlsx, csv, pkl, R,
+        feather, parquet, arrow)
     index:
         bool add index in exporting (typically True for results, False for data)
-    verbose: bool
-        for single variables exporting (R) say the varname which is processed
+    dfname:
+        name of the R data.frame (of a DataFrame; dict keys otherwise)
+    max_workers: int or None
+        number of files written at once (None: executor default, 1: no
+        concurrency)
+    xlsx_engine: str
+        "pandas" (ExcelWriter), "openpyxl" (write only workbook) or
+        "xlsxwriter" (constant memory workbook, if installed): the last two
+        write rows by chunks without keeping cells in memory. With any
+        engine, DataFrames longer than an excel sheet continue in the
+        following ones ("Foglio 2", "name_2", ...)
     """
 
     if not (isinstance(x, _pd.DataFrame) or isinstance(x, dict)):
@@ -499,64 +1597,15 @@ def export_data(x: _pd.DataFrame | dict[str, _pd.DataFrame],
 
     if isinstance(ext, str):  # uniforma
         ext = [ext]
+    xlsx_engine = _match_arg(xlsx_engine, list(_xlsx_writers))
 
     path = _Path(path)
-    path_has_suffix = path.suffix != ""
-    if path_has_suffix:
+    if path.suffix != "":
         used_formats = [path.suffix.replace(".", "")]
     else:
         used_formats = ext
-
-    if "xlsx" in used_formats:
-        xlsx_path = path if path_has_suffix else path.with_suffix(".xlsx")
-        with _pd.ExcelWriter(xlsx_path) as writer:
-            if isinstance(x, _pd.DataFrame):
-                x.to_excel(writer, sheet_name="Foglio 1", index=index)
-            elif isinstance(x, dict):
-                for k, v in x.items():
-                    # preprocess the key of the dict, it must be an accepted excel
-                    # sheetname. Trim it to the first x characters
-                    k = _fix_varnames(k)[:31]
-                    v.to_excel(writer, sheet_name=k, index=index)
-
-    if "csv" in used_formats:
-        if isinstance(x, _pd.DataFrame):
-            x.to_csv(path if path_has_suffix else path.with_suffix(".csv"), index=index)
-        elif isinstance(x, dict):
-            # use dict key as postfix
-            for k, v in x.items():
-                csv_path = path.parent / (str(path.stem) + f"_{k}.csv")
-                v.to_csv(csv_path, index=index)
-
-    if "pkl" in used_formats:
-        if isinstance(x, _pd.DataFrame):
-            x.to_pickle(path if path_has_suffix else path.with_suffix(".pkl"))
-        elif isinstance(x, dict):
-            # use dict key as postfix
-            for k, v in x.items():
-                pkl_path = path.parent / (str(path.stem) + f"_{k}.pkl")
-                v.to_pickle(pkl_path)
-
-    if "R" in used_formats:
-        if isinstance(x, _pd.DataFrame):
-            _rdf(x,
-                 path if path_has_suffix else path.with_suffix(".R"),
-                 dfname)
-        elif isinstance(x, dict):
-            # use dict key as postfix
-            for k, v in x.items():
-                r_path = path.parent / (str(path.stem) + f"_{k}.R")
-                _rdf(v, r_path, dfname=k)
-
-    if "feather" in used_formats:
-        if isinstance(x, _pd.DataFrame):
-            x.to_feather(path if path_has_suffix else path.with_suffix(".feather"))
-        elif isinstance(x, dict):
-            # use dict key as postfix
-            for k, v in x.items():
-                feather_path = path.parent / (str(path.stem) + f"_{k}.feather")
-                v.to_feather(feather_path)
-
+    jobs = _export_plan(x, path, used_formats, index, dfname, xlsx_engine)
+    _run_export(jobs, max_workers)
 
 
 # ------------------------------------
@@ -582,6 +1631,32 @@ _latex_special_chars = {
 }
 
 
+_latex_translation = str.maketrans(_latex_special_chars)
+
+# table cells are escaped as DataFrame.to_latex(escape=True) does (pandas'
+# Styler _escape_latex): a space after the commands which would gobble it
+# becomes an explicit \space
+_latex_cell_chars = {
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde ",
+    "^": r"\textasciicircum ",
+    "\\": r"\textbackslash ",
+}
+_latex_cell_translation = str.maketrans(_latex_cell_chars)
+_latex_cell_spaces = _re.compile(r"(\\textasciitilde|\\textasciicircum|\\textbackslash)  ")
+
+
+def _latex_cell_escape(s: str) -> str:
+    """Escape a table cell as to_latex does"""
+    return _latex_cell_spaces.sub(r"\1 \\space ", s.translate(_latex_cell_translation))
+
+
 def _latex_escape(s):
     """
     latex_escape from PyLaTeX
@@ -589,8 +1664,108 @@ def _latex_escape(s):
     s: a str or something coercible to it
     >>> print(latex_escape("asd_foo_bar"))
     """
-    string = str(s)
-    return "".join(_latex_special_chars.get(c, c) for c in string)
+    return str(s).translate(_latex_translation)
+
+
+def _latex_values(x: _pd.Series, float_format: str) -> _np.ndarray:
+    """Cells of a column as to_latex formats them: floats with
+    float_format, strings escaped, missing values empty"""
+    if isinstance(x.dtype, _pd.CategoricalDtype):
+        # categories formatted once
+        categs = _latex_values(_pd.Series(x.cat.categories), float_format)
+        codes = x.cat.codes.to_numpy()
+        return _np.where(codes < 0, "", categs[codes]).astype(object)
+    na = x.isna().to_numpy()
+    if x.dtype == object:
+        def fmt(v):
+            if isinstance(v, str):
+                return _latex_cell_escape(v)
+            return float_format % v if isinstance(v, float) else str(v)
+        values = _np.array([fmt(v) for v in x.to_numpy()], dtype=object)
+    elif _pd.api.types.is_float_dtype(x.dtype):
+        floats = x.to_numpy(dtype=float, na_value=0.0)
+        values = _np.char.mod(float_format, floats).astype(object)
+    elif _pd.api.types.is_string_dtype(x.dtype):
+        values = _np.array([_latex_cell_escape(v)
+                            for v in x.to_numpy(dtype=object, na_value="")],
+                           dtype=object)
+    elif x.dtype.kind in "iub":
+        values = x.astype(str).to_numpy(dtype=object)
+    else:
+        values = _np.array([str(v) for v in x.to_numpy(dtype=object)],
+                           dtype=object)
+    values[na] = ""
+    return values
+
+
+def _latex_label_caption(label: str, caption: str) -> tuple[str, str]:
+    if (label == "") or (not isinstance(label, str)):
+        msg = "Please provide a label for the table."
+        raise ValueError(msg)
+    caption = (
+        label.capitalize().replace("_", " ") if caption == "" else caption
+    )
+    return "tab:" + label, _latex_escape(caption)
+
+
+def _latex_render(
+    tab,
+    label: str = "",
+    caption: str = "",
+    position: str | None = None,
+    float_format: str = "%.1f",
+    column_format: str | None = None,
+) -> str:
+    """LaTeX code of a table, as latex_table prints it: DataFrames (or
+    Series) with flat index and columns are rendered here by columns,
+    anything else by its to_latex method"""
+    latex_label, latex_caption = _latex_label_caption(label, caption)
+    if isinstance(tab, _pd.Series):
+        tab = tab.to_frame()
+    if (column_format is None) and isinstance(tab, _pd.DataFrame):
+        ncols = tab.shape[1]
+        column_format = "".join(["l"] + ["r"] * ncols)
+    if (not isinstance(tab, _pd.DataFrame) or tab.index.nlevels > 1
+            or tab.columns.nlevels > 1):
+        if isinstance(tab, _pd.DataFrame) and tab.columns.nlevels == 1:
+            # a new frame: the caller's one (eg being exported to excel
+            # meanwhile by export_tables) keeps its columns name
+            tab = tab.rename_axis(columns=None)
+        # per avere il centering è necessario impostare lo stile
+        # https://pandas.pydata.org/docs/reference/api/pandas.io.formats.style.Styler.to_latex.html
+        return tab.to_latex(
+            # fissi
+            na_rep="",
+            index=True,
+            index_names=False,
+            escape=True,
+            # position_float='centering', # one day. maybe.
+            # variabili
+            label=latex_label,
+            caption=latex_caption,
+            position=position,
+            float_format=float_format,
+            column_format=column_format,
+        )
+    # index labels as the Styler default format (6 decimals)
+    header = _latex_values(_pd.Series(tab.columns, dtype=object), "%.6f")
+    cells = [_latex_values(_pd.Series(tab.index), "%.6f")]
+    cells += [_latex_values(tab.iloc[:, i], float_format)
+              for i in range(tab.shape[1])]
+    rows = [" & ".join(row) + " \\\\" for row in zip(*cells)]
+    lines = ["\\begin{table}" + ("" if position is None else f"[{position}]"),
+             f"\\caption{{{latex_caption}}}",
+             f"\\label{{{latex_label}}}",
+             f"\\begin{{tabular}}{{{column_format}}}",
+             "\\toprule",
+             " & ".join(["", *header]) + " \\\\",
+             "\\midrule",
+             *rows,
+             "\\bottomrule",
+             "\\end{tabular}",
+             "\\end{table}",
+             ""]
+    return "\n".join(lines)
 
 
 def latex_table(
@@ -618,48 +1793,92 @@ def latex_table(
         lettere posizionamento tabella (ad esempio https://stackoverflow.com/questions/1673942)
 
     """
-    if (label == "") or (not isinstance(label, str)):
-        msg = "Please provide a label for the table."
-        raise ValueError(msg)
-    caption = (
-        label.capitalize().replace("_", " ") if caption == "" else caption
-    )
-    latex_caption = _latex_escape(caption)
-    latex_label = "tab:" + label
-    if isinstance(tab, _pd.DataFrame):
-        tab.columns.name = None
-    if (column_format is None) and isinstance(tab, _pd.DataFrame):
-        ncols = tab.shape[1]
-        column_format = "".join(["l"] + ["r"] * ncols)
-    # per avere il centering è necessario impostare lo stile
-    # https://pandas.pydata.org/docs/reference/api/pandas.io.formats.style.Styler.to_latex.html
-    content = tab.to_latex(
-        # fissi
-        na_rep="",
-        index=True,
-        index_names=False,
-        escape=True,
-        # position_float='centering', # one day. maybe.
-        # variabili
-        label=latex_label,
-        caption=latex_caption,
-        position=position,
-        float_format=float_format,
-        column_format=column_format,
-    )
-    print(content)
+    print(_latex_render(tab, label, caption, position, float_format,
+                        column_format))
+
+
+def latex_tables(tabs_dict: dict,
+                 file: str | _Path | _io.TextIOBase | None = None,
+                 position: str | None = None,
+                 float_format: str = "%.1f") -> list[str]:
+    """Render a dict of tables (caption as key) as latex_table does, all
+    in one output written at once
+
+    Parameters
+    ----------
+    tabs_dict:
+       dict of DataFrame to be rendered
+    file:
+       path or text stream of the output (None: stdout)
+    position: str
+        lettere posizionamento tabella
+    float_format: str
+        format of floats
+
+    Returns
+    -------
+    the table labels
+    """
+    labels = []
+    out = _io.StringIO()
+    for caption, tab in tabs_dict.items():
+        lab = _fix_varnames(caption)
+        labels.append(lab)
+        out.write(_latex_render(tab, label=lab, caption=caption,
+                                position=position, float_format=float_format))
+        # as print
+        out.write("\n")
+    if file is None:
+        _sys.stdout.write(out.getvalue())
+    elif isinstance(file, str | _Path):
+        _Path(file).write_text(out.getvalue())
+    else:
+        file.write(out.getvalue())
+    return labels
+
+
+def _tables_fingerprint(tabs_dict: dict, *params) -> str | None:
+    """Content hash of a dict of tables (captions, labels and values) and
+    rendering parameters; None if some table can't be hashed"""
+    rval = _hashlib.blake2b(digest_size=16)
+    rval.update(repr(params).encode())
+    for caption, tab in tabs_dict.items():
+        if not isinstance(tab, _pd.DataFrame | _pd.Series):
+            return None
+        try:
+            values = _pd.util.hash_pandas_object(tab, index=True).to_numpy()
+        except TypeError:
+            return None
+        labels = tab.columns.tolist() if isinstance(tab, _pd.DataFrame) else tab.name
+        dtypes = tab.dtypes.tolist() if isinstance(tab, _pd.DataFrame) else tab.dtype
+        rval.update(repr((caption, type(tab).__name__, labels,
+                          tab.index.names, dtypes)).encode())
+        rval.update(values.tobytes())
+    return rval.hexdigest()
 
 
 def export_tables(tabs_dict: dict[str, _pd.DataFrame],
-                  outfile: str | _Path = "outputs/tables.xlsx"):
+                  outfile: str | _Path = "outputs/tables.xlsx",
+                  latex_file: str | _Path | None = None,
+                  force: bool = False):
     """Latex print and excel Export a dict of tables (caption as key)
 
+    The excel file is written while tables are rendered. Files written
+    from the same tables (same content hash, in the .artifacts.json
+    manifest of their directory) by the same pylbmisc and pandas
+    versions are left untouched, unless forced.
+
     Parameters
     ----------
     tabs_dict:
        dict of DataFrame to be exported
     outfile:
        path to the excel file for export
+    latex_file:
+       path of the latex output (None: printed)
+    force: bool
+        rewrite files even if unchanged (as with the environment variable
+        PYLBMISC_FORCE_EXPORT=1)
 
     Examples
     --------
@@ -668,14 +1887,29 @@ def export_tables(tabs_dict: dict[str, _pd.DataFrame],
     >>> export_tables(exported)
 
     """
-    # excel
-    export_data(tabs_dict, outfile)
-    # latex
-    labels = []
-    for caption, tab in tabs_dict.items():
-        lab = _fix_varnames(caption)
-        labels.append(lab)
-        latex_table(tab, label = lab, caption = caption)
+    force = _force_export(force)
+    outfile = _Path(outfile)
+    excel_manifest = _ArtifactManifest(outfile.parent)
+    excel_fingerprint = _tables_fingerprint(tabs_dict, "excel")
+    with _ThreadPoolExecutor(max_workers=1) as ex:
+        # excel
+        excel = None
+        if force or not excel_manifest.current(outfile, excel_fingerprint):
+            excel = ex.submit(export_data, tabs_dict, outfile)
+        # latex
+        if latex_file is None:
+            labels = latex_tables(tabs_dict)
+        else:
+            latex_manifest = _ArtifactManifest(_Path(latex_file).parent)
+            latex_fingerprint = _tables_fingerprint(tabs_dict, "latex")
+            if force or not latex_manifest.current(latex_file, latex_fingerprint):
+                labels = latex_tables(tabs_dict, latex_file)
+                latex_manifest.update([latex_file], latex_fingerprint)
+            else:
+                labels = [_fix_varnames(caption) for caption in tabs_dict]
+        if excel is not None:
+            excel.result()
+            excel_manifest.update([outfile], excel_fingerprint)
     # return latex references
-    refs = ["\ref{tab:" + lab + "}" for lab in labels]
+    refs = [r"\ref{tab:" + lab + "}" for lab in labels]
     return refs
@@ -0,0 +1,269 @@
+"""
+Streaming xlsx reader: worksheets xml is parsed directly (no per-cell
+objects as with openpyxl) and only the sheets, columns and rows requested
+are converted.
+"""
+
+import numpy as _np
+import pandas as _pd
+import posixpath as _posixpath
+import xml.etree.ElementTree as _ET
+import zipfile as _zipfile
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS as _BUILTIN_FORMATS
+from openpyxl.styles.numbers import is_date_format as _is_date_format
+from openpyxl.styles.numbers import is_timedelta_format as _is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string as _column_index
+from openpyxl.utils.datetime import CALENDAR_MAC_1904 as _CALENDAR_MAC_1904
+from openpyxl.utils.datetime import CALENDAR_WINDOWS_1900 as _CALENDAR_WINDOWS_1900
+from openpyxl.utils.datetime import from_excel as _from_excel
+from openpyxl.utils.datetime import from_ISO8601 as _from_ISO8601
+from pandas.errors import EmptyDataError as _EmptyDataError
+from pandas.io.parsers import TextParser as _TextParser
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_ROW, _CELL, _VALUE = _NS + "row", _NS + "c", _NS + "v"
+_SI, _TEXT, _RUN, _INLINE = _NS + "si", _NS + "t", _NS + "r", _NS + "is"
+
+# read_excel arguments left to the pandas reader (as multirow headers
+# and index_col lists, checked in read_xlsx)
+_unsupported_kwargs = {"sheet_name", "engine", "engine_kwargs"}
+
+
+def _rels(myzip: _zipfile.ZipFile, part: str) -> dict[str, tuple[str, str]]:
+    """Relationships of a package part as {id: (type, target path)}"""
+    folder, name = _posixpath.split(part)
+    rels_path = _posixpath.join(folder, "_rels", name + ".rels")
+    if rels_path not in myzip.namelist():
+        return {}
+    rval = {}
+    for rel in _ET.fromstring(myzip.read(rels_path)).iter(_REL_NS + "Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = _posixpath.normpath(_posixpath.join(folder, target))
+        rval[rel.get("Id")] = (rel.get("Type").rsplit("/", 1)[-1], target)
+    return rval
+
+
+def _text(element) -> str:
+    """Content of a string item (plain or rich text, no phonetic runs)"""
+    parts = [element.findtext(_TEXT) or ""]
+    parts += [run.findtext(_TEXT) or "" for run in element.iterfind(_RUN)]
+    return "".join(parts)
+
+
+def _shared_strings(myzip: _zipfile.ZipFile, path: str | None) -> list[str]:
+    if path is None:
+        return []
+    rval = []
+    with myzip.open(path) as f:
+        for _, el in _ET.iterparse(f):
+            if el.tag == _SI:
+                rval.append(_text(el))
+                el.clear()
+    return rval
+
+
+def _date_styles(myzip: _zipfile.ZipFile, path: str | None) -> tuple[set, set]:
+    """Indexes of cell styles formatted as dates and as timedeltas (as
+    openpyxl does)"""
+    if path is None:
+        return set(), set()
+    styles = _ET.fromstring(myzip.read(path))
+    custom = {int(f.get("numFmtId")): f.get("formatCode")
+              for f in styles.iter(_NS + "numFmt")}
+    dates, timedeltas = set(), set()
+    cell_xfs = styles.find(_NS + "cellXfs")
+    for i, xf in enumerate([] if cell_xfs is None else cell_xfs.iterfind(_NS + "xf")):
+        fmt_id = int(xf.get("numFmtId", 0))
+        fmt = custom.get(fmt_id, _BUILTIN_FORMATS.get(fmt_id))
+        if fmt is None:
+            continue
+        if _is_date_format(fmt):
+            dates.add(i)
+        if _is_timedelta_format(fmt):
+            timedeltas.add(i)
+    return dates, timedeltas
+
+
+class _Workbook:
+    """Sheet names and paths, shared strings and date styles of a xlsx"""
+
+    def __init__(self, myzip: _zipfile.ZipFile):
+        self.zip = myzip
+        rels = _rels(myzip, "xl/workbook.xml")
+        workbook = _ET.fromstring(myzip.read("xl/workbook.xml"))
+        self.sheets = {}
+        for sheet in workbook.iter(_NS + "sheet"):
+            rel_type, target = rels[sheet.get(_DOC_REL_NS + "id")]
+            if rel_type == "worksheet":
+                self.sheets[sheet.get("name")] = target
+        pr = workbook.find(_NS + "workbookPr")
+        date1904 = pr is not None and pr.get("date1904") in {"1", "true"}
+        self.epoch = _CALENDAR_MAC_1904 if date1904 else _CALENDAR_WINDOWS_1900
+        parts = {rel_type: target for rel_type, target in rels.values()}
+        self.strings = _shared_strings(myzip, parts.get("sharedStrings"))
+        self.dates, self.timedeltas = _date_styles(myzip, parts.get("styles"))
+
+    def cell_value(self, c):
+        """Cell value as pandas gets it from openpyxl: "" if empty, nan for
+        errors, int for integral numbers"""
+        data_type = c.get("t", "n")
+        if data_type == "inlineStr":
+            inline = c.find(_INLINE)
+            return "" if inline is None else _text(inline)
+        value = c.findtext(_VALUE)
+        if not value:
+            return ""
+        if data_type == "n":
+            value = float(value) if ("." in value or "e" in value or "E" in value) \
+                else int(value)
+            style = int(c.get("s", 0))
+            if style in self.dates:
+                try:
+                    return _from_excel(value, self.epoch,
+                                       timedelta=style in self.timedeltas)
+                except (OverflowError, ValueError):
+                    return _np.nan
+            if isinstance(value, float) and value.is_integer():
+                return int(value)
+            return value
+        if data_type == "s":
+            return self.strings[int(value)]
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "e":
+            return _np.nan
+        if data_type == "d":
+            return _from_ISO8601(value)
+        return value  # "str": formula result
+
+    def rows(self, name: str, lo: int = 0, hi: int | None = None,
+             max_rows: int | None = None) -> list[list]:
+        """Rows of a sheet, with cells converted only in columns lo:hi
+        (trailing empty cells trimmed, rows padded to the same width as
+        pandas does) and up to the first max_rows"""
+        cell_value = self.cell_value
+        letters_index: dict[str, int] = {}
+        data = []
+        last_row_with_data = -1
+        # data after column hi: the sheet is wider than the window
+        wider = False
+        with self.zip.open(self.sheets[name]) as f:
+            for _, el in _ET.iterparse(f):
+                if el.tag != _ROW:
+                    continue
+                row_number = int(el.get("r", len(data) + 1)) - 1
+                while len(data) < row_number:   # empty rows are not stored
+                    data.append([])
+                if max_rows is not None and len(data) >= max_rows:
+                    break
+                row = []
+                has_data = False
+                j = -1
+                for c in el.iterfind(_CELL):
+                    ref = c.get("r")
+                    if ref is None:
+                        j += 1
+                    else:
+                        letters = ref.rstrip("0123456789")
+                        j = letters_index.get(letters)
+                        if j is None:
+                            j = letters_index[letters] = _column_index(letters) - 1
+                    if j < lo or (hi is not None and j >= hi):
+                        if not has_data or (not wider and j >= lo):
+                            outside = cell_value(c) != ""
+                            has_data = has_data or outside
+                            wider = wider or (outside and j >= lo)
+                        continue
+                    value = cell_value(c)
+                    if value == "":
+                        continue
+                    if len(row) < j:
+                        row.extend([""] * (j - len(row)))
+                    row.append(value)
+                    has_data = True
+                el.clear()
+                if has_data:
+                    last_row_with_data = row_number
+                data.append(row)
+                if max_rows is not None and len(data) >= max_rows:
+                    break
+        data = data[:max_rows][: last_row_with_data + 1]
+        if data:
+            # columns before lo are kept empty, so that positions and names
+            # of unnamed columns are as with the whole sheet; usecols
+            # columns after the data are empty ones, not missing
+            width = hi if wider else max(lo, max(len(r) for r in data))
+            data = [r + [""] * (width - len(r)) for r in data]
+        return data
+
+
+def _usecols_window(usecols) -> tuple[int, int | None, list[int] | None]:
+    """Column window (lo, hi) and positions for usecols given as excel
+    ranges ("A:C,E") or column positions; (0, None, None) when columns are
+    selected by name or with a callable"""
+    if isinstance(usecols, str):
+        positions = []
+        for rng in usecols.split(","):
+            bounds = [_column_index(b.strip().upper()) - 1 for b in rng.split(":")]
+            positions.extend(range(bounds[0], bounds[-1] + 1))
+    elif (usecols is not None and not callable(usecols)
+          and all(isinstance(i, int) for i in usecols)):
+        positions = list(usecols)
+    else:
+        return 0, None, None
+    if not positions:
+        return 0, None, None
+    lo, hi = min(positions), max(positions) + 1
+    return lo, hi, positions
+
+
+def read_xlsx(f, sheets: list[str | int] | None = None, header: int | None = 0,
+              usecols=None, nrows: int | None = None,
+              skiprows: int | None = None,
+              **kwargs) -> dict[str, _pd.DataFrame]:
+    """Read sheets of a xlsx as read_excel(f, sheets) does: kwargs are
+    passed to the csv TextParser pandas uses for excel too"""
+    unsupported = _unsupported_kwargs.intersection(kwargs)
+    if not isinstance(header, int | None):
+        unsupported.add("header")
+    if not isinstance(kwargs.get("index_col"), int | None):
+        unsupported.add("index_col")
+    if unsupported:
+        msg = ("Arguments not supported by the stream excel reader "
+               f"(use the pandas one): {', '.join(sorted(unsupported))}.")
+        raise ValueError(msg)
+    lo, hi, positions = _usecols_window(usecols)
+    if positions is not None:
+        usecols = positions
+    max_rows = None
+    if nrows is not None and isinstance(skiprows, int | None):
+        max_rows = (1 if header is None else header + 1) + nrows + (skiprows or 0)
+    with _zipfile.ZipFile(f) as myzip:
+        workbook = _Workbook(myzip)
+        names = list(workbook.sheets)
+        if sheets is None:
+            sheets = names
+        rval = {}
+        for sheet in sheets:
+            name = names[sheet] if isinstance(sheet, int) else sheet
+            if name not in workbook.sheets:
+                msg = f"Worksheet named '{name}' not found"
+                raise ValueError(msg)
+            data = workbook.rows(name, lo, hi, max_rows)
+            if not data:
+                rval[name] = _pd.DataFrame()
+                continue
+            try:
+                parser = _TextParser(data, header=header, usecols=usecols,
+                                     nrows=nrows, skiprows=skiprows,
+                                     skip_blank_lines=False, **kwargs)
+                rval[name] = parser.read(nrows=nrows)
+            except _EmptyDataError:
+                rval[name] = _pd.DataFrame()
+    return rval
@@ -2,7 +2,6 @@
 
 import pandas as _pd
 from pylbmisc.r import match_arg as _match_arg
-from scipy import stats as _stats
 
 
 def ci_prop(x, n=None, nas=0, confidence_level=0.95,
@@ -49,6 +48,8 @@ def ci_prop(x, n=None, nas=0, confidence_level=0.95,
     ... )
 
     """
+    from scipy import stats as _stats  # heavy, import only when needed
+
     method = _match_arg(method, ["exact", "wilson", "ccwilson"])
     alternative = _match_arg(alternative, ["two-sided", "greater", "less"])
     # move to scipy.stats._result_classes.BinomTestResult.proportion_ci naming
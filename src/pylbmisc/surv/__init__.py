@@ -6,33 +6,266 @@ Survival analysis function and utilities.
 
 import numpy as _np
 import pandas as _pd
-import matplotlib.pyplot as _plt
-
-from lifelines import KaplanMeierFitter as _KaplanMeierFitter
-from lifelines import CoxPHFitter as _CoxPHFitter
-from lifelines.plotting import add_at_risk_counts as _add_at_risk_counts
-from lifelines.statistics import multivariate_logrank_test \
-    as _multivariate_logrank_test
-from lifelines.utils import qth_survival_times as _qth_survival_times
+
+# matplotlib and lifelines are heavy to import: they're imported inside the
+# functions that need them, so that `import pylbmisc.surv` stays cheap
+from pylbmisc.dm import fix_varnames as _fix_varnames
 from pylbmisc.dm import to_integer as _to_integer
 from pylbmisc.dm import is_datetime as _is_datetime
 from pylbmisc.stats import p_format as _p_format
 from warnings import warn as _warn
 
 
-def _estquant(fit, quantiles):
-    """Return estimates and quantiles of survival function with confidence
-    intervals"""
-    estimates = _pd.concat([fit.survival_function_, fit.confidence_interval_],
-                           axis="columns")
-    quant = _qth_survival_times(quantiles, estimates)
-    quant = quant.reset_index()
-    quant.columns = ["Quantile", "Estimate", "Lower", "Upper"]
-    estimates = estimates.reset_index()  # take time as variable
-    estimates.columns = ["time", "Estimate", "Lower", "Upper"]
+def _km_table(time: _np.ndarray,
+              status: _np.ndarray,
+              codes: _np.ndarray,
+              alpha: float = 0.05) -> dict[str, _np.ndarray]:
+    """Kaplan-Meier estimates of all groups at once (as lifelines'
+    KaplanMeierFitter does for each): rows are sorted once by (group,
+    time), events and at risk counts of each distinct time are computed
+    for all groups together, confidence intervals are the exponential
+    Greenwood ones.
+
+    status is an event indicator: any nonzero value is one event.
+
+    Returns arrays of group codes, times (with time 0 at the beginning of
+    each group, unless there are earlier ones), estimates, lower and upper bounds, and the index of the
+    first row of each group.
+    """
+    from scipy.stats import norm as _norm
+
+    order = _np.lexsort((time, codes))
+    t, e, g = time[order], status[order], codes[order]
+    n = len(t)
+    new = _np.ones(n, dtype=bool)
+    new[1:] = (g[1:] != g[:-1]) | (t[1:] != t[:-1])
+    starts = _np.flatnonzero(new)
+    ut, ug = t[starts], g[starts]
+    deaths = _np.add.reduceat(e, starts)
+    # at risk: group size minus the ones removed at previous times
+    size = _np.bincount(g)
+    begin = _np.cumsum(size) - size
+    at_risk = (size[ug] - (starts - begin[ug])).astype(float)
+    # each curve starts at time 0 (added if all times are later, as
+    # lifelines does)
+    first = _np.flatnonzero(_np.r_[True, ug[1:] != ug[:-1]])
+    add_zero = first[ut[first] > 0]
+    zero_groups = ug[add_zero]
+    ut = _np.insert(ut, add_zero, 0.0)
+    ug = _np.insert(ug, add_zero, zero_groups)
+    deaths = _np.insert(deaths, add_zero, 0.0)
+    at_risk = _np.insert(at_risk, add_zero, size[zero_groups])
+    first = _np.flatnonzero(_np.r_[True, ug[1:] != ug[:-1]])
+    with _np.errstate(divide="ignore", invalid="ignore"):
+        log_terms = _np.log(at_risk - deaths) - _np.log(at_risk)
+        var_terms = deaths / (at_risk * (at_risk - deaths))
+        var_terms[_np.isinf(var_terms)] = 0
+        # cumulated within groups
+        log_estimate = _pd.Series(log_terms).groupby(ug).cumsum().to_numpy()
+        variance = _pd.Series(var_terms).groupby(ug).cumsum().to_numpy()
+        estimate = _np.exp(log_estimate)
+        z = _norm.ppf(1 - alpha / 2)
+        v = _np.log(estimate)
+        half_width = z * _np.sqrt(variance) / v
+        lower = _np.exp(-_np.exp(_np.log(-v) - half_width))
+        upper = _np.exp(-_np.exp(_np.log(-v) + half_width))
+    lower[_np.isnan(lower)] = 1.0
+    upper[_np.isnan(upper)] = 1.0
+    return {"group": ug, "time": ut, "Estimate": estimate,
+            "Lower": lower, "Upper": upper, "first": first}
+
+
+def _km_quantiles(table: dict[str, _np.ndarray],
+                  quantiles: list[float]) -> dict[str, _np.ndarray]:
+    """Times when estimates and bounds of each group reach the quantiles
+    (first time at or below them, inf if never), as lifelines'
+    qth_survival_times: arrays of (group, quantile) rows"""
+    quantiles = _np.asarray(quantiles, dtype=float).reshape(-1)
+    if not ((quantiles <= 1).all() and (quantiles >= 0).all()):
+        msg = "q must be between 0 and 1"
+        raise ValueError(msg)
+    first, times = table["first"], table["time"]
+    nrows = len(times)
+    rows = _np.arange(nrows)
+    rval = {"group": _np.repeat(table["group"][first], len(quantiles)),
+            "Quantile": _np.tile(quantiles, len(first))}
+    for col in ["Estimate", "Lower", "Upper"]:
+        reached = _np.empty((len(first), len(quantiles)))
+        for j, q in enumerate(quantiles):
+            idx = _np.where(table[col] <= q, rows, nrows)
+            at = _np.minimum.reduceat(idx, first)
+            reached[:, j] = _np.where(at < nrows, times[_np.minimum(at, nrows - 1)],
+                                      _np.inf)
+        rval[col] = reached.reshape(-1)
+    return rval
+
+
+def _km_data(time, status, group=None):
+    """time/status (and group) data frame without missing values, and
+    group categories (with a warning if some were removed)"""
+    if group is None:
+        return _pd.DataFrame({"time": time, "status": status}).dropna(), None
+    try:
+        categs = group.cat.categories.to_list()
+    except AttributeError:
+        msg = f"Group must be a pandas categorical variable: now {group.dtype}"
+        raise AttributeError(msg)
+
+    if len(categs) < 2:
+        msg = "Group must have at least two categories."
+        raise Exception(msg)
+
+    df = _pd.DataFrame({
+        "time": time,
+        "status": status,
+        "group": group}).dropna()
+    df["group"] = df.group.cat.remove_unused_categories()
+    new_categs = df.group.cat.categories.to_list()
+
+    if len(new_categs) < len(categs):
+        removed_categ = set(categs) - set(new_categs)
+        removed_categ_str = ", ".join(removed_categ)
+        msg = "Some categories were removed due" \
+            f" to missingness: {removed_categ_str}."
+        _warn(msg)
+    return df, new_categs
+
+
+def _km_results(df: _pd.DataFrame, categs: list | None,
+                quantiles: list[float], alpha: float = 0.05):
+    """Estimates (a DataFrame, or a dict of them by group) and quantiles of
+    the Kaplan-Meier curves of df (see _km_data)"""
+    codes = (_np.zeros(len(df), dtype=_np.intp) if categs is None
+             else df["group"].cat.codes.to_numpy().astype(_np.intp))
+    table = _km_table(df["time"].to_numpy(dtype=float),
+                      # any nonzero status is an event, as in lifelines
+                      (df["status"].to_numpy(dtype=float) != 0).astype(float),
+                      codes, alpha)
+    quants = _km_quantiles(table, quantiles)
+    cols = ["time", "Estimate", "Lower", "Upper"]
+    bounds = list(table["first"][1:]) + [len(table["time"])]
+    estimates = {}
+    for begin, end in zip(table["first"], bounds):
+        categ = None if categs is None else categs[table["group"][begin]]
+        estimates[categ] = _pd.DataFrame({c: table[c][begin:end] for c in cols})
+    nq = len(quants["Quantile"]) // len(estimates)
+    quant = _pd.DataFrame({c: quants[c] for c in ["Quantile", "Estimate",
+                                                   "Lower", "Upper"]},
+                          index=_np.tile(_np.arange(nq), len(estimates)))
+    if categs is None:
+        return estimates[None], quant
+    quant.insert(0, "Group", [categs[g] for g in quants["group"]])
     return estimates, quant
 
 
+def km_estimates(time, status, group=None, quantiles=[0.5], alpha=0.05):
+    """Kaplan-Meier estimates and quantiles (as km, without fitting,
+    plotting or testing anything).
+
+    All the groups are estimated at once, with vectorized operations on
+    the data sorted by group and time: much faster than km with many
+    groups or many calls.
+
+    Parameters
+    ----------
+    time: time
+        the time
+    status: dichotomic
+        the event indicator
+    group: categorical variable
+        a grouping variable used to create different survival groups/function
+    quantiles: list[float]
+         list of quantiles of survival function to be returned (def: median)
+    alpha: float
+         confidence intervals level is 1 - alpha (exponential Greenwood)
+
+    Returns
+    -------
+    dict
+        "estimates" (a DataFrame, or a dict of them by group) and
+        "quantiles"
+
+    Examples
+    --------
+    >>> import pylbmisc as lb
+    >>> ov = lb.datasets.load("ovarian")
+    >>> km_estimates(ov.survtime, ov.surv)["quantiles"]
+       Quantile  Estimate  Lower  Upper
+    0       0.5     689.0  598.0  767.0
+    """
+    df, categs = _km_data(time, status, group)
+    estimates, quants = _km_results(df, categs, quantiles, alpha)
+    return {"estimates": estimates, "quantiles": quants}
+
+
+def _km_fits(df: _pd.DataFrame, categs: list | None, label: str = "KM_estimate"):
+    """lifelines Kaplan-Meier fits of df (see _km_data), as a dict by group
+    ({None: fit} for a single curve)"""
+    from lifelines import KaplanMeierFitter as _KaplanMeierFitter
+
+    if categs is None:
+        return {None: _KaplanMeierFitter().fit(df["time"], df["status"])}
+    fits = {}
+    for categ in categs:
+        kmf = _KaplanMeierFitter(label=label)
+        mask = df["group"] == categ
+        fits[categ] = kmf.fit(df.loc[mask, "time"],
+                              df.loc[mask, "status"],
+                              label=str(categ))
+    return fits
+
+
+def _km_draw(fig, ax, fits: dict, lr=None,
+             plot_censored=True,
+             plot_censored_style={"ms": 5,  "marker": "|"},
+             plot_legend_loc=None,
+             plot_logrank=True,
+             ylim=(-0.05, 1.05),
+             ylab="Survival probability",
+             xlab="Time",
+             counts=["Events"],
+             xticks=None,
+             ci_alpha=0.3):
+    """Kaplan-Meier plot of fits (see _km_fits) on ax: only fig and ax are
+    used, never the pyplot state, so fig can be a plain Agg Figure"""
+    from lifelines.plotting import add_at_risk_counts as _add_at_risk_counts
+
+    single = list(fits) == [None]
+    # https://lifelines.readthedocs.io/en/latest/fitters/univariate/KaplanMeierFitter.html
+    for fit in fits.values():
+        fit.plot_survival_function(
+            ax=ax,
+            show_censors=plot_censored,
+            censor_styles=plot_censored_style,
+            loc=xticks,
+            ci_alpha=ci_alpha)
+    ax.set_ylim(ylim)
+    ax.set_ylabel(ylab)
+    ax.set_xlabel(xlab)
+    # legend: avoid by default for 1 group, best for more than 1 group
+    if plot_legend_loc is None and not single:
+        lgnd = ax.legend(loc="best")
+    elif (plot_legend_loc is None or plot_legend_loc == "none"):
+        lgnd = ax.legend()
+        lgnd.set_visible(False)
+    elif (plot_legend_loc == "outside"):
+        lgnd = ax.legend(bbox_to_anchor=(1, 1), loc="upper left")
+    else:
+        lgnd = ax.legend(loc=plot_legend_loc)
+    if plot_logrank and lr is not None:
+        lr_string = (f"logr: {lr.test_statistic:.3f}, "
+                     f"df: {lr.degrees_of_freedom}, "
+                     f"p: {_p_format(lr.p_value)}")
+        ax.set_title(lr_string)
+    # number at risk
+    if counts:
+        _add_at_risk_counts(*list(fits.values()),
+                            labels=["All"] if single else None,
+                            rows_to_show=counts,
+                            ax=ax, fig=fig)
+        fig.tight_layout()
+
+
 def km(time,
        status,
        group=None,
@@ -47,7 +280,8 @@ def km(time,
        counts=["Events"],
        xticks=None,
        ci_alpha=0.3,
-       quantiles=[0.5]):
+       quantiles=[0.5],
+       return_fits=False):
     """Kaplan-Meier estimates, logrank test and Hazard ratios.
 
     Does the Kaplan-Meier plot with logrank
@@ -88,6 +322,10 @@ def km(time,
          shading (alpha) for confidence interval  (set to 0 for no CI)
     quantiles: list[float]
          list of quantiles of survival function to be returned (def: median)
+    return_fits: bool
+         return the lifelines KaplanMeierFitter fits (as "fit") even if
+         not plotting: estimates are computed without them (see
+         km_estimates), fits are made only for plots or if asked here
 
     Returns
     -------
@@ -95,93 +333,43 @@ def km(time,
         dict with some results
 
     """
-    if plot:
-        fig, ax = _plt.subplots()
-        plot_at_risk = bool(counts)
+    from lifelines import CoxPHFitter as _CoxPHFitter
+    from lifelines.statistics import multivariate_logrank_test \
+        as _multivariate_logrank_test
+
+    plot_kwargs = {
+        "plot_censored": plot_censored,
+        "plot_censored_style": plot_censored_style,
+        "plot_legend_loc": plot_legend_loc,
+        "plot_logrank": plot_logrank,
+        "ylim": ylim,
+        "ylab": ylab,
+        "xlab": xlab,
+        "counts": counts,
+        "xticks": xticks,
+        "ci_alpha": ci_alpha}
     if group is None:  # --------------------single curve --------------------
-        kmf = _KaplanMeierFitter()
-        df = _pd.DataFrame({"time": time, "status": status}).dropna()  # handle
-        fit = kmf.fit(df["time"], df["status"])
-        estimates, quants = _estquant(fit, quantiles)
+        df, _ = _km_data(time, status)  # handle
+        estimates, quants = _km_results(df, None, quantiles)
+        rval = {}
+        if plot or return_fits:
+            fits = _km_fits(df, None)
+            rval["fit"] = fits[None]
         if plot:
-            # https://lifelines.readthedocs.io/en/latest/fitters/univariate/KaplanMeierFitter.html
-            ax = fit.plot_survival_function(
-                loc=xticks,
-                show_censors=plot_censored,
-                censor_styles=plot_censored_style,
-                ci_alpha=ci_alpha)
-            ax.set_ylim(ylim)
-            ax.set_ylabel(ylab)
-            ax.set_xlabel(xlab)
-            # legend: avoid by default for 1 group
-            if (plot_legend_loc is None or plot_legend_loc == "none"):
-                lgnd = ax.legend()
-                lgnd.set_visible(False)
-            elif (plot_legend_loc == "outside"):
-                lgnd = ax.legend(bbox_to_anchor=(1, 1), loc="upper left")
-            else:
-                lgnd = ax.legend(loc=plot_legend_loc)
-            # number at risk
-            if plot_at_risk:
-                _add_at_risk_counts(fit, labels=["All"],
-                                    rows_to_show=counts,
-                                    ax=ax, fig=fig)
-                _plt.tight_layout()
+            import matplotlib.pyplot as _plt
+
+            fig, ax = _plt.subplots()
+            _km_draw(fig, ax, fits, **plot_kwargs)
             fig.show()
-        return {
-            "fit": fit,
+        rval.update({
             "estimates": estimates,
             "quantiles": quants
-        }
+        })
+        return rval
     else:  # ---------------------- several curves ----------------------------
-        try:
-            categs = group.cat.categories.to_list()
-        except AttributeError:
-            msg = f"Group must be a pandas categorical variable: now {group.dtype}"
-            raise AttributeError(msg)
-
-        if len(categs) < 2:
-            msg = "Group must have at least two categories."
-            raise Exception(msg)
-
-        # do fit for all categories
-        fits = {}               # fits
-        estimates = {}          # survival estimates
-        quants = []             # quantiles
-
-        df = _pd.DataFrame({
-            "time": time,
-            "status": status,
-            "group": group}).dropna()
-        df["group"] = df.group.cat.remove_unused_categories()
-        new_categs = df.group.cat.categories.to_list()
-
-        if len(new_categs) < len(categs):
-            removed_categ = set(categs) - set(new_categs)
-            removed_categ_str = ", ".join(removed_categ)
-            msg = "Some categories were removed due" \
-                f" to missingness: {removed_categ_str}."
-            _warn(msg)
+        df, new_categs = _km_data(time, status, group)
+        estimates, quants = _km_results(df, new_categs, quantiles)
 
-        # Kaplan-meier fit and quantiles
-        for categ in new_categs:
-            kmf = _KaplanMeierFitter(label=ylab)
-            mask = df["group"] == categ
-            fits[categ] = f = kmf.fit(df.loc[mask, "time"],
-                                      df.loc[mask, "status"],
-                                      label=categ)
-            e, q = _estquant(f, quantiles)
-            estimates[categ] = e
-            q.insert(0, "Group", categ)
-            quants.append(q)
-            if plot:
-                kmf.plot_survival_function(
-                    ax=ax,
-                    show_censors=plot_censored,
-                    censor_styles=plot_censored_style,
-                    loc=xticks,
-                    ci_alpha=ci_alpha)
-        quants = _pd.concat(quants)
         # lograng test
         lr = _multivariate_logrank_test(df["time"], df["group"], df["status"])
         # Cox HR:
@@ -202,43 +390,150 @@ def km(time,
                             how="left")
         cox_res.iloc[0, 1] = 1 # HR for base group
         
+        rval = {}
+        if plot or return_fits:
+            # Kaplan-meier fits (for plotting and returned)
+            fits = _km_fits(df, new_categs, label=ylab)
+            rval["fit"] = fits
+
         # plotting
         if plot:
-            ax.set_ylim(ylim)
-            ax.set_ylabel(ylab)
-            ax.set_xlabel(xlab)
-
-            # legend: by default best for more than 1 group
-            if (plot_legend_loc is None):
-                lgnd = ax.legend(loc="best")
-            elif ("none" == plot_legend_loc):
-                lgnd = ax.legend()
-                lgnd.set_visible(False)
-            elif ("outside" == plot_legend_loc):
-                lgnd = ax.legend(bbox_to_anchor=(1, 1), loc="upper left")
-            else:
-                lgnd = ax.legend(loc=plot_legend_loc)
-            # number at ris
-            if plot_at_risk:
-                _add_at_risk_counts(*list(fits.values()),
-                                    rows_to_show=counts,
-                                    ax=ax, fig=fig)
-                _plt.tight_layout()
-
-            if plot_logrank:
-                lr_string = (f"logr: {lr.test_statistic:.3f}, "
-                             f"df: {lr.degrees_of_freedom}, "
-                             f"p: {_p_format(lr.p_value)}")
-                ax.set_title(lr_string)
+            import matplotlib.pyplot as _plt
+
+            fig, ax = _plt.subplots()
+            _km_draw(fig, ax, fits, lr, **plot_kwargs)
             fig.show()
 
-        return {
-            "fit": fits,
+        rval.update({
             "estimates": estimates,
             "quantiles": quants,
             "logrank": lr,
             "hr": cox_res
-        }
+        })
+        return rval
+
+
+def _km_plot_worker(df: _pd.DataFrame, categs: list | None,
+                    paths: list[str], plot_kwargs: dict):
+    """Kaplan-Meier plot of df (see _km_data) saved to paths, drawn on a
+    figure with an Agg canvas (no pyplot, no interactive backend)"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as _FigureCanvasAgg
+    from matplotlib.figure import Figure as _Figure
+
+    lr = None
+    if categs is not None and plot_kwargs.get("plot_logrank", True):
+        from lifelines.statistics import multivariate_logrank_test \
+            as _multivariate_logrank_test
+
+        lr = _multivariate_logrank_test(df["time"], df["group"], df["status"])
+    fits = _km_fits(df, categs, label=plot_kwargs.get("ylab", "KM_estimate"))
+    fig = _Figure()
+    _FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    _km_draw(fig, ax, fits, lr, **plot_kwargs)
+    for path in paths:
+        fig.savefig(path)
+
+
+def km_many(df: _pd.DataFrame,
+            time: str,
+            status: str,
+            groups: list[str | None] = [None],
+            quantiles: list[float] = [0.5],
+            alpha: float = 0.05,
+            plot_dir: str | None = None,
+            plot_formats: list[str] = ["png"],
+            max_workers: int | None = None,
+            **plot_kwargs):
+    """Kaplan-Meier estimates and quantiles for many groupings of the same
+    data (batch version of km).
+
+    Estimates are computed as km_estimates does, with no figure and no
+    fit objects. If plot_dir is given, the plots (as km does them) are
+    saved there as km_<group>.<format> (km.<format> for the curve of all
+    the observations): they're drawn on non-interactive Agg figures, in
+    worker processes.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        the data
+    time: str
+        name of the time variable
+    status: str
+        name of the event indicator
+    groups: list
+        names of the categorical variables to group by (None: a single
+        curve for all the observations)
+    quantiles: list[float]
+         list of quantiles of survival function to be returned (def: median)
+    alpha: float
+         confidence intervals level is 1 - alpha
+    plot_dir: str or None
+        directory where plots are saved (None: no plots)
+    plot_formats: list[str]
+        formats/extensions of the plots
+    max_workers: int or None
+        number of plots drawn at once (None: number of cpus, 1: no worker
+        processes)
+    **plot_kwargs:
+        plotting parameters of km (eg xlab, counts, ci_alpha)
+
+    Returns
+    -------
+    dict
+        by group, a dict as km_estimates returns (with the paths of the
+        files in "plots", if any)
+
+    Examples
+    --------
+    >>> import pylbmisc as lb
+    >>> ov = lb.datasets.load("ovarian")
+    >>> ov["histo"] = lb.dm.to_categorical(ov.histo_cl)
+    >>> res = km_many(ov, "survtime", "surv", groups=[None, "histo"])
+    >>> res["histo"]["quantiles"]
+            Group  Quantile  Estimate  Lower  Upper
+    0      serous       0.5     788.0  668.0  941.0
+    0  not serous       0.5     533.0  461.0  665.0
+    """
+    import inspect as _inspect
+    from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+    from os import cpu_count as _cpu_count
+    from pathlib import Path as _Path
+
+    unknown = (set(plot_kwargs) - set(_inspect.signature(_km_draw).parameters)
+               | {"fig", "ax", "fits", "lr"}.intersection(plot_kwargs))
+    if unknown:
+        msg = f"Unknown plotting parameters: {', '.join(sorted(unknown))}."
+        raise ValueError(msg)
+    rval = {}
+    plots = []
+    for group in groups:
+        df_km, categs = _km_data(df[time], df[status],
+                                 None if group is None else df[group])
+        estimates, quants = _km_results(df_km, categs, quantiles, alpha)
+        rval[group] = {"estimates": estimates, "quantiles": quants}
+        if plot_dir is not None:
+            fname = "km" if group is None else f"km_{_fix_varnames(str(group))}"
+            paths = [str(_Path(plot_dir) / f"{fname}.{ext}")
+                     for ext in plot_formats]
+            rval[group]["plots"] = paths
+            plots.append((df_km, categs, paths))
+    if plots:
+        _Path(plot_dir).mkdir(parents=True, exist_ok=True)
+        workers = max_workers if max_workers is not None else _cpu_count() or 1
+        # in process for a single plot, at most a worker for each one
+        workers = min(workers, len(plots))
+        if workers > 1:
+            with _ProcessPoolExecutor(max_workers=workers) as ex:
+                futures = [ex.submit(_km_plot_worker, *plot, plot_kwargs)
+                           for plot in plots]
+                for future in futures:
+                    future.result()
+        else:
+            for plot in plots:
+                _km_plot_worker(*plot, plot_kwargs)
+    return rval
 
 
 # --------------------------------------------------------------------------------------
@@ -455,6 +750,8 @@ def coxph(df, time, status, formula, **kwargs):
          DataFrame with the estimated model's HR, ci and pretty printed p-values.
 
     """
+    from lifelines import CoxPHFitter as _CoxPHFitter
+
     cph = _CoxPHFitter()
     cph.fit(df=df,
             duration_col=time,
@@ -506,11 +803,10 @@ def median_fup(time, status, group=None):
     0      serous       0.5  9.637235  9.029432  10.234086
     0  not serous       0.5  9.366188  8.295688  10.390144
     """
-    km_res = km(
+    km_res = km_estimates(
         time=time,
         status=1-status,
         group=group,
-        plot=False,
         quantiles=[0.5]
     )
     return km_res["quantiles"]
@@ -1,9 +1,12 @@
+import pickle
+import tempfile
 import unittest
 import pandas as pd
 import numpy as np
 from pylbmisc.dm import to_bool, to_integer, to_numeric, to_datetime, \
     to_date, to_categorical, to_noyes, to_sex, to_recist, to_other_specify, \
-    to_string
+    to_string, pii_scan, Coercer, identity, fix_varnames, CoercionPlan, \
+    extract_dates, group_prog_id, dump_unique_values, diff_unique_values
 
 
 class TestDMFunctions(unittest.TestCase):
@@ -39,6 +42,19 @@ class TestDMFunctions(unittest.TestCase):
         result = to_numeric(series)
         pd.testing.assert_series_equal(result, expected)
 
+    def test_to_numeric_arrow(self):
+        series = pd.Series([" 1 ", "+2", "-3", "a", "", np.nan], dtype="string[pyarrow]")
+        expected = pd.Series([1, 2, -3, pd.NA, pd.NA, pd.NA], dtype="int64[pyarrow]")
+        pd.testing.assert_series_equal(to_numeric(series), expected)
+        pd.testing.assert_series_equal(to_integer(series), expected.astype("Int64"))
+        series = pd.Series(["1", "2,5", "-.5e1", "1e400", "", np.nan])
+        expected = pd.Series([1., 2.5, -5., pd.NA, pd.NA, pd.NA], dtype="float64[pyarrow]")
+        pd.testing.assert_series_equal(to_numeric(series), expected)
+        # pandas fallback
+        series = pd.Series(["inf", "1", np.nan])
+        expected = pd.Series([np.inf, 1., pd.NA], dtype="float64[pyarrow]")
+        pd.testing.assert_series_equal(to_numeric(series), expected)
+
     def test_to_datetime(self):
         series = pd.Series(["2020-01-01", "2021-01-01", "2022-01-01", "", np.nan])
         expected = pd.to_datetime(pd.Series(["2020-01-01", "2021-01-01", "2022-01-01", pd.NaT, pd.NaT]))
@@ -51,6 +67,24 @@ class TestDMFunctions(unittest.TestCase):
         result = to_date(series)
         pd.testing.assert_series_equal(result, expected)
 
+    def test_extract_dates(self):
+        series = pd.Series(["il 2020-01-02", np.nan, 3, "garbage", "", "01/02/2020"],
+                           name="d")
+        expected = pd.Series(pd.to_datetime(["2020-01-02", pd.NaT, pd.NaT, pd.NaT,
+                                             pd.NaT, "2020-01-02"]), name="d")
+        pd.testing.assert_series_equal(extract_dates(series), expected)
+
+    def test_extract_dates_dominant_format(self):
+        # ambiguous dates follow the most common format of the column
+        series = pd.Series(["13/02/2020", "25/12/2020", "01/02/2020", "2020-03-04"])
+        expected = pd.Series(pd.to_datetime(["2020-02-13", "2020-12-25",
+                                             "2020-02-01", "2020-03-04"]))
+        pd.testing.assert_series_equal(extract_dates(series), expected)
+        series = pd.Series(["13/02/2020", "01/02/2020", "01/02/2020", "03/04/2020"])
+        expected = pd.Series(pd.to_datetime(["2020-02-13", "2020-01-02",
+                                             "2020-01-02", "2020-03-04"]))
+        pd.testing.assert_series_equal(extract_dates(series), expected)
+
     def test_to_categorical(self):
         series = pd.Series(["A", "B", "A", "C", "", np.nan])
         expected = pd.Categorical(["A", "B", "A", "C", pd.NA, pd.NA])
@@ -85,6 +119,11 @@ class TestDMFunctions(unittest.TestCase):
                                   categories=["foo", "bar", "baz"])
         result = to_other_specify(series)
         pd.testing.assert_extension_array_equal(result, expected)
+        # equal values of different types are kept apart
+        series = pd.Series([3, 3.0, "Foo ", "foo", 3.0])
+        expected = pd.Categorical(["3", "3.0", "foo", "foo", "3.0"],
+                                  categories=["3.0", "foo", "3"])
+        pd.testing.assert_extension_array_equal(to_other_specify(series), expected)
 
     def test_to_string(self):
         series = pd.Series([1, 2, 3, 4, np.nan]).astype("Int32")
@@ -92,5 +131,131 @@ class TestDMFunctions(unittest.TestCase):
         result = to_string(series)
         pd.testing.assert_series_equal(result, expected)
 
+    def test_pii_scan(self):
+        df = pd.DataFrame({
+            "cognome": ["brazorv", "gigetti", "ginetti"],
+            "mail": [np.nan, "lgasd@asdkj.com", "aaaa"],
+            "fc": ["nrgasd12h05h987z", "aaaa", "eee"],
+            "num": ["0654-6540123", "aa", pd.NA],
+            "cel": ["3921231231", "aa", "eee"],
+            "id": [1, 2, 3]
+        })
+        expected = pd.DataFrame({
+            "column": ["cognome", "mail", "fc", "num", "cel"],
+            "kind": ["surname", "email", "fiscal_code", "telephone", "mobile"],
+            "hits": pd.array([pd.NA, 1, 1, 1, 1], dtype="Int64"),
+            "rows": [[], [1], [0], [0], [0]]
+        })
+        result = pii_scan(df)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_pii_scan_sample(self):
+        mail = pd.Series(["aaaa"] * 5000 + ["lgasd@asdkj.com"],
+                         dtype="string[pyarrow]")
+        df = pd.DataFrame({"mail": mail, "other": mail.str.upper().str[:1]})
+        full = pii_scan(df, stop_early=False)
+        sampled = pii_scan(df, sample_size=100, seed=1, chunksize=1000)
+        pd.testing.assert_frame_equal(sampled, full)
+        self.assertEqual(full["rows"].to_list(), [[5000]])
+
+    def test_coercer_n_jobs(self):
+        raw = pd.DataFrame({
+            "idx": [1., 2., "3,0", "", np.nan],
+            "untouched": ["a", "b", "c", "d", "e"],
+            "sex": ["m", "maschio", "f", "", np.nan],
+            "other": ["b", "b", "a", "", np.nan],
+        })
+        directives = {to_integer: ["idx"], to_sex: ["sex"], identity: ["other"]}
+        coercer = Coercer(raw, fv=directives, verbose=False)
+        serial = coercer.coerce()
+        self.assertEqual(serial.columns.to_list(), raw.columns.to_list())
+        for executor in ["thread", "process"]:
+            parallel = coercer.coerce(n_jobs=2, executor=executor)
+            pd.testing.assert_frame_equal(parallel, serial)
+        kept = coercer.coerce(keep_coerced_only=True, n_jobs=2)
+        self.assertEqual(kept.columns.to_list(), ["idx", "sex", "other"])
+        # input data is never modified
+        serial.loc[0, "other"] = "z"
+        serial.loc[0, "untouched"] = "z"
+        self.assertEqual(raw.loc[0, "other"], "b")
+        self.assertEqual(raw.loc[0, "untouched"], "a")
+
+    def test_no_copy(self):
+        raw = pd.DataFrame({"A x": [1., 2., 3.], "B": ["1", "2", ""]})
+        renamed = fix_varnames(raw, copy=False)
+        self.assertEqual(renamed.columns.to_list(), ["a_x", "b"])
+        self.assertTrue(np.shares_memory(renamed["a_x"].to_numpy(),
+                                         raw["A x"].to_numpy()))
+        coerced = Coercer(raw, fv={to_integer: ["B"]}, verbose=False).coerce(copy=False)
+        self.assertTrue(np.shares_memory(coerced["A x"].to_numpy(),
+                                         raw["A x"].to_numpy()))
+        copied = Coercer(raw, fv={to_integer: ["B"]}, verbose=False).coerce(copy=True)
+        self.assertFalse(np.shares_memory(copied["A x"].to_numpy(),
+                                          raw["A x"].to_numpy()))
+
+    def test_coercer_diagnostics(self):
+        raw = pd.DataFrame({
+            "idx": ["1", "a", "a", "b", "", np.nan],
+            "ok": ["1", "2", "3", "4", "5", np.nan],
+        })
+        coercer = Coercer(raw, fv={to_integer: ["idx", "ok"]}, verbose=False)
+        coercer.coerce(max_values=2)
+        expected = pd.DataFrame({
+            "variable": ["idx", "idx"],
+            "new_na": [4, 4],
+            "value": ["a", "b"],
+            "count": [2, 1],
+        })
+        pd.testing.assert_frame_equal(coercer.diagnostics, expected)
+
+    def test_coercion_plan(self):
+        raw = pd.DataFrame({
+            "idx": [1., 2., "3,0", "", np.nan],
+            "pop": ["1,5", "2.5", "a", "", np.nan],
+            "num": [1.5, 2., 3., 4., np.nan],
+            "sex": ["m", "maschio", "f", "", np.nan],
+        })
+        directives = {to_integer: ["idx"], to_numeric: ["pop", "num"], to_sex: ["sex"]}
+        expected = Coercer(raw, fv=directives, verbose=False).coerce()
+        plan = CoercionPlan(directives, schema=raw, verbose=False)
+        plan = pickle.loads(pickle.dumps(plan))
+        for df in [raw, raw.iloc[::-1]]:  # reused on several DataFrames
+            result = plan.coerce(df)
+            pd.testing.assert_frame_equal(result, expected.loc[df.index])
+        with self.assertRaises(ValueError):
+            plan.coerce(raw.assign(idx=1))
+        with self.assertRaises(ValueError):
+            CoercionPlan({to_sex: ["num"]}, schema=raw)
+
+    def test_group_prog_id(self):
+        series = pd.Series(["a", "b", "a", pd.NA, "a"], index=[5, 4, 3, 2, 1])
+        expected = pd.Series([1, 1, 2, pd.NA, 3], index=series.index, dtype="Int64")
+        pd.testing.assert_series_equal(group_prog_id(series), expected)
+        df = pd.DataFrame({"center": [1, 1, 2, 1, 1],
+                           "id": ["x", "x", "x", "y", "x"],
+                           "visit": pd.to_datetime(["2020-03-01", "2020-01-01", "2020-01-01",
+                                                    "2020-01-01", None])})
+        expected = pd.Series([2, 1, 1, 1, 3], dtype="Int64")
+        pd.testing.assert_series_equal(group_prog_id(df, sort_by="visit"), expected)
+
+    def test_dump_unique_values(self):
+        old = pd.DataFrame({"x": ["a", "b", "a", np.nan], "y": [3, 1, 2, 1]})
+        new = old.assign(x=["a", "c", "c", "c"])
+        with tempfile.TemporaryDirectory() as tmp:
+            snap = dump_unique_values(old, f"{tmp}/uniq.txt", max_values=2,
+                                      chunksize=3, snapshot=f"{tmp}/uniq.parquet")
+            self.assertEqual(snap["frames"]["df"]["x"]["values"], ["a", "b"])
+            self.assertEqual(snap["frames"]["df"]["x"]["n_missing"], 1)
+            self.assertEqual(snap["frames"]["df"]["y"]["values"], [1, 2])
+            self.assertTrue(snap["frames"]["df"]["y"]["truncated"])
+            approx = dump_unique_values(old, f"{tmp}/uniq.txt", approx=True)
+            self.assertEqual(approx["frames"]["df"]["y"]["n_distinct"], 3)
+            diff = diff_unique_values(f"{tmp}/uniq.parquet",
+                                      dump_unique_values(new, f"{tmp}/uniq.txt"))
+        self.assertEqual(diff["change"].to_list(),
+                         ["n_missing", "new values", "dropped values"])
+        self.assertEqual(diff["new"].to_list(), [0, ["c"], ["b"]])
+
+
 if __name__ == "__main__":
     unittest.main()
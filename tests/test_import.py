@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import unittest
+
+# cumulative `python -X importtime` budget (microseconds) for a bare
+# `import pylbmisc`: submodules are lazy, so this should be tiny
+IMPORT_BUDGET_US = 100_000
+HEAVY_MODULES = ["matplotlib", "lifelines", "scipy", "pyarrow.csv",
+                 "pyarrow.parquet"]
+
+
+def _run(code, *flags):
+    return subprocess.run([sys.executable, *flags, "-c", code],
+                          capture_output=True, text=True, check=True)
+
+
+class TestImport(unittest.TestCase):
+
+    def test_import_time_budget(self):
+        res = _run("import pylbmisc", "-X", "importtime")
+        cumulative = None
+        for line in res.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            fields = [f.strip() for f in line.split("|")]
+            if len(fields) == 3 and fields[2] == "pylbmisc":
+                cumulative = int(fields[1])
+        self.assertIsNotNone(cumulative)
+        self.assertLess(cumulative, IMPORT_BUDGET_US)
+
+    def test_import_is_lazy(self):
+        code = ("import sys, pylbmisc; "
+                "print(' '.join(m for m in ['pandas', 'pyarrow'] + %r "
+                "if m in sys.modules))" % HEAVY_MODULES)
+        self.assertEqual(_run(code).stdout.strip(), "")
+
+    def test_heavy_dependencies_are_deferred(self):
+        code = ("import sys, pylbmisc as lb; lb.dm, lb.io, lb.stats, "
+                "lb.surv, lb.fig; "
+                "print(' '.join(m for m in %r if m in sys.modules))"
+                % HEAVY_MODULES)
+        self.assertEqual(_run(code).stdout.strip(), "")
+
+    def test_submodule_access(self):
+        import pylbmisc as lb
+        self.assertTrue(callable(lb.dm.to_numeric))
+        self.assertIn("surv", dir(lb))
+        with self.assertRaises(AttributeError):
+            lb.not_a_submodule
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,416 @@
+import datetime
+import json
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+from pathlib import Path
+
+import matplotlib
+import matplotlib.image as mpimg
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from matplotlib.figure import Figure
+from pylbmisc.io import _ArtifactManifest, _latex_render
+from pylbmisc.io import (export_data, export_figure, export_tables, import_data,
+                         import_redcap)
+
+
+def update_manifest(fdir, i):
+    for j in range(20):
+        _ArtifactManifest(fdir).update([f"f{i}_{j}.png"], f"hash{i}")
+
+
+class TestIOFunctions(unittest.TestCase):
+
+    def test_import_data(self):
+        a = pd.DataFrame({"x": [1, 2], "y": ["a", "b"]})
+        b = pd.DataFrame({"z": [1.5, None]})
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            a.to_csv(tmp / "data_a.csv", index=False)
+            b.to_csv(tmp / "data_b.csv", index=False)
+            with zipfile.ZipFile(tmp / "data_zip.zip", "w") as myzip:
+                myzip.write(tmp / "data_a.csv", "inner_a.csv")
+                myzip.write(tmp / "data_b.csv", "inner_b.csv")
+            fpaths = [tmp / "data_a.csv", tmp / "data_b.csv", tmp / "data_zip.zip"]
+            serial = import_data(fpaths, max_workers=1)
+            concurrent = import_data(fpaths, max_workers=4)
+        self.assertEqual(list(serial), ["a", "b", "zip_a", "zip_b"])
+        self.assertEqual(list(concurrent), list(serial))
+        for k, v in serial.items():
+            pd.testing.assert_frame_equal(concurrent[k], v)
+        pd.testing.assert_frame_equal(serial["zip_b"], serial["b"])
+
+    def test_import_data_chunks(self):
+        df = pd.DataFrame({"x": range(10), "y": list("abcde") * 2})
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / "data.csv"
+            df.to_csv(fpath, index=False)
+            expected = import_data(fpath)
+            for engine in ["pandas", "arrow"]:
+                chunks = list(import_data(fpath, engine=engine, chunksize=4))
+                self.assertEqual([len(c) for c in chunks], [4, 4, 2])
+                pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+            pd.testing.assert_frame_equal(import_data(fpath, engine="arrow"), expected)
+
+    def test_import_data_chunks_type_change(self):
+        # a column changing type after the first block arrow reads
+        nrows = 300_000
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / "data.csv"
+            with open(fpath, "w") as f:
+                f.write("x\n" + "\n".join(str(i) for i in range(nrows)) + "\n1.5\n")
+            chunks = list(import_data(fpath, engine="arrow", chunksize=100_000))
+        self.assertEqual([len(c) for c in chunks], [100_000] * 3 + [1])
+        result = pd.concat([c.astype({"x": "float64[pyarrow]"}) for c in chunks])
+        self.assertEqual(result.index.to_list(), list(range(nrows + 1)))
+        self.assertEqual(result["x"].to_list(), list(range(nrows)) + [1.5])
+
+    def test_import_data_chunks_skiprows(self):
+        # leading lines skipped, also when resuming with pandas
+        nrows = 300_000
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / "data.csv"
+            with open(fpath, "w") as f:
+                f.write("title\nexported today\nx,y\n")
+                f.write("\n".join(f"{i},{i % 7}" for i in range(nrows)) + "\n1.5,0\n")
+            chunks = list(import_data(fpath, engine="arrow", chunksize=100_000,
+                                      csv_kwargs={"skiprows": 2}))
+            expected = pd.read_csv(fpath, skiprows=2)
+        self.assertEqual([len(c) for c in chunks], [100_000] * 3 + [1])
+        result = pd.concat([c.astype("float64") for c in chunks])
+        pd.testing.assert_frame_equal(result, expected.astype("float64"))
+
+    def test_import_data_cache(self):
+        df = pd.DataFrame({"x": [1, None], "y": ["a", None], "z": [1.5, 2]})
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath, cache = Path(tmp) / "data.csv", Path(tmp) / "cache"
+            df.to_csv(fpath, index=False)
+            expected = import_data(fpath)
+            cold = import_data(fpath, cache=cache)
+            warm = import_data(fpath, cache=cache)
+            self.assertEqual(len(list(cache.iterdir())), 1)
+            pd.testing.assert_frame_equal(cold, expected)
+            pd.testing.assert_frame_equal(warm, expected)
+            # changed file: cache invalidated
+            df.iloc[::-1].to_csv(fpath, index=False)
+            pd.testing.assert_frame_equal(import_data(fpath, cache=cache),
+                                          import_data(fpath))
+            import_data(fpath, cache=cache, cache_max_size=0)
+            self.assertEqual(list(cache.iterdir()), [])
+
+    def test_import_data_excel_readers(self):
+        a = pd.DataFrame({"x": [1, 2, 3], "y": ["a", None, "c"],
+                          "when": pd.to_datetime(["2020-01-01", None, "2021-06-30"])})
+        b = pd.DataFrame({"z": [1.5, 2.0, None], "w": [True, False, True]})
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / "data.xlsx"
+            with pd.ExcelWriter(fpath) as writer:
+                a.to_excel(writer, sheet_name="a", index=False)
+                b.to_excel(writer, sheet_name="b", index=False)
+            expected = import_data(fpath)
+            stream = import_data(fpath, excel_reader="stream")
+            subset = {reader: import_data(fpath, excel_reader=reader, sheets=[1],
+                                          excel_kwargs={"usecols": "A", "nrows": 2})
+                      for reader in ["pandas", "stream"]}
+        self.assertEqual(list(stream), ["a", "b"])
+        for k, v in expected.items():
+            pd.testing.assert_frame_equal(stream[k], v)
+        pd.testing.assert_frame_equal(subset["stream"], subset["pandas"])
+        self.assertEqual(subset["stream"].to_dict("list"), {"z": [1.5, 2.0]})
+
+    def test_import_redcap(self):
+        data = pd.DataFrame({"record_id": [1, 2, 3],
+                             "sex": [1, 2, None],
+                             "visit": ["2020-01-02", None, "2021-12-31"],
+                             "notes": ["a", "2020-01-01", None],
+                             "smoker___1": [0, 1, 1],
+                             "baseline_complete": [2, 0, 2]})
+        labels = pd.DataFrame({"Record ID": [1, 2, 3],
+                               "Sex": ["Male", "Female", None],
+                               "Visit date": data["visit"],
+                               "Notes": data["notes"],
+                               "Smoker (choice=Current)": ["Unchecked", "Checked", "Checked"],
+                               "Complete?": ["Complete", "Incomplete", "Complete"]})
+        dictionary = pd.DataFrame(
+            [["record_id", "baseline", "", "text", "Record ID", "", "", ""],
+             ["sex", "baseline", "", "radio", "Sex", "2, Female | 1, Male", "", ""],
+             ["visit", "baseline", "", "text", "Visit date", "", "", "date_ymd"],
+             ["notes", "baseline", "", "notes", "Notes", "", "", ""],
+             ["smoker", "baseline", "", "checkbox", "Smoker", "1, Current", "", ""]],
+            columns=["Variable / Field Name", "Form Name", "Section Header",
+                     "Field Type", "Field Label",
+                     "Choices, Calculations, OR Slider Labels", "Field Note",
+                     "Text Validation Type OR Show Slider Number"])
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            data.to_csv(tmp / "DATA.csv", index=False)
+            labels.to_csv(tmp / "LABELS.csv", index=False)
+            dictionary.to_csv(tmp / "DICTIONARY.csv", index=False)
+            inferred, descr = import_redcap(tmp / "DATA.csv", tmp / "LABELS.csv")
+            declared, declared_descr = import_redcap(
+                tmp / "DATA.csv", None, dictionary_fpath=tmp / "DICTIONARY.csv")
+        self.assertEqual(descr, declared_descr)
+        self.assertEqual(inferred["sex"].tolist()[:2], ["Male", "Female"])
+        self.assertTrue(pd.isna(inferred["sex"][2]))
+        self.assertEqual(inferred["visit"].dtype, "datetime64[ns]")
+        self.assertEqual(inferred["notes"].tolist()[:2], ["a", "2020-01-01"])
+        self.assertEqual(inferred["baseline_complete"].tolist(),
+                         ["Complete", "Incomplete", "Complete"])
+        # categories as in the dictionary rather than by code
+        self.assertEqual(list(declared["sex"].cat.categories), ["Female", "Male"])
+        for col in ["visit", "notes", "smoker___1", "baseline_complete"]:
+            self.assertEqual(declared[col].tolist(), inferred[col].tolist())
+
+    def test_import_redcap_conflicting_labels(self):
+        # a raw value with different labels: the label picked is the one of
+        # the row-by-row recoding (unique pairs sorted by raw value, last wins)
+        rng = np.random.default_rng(1)
+        sex = rng.integers(1, 3, 50)
+        labels = np.where(sex == 1, rng.choice(["M", "Maschio"], 50), "F")
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            pd.DataFrame({"sex": sex}).to_csv(tmp / "DATA.csv", index=False)
+            pd.DataFrame({"Sex": labels}).to_csv(tmp / "LABELS.csv", index=False)
+            inferred, _ = import_redcap(tmp / "DATA.csv", tmp / "LABELS.csv")
+            raw = pd.read_csv(tmp / "DATA.csv", dtype_backend="pyarrow")["sex"]
+            rec = pd.read_csv(tmp / "LABELS.csv", dtype_backend="pyarrow")["Sex"]
+        pairs = (pd.DataFrame({"from": raw, "to": rec}).drop_duplicates()
+                 .dropna().sort_values(by="from"))
+        expected = dict(zip(pairs["from"], pairs["to"]))
+        self.assertEqual(inferred["sex"].tolist(), [expected[v] for v in sex])
+
+    def test_export_data_r(self):
+        df = pd.DataFrame({"n": [1.5, None, float("inf")],
+                           "f": pd.Categorical(["a", None, 'b"']),
+                           "d": pd.to_datetime(["2020-01-02", None, "2021-12-31"]),
+                           "s": ['say "hi"', "", "back\\slash"]})
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / "df.R"
+            export_data(df, fpath)
+            lines = fpath.read_text().splitlines()
+        self.assertEqual(lines[:4], [
+            "df <- data.frame(n = c(1.5, NA, Inf),",
+            'f = factor(c(0, NA, 1), levels = c(0, 1), labels = c("a", "b\\"")),',
+            "d = c('2020-01-02', NA, '2021-12-31'),",
+            's = c("say \\"hi\\"", NA, "back\\\\slash"))'])
+
+    def test_export_data_parquet(self):
+        df = pd.DataFrame({"n": [1.5, None, float("inf")],
+                           "f": pd.Categorical(["a", None, 'b"']),
+                           "d": pd.to_datetime(["2020-01-02", None, "2021-12-31"]),
+                           "t": pd.to_datetime(["2020-01-02 10:11:12", None,
+                                                "2021-12-31 00:00:00"]),
+                           "s": ['say "hi"', "", "back\\slash"]})
+        with tempfile.TemporaryDirectory() as tmp:
+            export_data({"a": df}, Path(tmp) / "x", ext=["parquet", "arrow"])
+            parquet = pq.read_table(Path(tmp) / "x_a.parquet")
+            arrow = pa.ipc.open_file(Path(tmp) / "x_a.arrow").read_all()
+            lines = (Path(tmp) / "x_a.parquet.R").read_text().splitlines()
+        self.assertTrue(parquet.equals(arrow))
+        self.assertEqual(parquet.to_pydict(), {
+            "n": [1.5, None, float("inf")],
+            "f": [0, None, 1],
+            "d": [datetime.date(2020, 1, 2), None, datetime.date(2021, 12, 31)],
+            "t": ["2020-01-02 10:11:12", None, "2021-12-31 00:00:00"],
+            "s": ['say "hi"', None, "back\\slash"]})
+        self.assertEqual(lines[:3], [
+            'a <- as.data.frame(arrow::read_parquet("x_a.parquet"));',
+            'a[["f"]] <- factor(a[["f"]], levels = c(0, 1), labels = c("a", "b\\""));',
+            "datevars <- c('d');"])
+        self.assertIn("a[dt_vars] <- lapply(a[dt_vars], imp_dt);", lines)
+
+    def test_export_data_atomic(self):
+        tables = {"a": pd.DataFrame({"x": [1, 2]}),
+                  "b": pd.DataFrame({"x": [1, 2]})}
+        with tempfile.TemporaryDirectory() as tmp:
+            export_data(tables, Path(tmp) / "t", ext=["csv", "R"])
+            before = {f.name: f.read_text() for f in Path(tmp).iterdir()}
+            # timedeltas can't be exported to R: nothing is written
+            tables = {"a": pd.DataFrame({"x": [3, 4]}),
+                      "b": pd.DataFrame({"x": pd.to_timedelta([1, 2], "D")})}
+            with self.assertRaises(ValueError):
+                export_data(tables, Path(tmp) / "t", ext=["csv", "R"])
+            after = {f.name: f.read_text() for f in Path(tmp).iterdir()}
+            self.assertEqual(after, before)
+            export_data(tables["a"], Path(tmp) / "t_a.csv", max_workers=1)
+            self.assertEqual(pd.read_csv(Path(tmp) / "t_a.csv")["x"].tolist(), [3, 4])
+
+    def test_export_data_xlsx_engines(self):
+        df = pd.DataFrame({"n": [1.5, None, float("inf"), 2.0, 3.0],
+                           "f": pd.Categorical(["a", None, "b", "a", "a"]),
+                           "d": pd.to_datetime(["2020-01-02", None, "2021-12-31",
+                                                "2020-01-01", "2020-01-01"]),
+                           "s": ["x", "w", None, "", "z"]})
+        name = "a very long table name, to be truncated"
+        with tempfile.TemporaryDirectory() as tmp:
+            for engine in ["pandas", "openpyxl"]:
+                export_data({name: df}, Path(tmp) / f"{engine}.xlsx",
+                            xlsx_engine=engine)
+            expected = pd.read_excel(Path(tmp) / "pandas.xlsx", None)
+            result = pd.read_excel(Path(tmp) / "openpyxl.xlsx", None)
+            self.assertEqual(list(result), ["a_very_long_table_name_to_be_tr"])
+            for k, v in expected.items():
+                pd.testing.assert_frame_equal(result[k], v)
+            # frames longer than a sheet continue in the following ones
+            with mock.patch("pylbmisc.io._xlsx_max_rows", 3):
+                export_data({name: df}, Path(tmp) / "split.xlsx",
+                            xlsx_engine="openpyxl")
+            result = pd.read_excel(Path(tmp) / "split.xlsx", None)
+        self.assertEqual(list(result), ["a_very_long_table_name_to_be_tr",
+                                        "a_very_long_table_name_to_be_2",
+                                        "a_very_long_table_name_to_be_3"])
+        pd.testing.assert_frame_equal(
+            pd.concat(result.values(), ignore_index=True), expected[k],
+            check_dtype=False)
+
+    def test_export_tables(self):
+        tabs = {"Tab 1": pd.DataFrame({"mean": [1.25, None], "group": ["a_1", "50%"]},
+                                      index=["x", "y"]),
+                "Tab 2": pd.Series([1, 2], index=["a & b", "c"], name="n")}
+        with tempfile.TemporaryDirectory() as tmp:
+            refs = export_tables(tabs, Path(tmp) / "tables.xlsx",
+                                 latex_file=Path(tmp) / "tables.tex")
+            latex = (Path(tmp) / "tables.tex").read_text()
+            sheets = pd.read_excel(Path(tmp) / "tables.xlsx", None)
+        self.assertEqual(refs, [r"\ref{tab:tab_1}", r"\ref{tab:tab_2}"])
+        self.assertEqual(list(sheets), ["tab_1", "tab_2"])
+        self.assertEqual(latex.splitlines()[:11], [
+            r"\begin{table}",
+            r"\caption{Tab 1}",
+            r"\label{tab:tab_1}",
+            r"\begin{tabular}{lrr}",
+            r"\toprule",
+            r" & mean & group \\",
+            r"\midrule",
+            r"x & 1.2 & a\_1 \\",
+            r"y &  & 50\% \\",
+            r"\bottomrule",
+            r"\end{tabular}"])
+        self.assertIn(r"a \& b & 1 \\", latex)
+
+    def test_latex_render_escape(self):
+        # cells escaped as to_latex(escape=True) does
+        tab = pd.DataFrame({"s": ["2020-01-01 [a]", "~ x^y", "a\\b \\ c", "one\ntwo"]},
+                           index=["r-1", "r_2", "r 3", "r4"])
+        latex = _latex_render(tab, label="t", caption="T")
+        self.assertIn(r"r-1 & 2020-01-01 [a] \\", latex)
+        self.assertIn(r"r\_2 & \textasciitilde \space x\textasciicircum y \\", latex)
+        self.assertIn(r"r 3 & a\textbackslash b \textbackslash \space c \\", latex)
+        self.assertIn("r4 & one\ntwo \\\\", latex)
+        try:
+            import jinja2  # noqa: F401
+        except ImportError:
+            return  # to_latex needs jinja2
+        expected = tab.to_latex(na_rep="", index=True, index_names=False,
+                                escape=True, label="tab:t", caption="T",
+                                float_format="%.1f", column_format="lr")
+        self.assertEqual(latex, expected)
+
+    def test_latex_render_keeps_input(self):
+        # multiindex tables are rendered by to_latex (jinja2 might be
+        # missing here), the table given must not be modified
+        index = pd.MultiIndex.from_tuples([("a", "x"), ("a", "y")])
+        tab = pd.DataFrame({"n": [1, 2]}, index=index).rename_axis(columns="stat")
+        with mock.patch.object(pd.DataFrame, "to_latex", autospec=True,
+                               return_value="") as to_latex:
+            _latex_render(tab, label="t")
+        self.assertEqual(tab.columns.name, "stat")
+        self.assertIsNone(to_latex.call_args.args[0].columns.name)
+
+    def test_export_tables_unchanged(self):
+        tabs = {"Tab 1": pd.DataFrame({"mean": [1.25, None]}, index=["x", "y"])}
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [Path(tmp) / "tables.xlsx", Path(tmp) / "tables.tex"]
+
+            def mtimes():
+                return [p.stat().st_mtime_ns for p in paths]
+
+            export_tables(tabs, paths[0], latex_file=paths[1])
+            before = mtimes()
+            refs = export_tables(tabs, paths[0], latex_file=paths[1])
+            self.assertEqual(mtimes(), before)
+            self.assertEqual(refs, [r"\ref{tab:tab_1}"])
+            export_tables(tabs, paths[0], latex_file=paths[1], force=True)
+            forced = mtimes()
+            self.assertTrue(all(f != b for f, b in zip(forced, before)))
+            tabs["Tab 1"].loc["y", "mean"] = 2
+            export_tables(tabs, paths[0], latex_file=paths[1])
+            self.assertTrue(all(c != f for c, f in zip(mtimes(), forced)))
+            self.assertIn(r"y & 2.0 \\", paths[1].read_text())
+            # written by another version: rewritten
+            before = mtimes()
+            with mock.patch("pylbmisc.io._artifacts_version", return_value="new"):
+                export_tables(tabs, paths[0], latex_file=paths[1])
+            self.assertTrue(all(c != b for c, b in zip(mtimes(), before)))
+
+    def test_artifact_manifest_concurrent(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with ProcessPoolExecutor(max_workers=4) as ex:
+                list(ex.map(update_manifest, [tmp] * 4, range(4)))
+            manifest = json.loads((Path(tmp) / ".artifacts.json").read_text())
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()),
+                             [".artifacts.json"])
+        self.assertEqual(manifest["artifacts"],
+                         {f"f{i}_{j}.png": f"hash{i}"
+                          for i in range(4) for j in range(20)})
+
+    def test_export_figure(self):
+        def make_figure(title):
+            fig = Figure()
+            fig.subplots().plot([1, 3, 2])
+            fig.axes[0].set_title(title)
+            return fig
+
+        with tempfile.TemporaryDirectory() as tmp:
+            export_figure(make_figure("a"), tmp, label="f", latex_include=False,
+                          max_workers=2)
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()),
+                             [".artifacts.json", "f.eps", "f.pdf", "f.png"])
+            # png from the agg rendering as savefig writes it
+            fig = make_figure("a")
+            fig.savefig(Path(tmp) / "ref.png", transparent=True)
+            np.testing.assert_array_equal(mpimg.imread(Path(tmp) / "f.png"),
+                                          mpimg.imread(Path(tmp) / "ref.png"))
+            mtimes = {p.name: p.stat().st_mtime_ns for p in Path(tmp).iterdir()}
+            export_figure(fig, tmp, label="f", latex_include=False)
+            self.assertEqual(
+                {p.name: p.stat().st_mtime_ns for p in Path(tmp).iterdir()}, mtimes)
+            export_figure(make_figure("b"), tmp, label="f", latex_include=False,
+                          max_workers=1)
+            changed = {p.name for p in Path(tmp).iterdir()
+                       if p.stat().st_mtime_ns != mtimes[p.name]}
+        self.assertEqual(changed, {".artifacts.json", "f.eps", "f.pdf", "f.png"})
+
+    def test_export_figure_unpicklable(self):
+        from matplotlib.ticker import FuncFormatter
+
+        fig = Figure()
+        ax = fig.subplots()
+        ax.plot([1, 3, 2])
+        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, pos: f"{x:.0f}d"))
+        with tempfile.TemporaryDirectory() as tmp:
+            export_figure(fig, tmp, label="f", latex_include=False, max_workers=2)
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()),
+                             [".artifacts.json", "f.eps", "f.pdf", "f.png"])
+
+    def test_export_figure_savefig_dpi(self):
+        fig = Figure()
+        fig.subplots().plot([1, 3, 2])
+        with tempfile.TemporaryDirectory() as tmp, \
+                matplotlib.rc_context({"savefig.dpi": 200}):
+            export_figure(fig, tmp, label="f", fext=["png", "pdf", "eps"],
+                          latex_include=False, max_workers=2)
+            fig.savefig(Path(tmp) / "ref.png", transparent=True)
+            png = mpimg.imread(Path(tmp) / "f.png")
+            self.assertEqual(png.shape[:2], (960, 1280))
+            np.testing.assert_array_equal(png, mpimg.imread(Path(tmp) / "ref.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+import numpy as np
+import pandas as pd
+from lifelines import KaplanMeierFitter
+from lifelines.utils import qth_survival_times
+from pylbmisc.surv import km, km_estimates, km_many
+
+
+def lifelines_estquant(time, status, quantiles):
+    """Estimates and quantiles as km got them from lifelines"""
+    fit = KaplanMeierFitter().fit(time, status)
+    estimates = pd.concat([fit.survival_function_, fit.confidence_interval_],
+                          axis="columns")
+    quant = qth_survival_times(quantiles, estimates).reset_index()
+    quant.columns = ["Quantile", "Estimate", "Lower", "Upper"]
+    estimates = estimates.reset_index()
+    estimates.columns = ["time", "Estimate", "Lower", "Upper"]
+    return estimates, quant
+
+
+class TestSurvFunctions(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 300
+        # ties, censoring, a group without events and one starting at 0
+        self.time = pd.Series(rng.integers(0, 40, n).astype(float))
+        self.status = pd.Series(rng.integers(0, 2, n))
+        group = rng.choice(["a", "b", "c", "d"], n)
+        self.status[group == "c"] = 0
+        self.time[group == "d"] = np.maximum(self.time[group == "d"] - 10, 0)
+        self.group = pd.Series(pd.Categorical(group))
+        self.quantiles = [0.25, 0.5, 0.75]
+
+    def test_km_estimates(self):
+        res = km_estimates(self.time, self.status, quantiles=self.quantiles)
+        estimates, quant = lifelines_estquant(self.time, self.status,
+                                              self.quantiles)
+        pd.testing.assert_frame_equal(res["estimates"], estimates,
+                                      check_dtype=False)
+        pd.testing.assert_frame_equal(res["quantiles"], quant,
+                                      check_dtype=False)
+
+    def test_km_estimates_grouped(self):
+        res = km_estimates(self.time, self.status, self.group,
+                           quantiles=self.quantiles)
+        self.assertEqual(list(res["estimates"]), ["a", "b", "c", "d"])
+        for categ, result in res["estimates"].items():
+            mask = self.group == categ
+            estimates, quant = lifelines_estquant(self.time[mask],
+                                                  self.status[mask],
+                                                  self.quantiles)
+            pd.testing.assert_frame_equal(result, estimates,
+                                          check_dtype=False)
+            result = res["quantiles"][res["quantiles"]["Group"] == categ]
+            pd.testing.assert_frame_equal(result.drop(columns="Group"), quant,
+                                          check_dtype=False)
+
+    def test_km_estimates_status_and_negative_times(self):
+        # any nonzero status is one event; no time 0 before negative times
+        time = pd.Series([1.0, 1, 2, -1, 0.5, 3, -2, 4])
+        status = pd.Series([2, 1, 0, 1, 0, 2, 0, 1])
+        group = pd.Series(pd.Categorical(list("aaabbbbb")))
+        res = km_estimates(time, status, group, quantiles=self.quantiles)
+        for categ, result in res["estimates"].items():
+            mask = group == categ
+            estimates, quant = lifelines_estquant(time[mask], status[mask] != 0,
+                                                  self.quantiles)
+            self.assertTrue(result["time"].is_monotonic_increasing)
+            pd.testing.assert_frame_equal(result, estimates,
+                                          check_dtype=False)
+        self.assertAlmostEqual(res["estimates"]["a"]["Estimate"][1], 1 / 3)
+
+    def test_km_fits(self):
+        # lifelines fits only for plots or if asked for
+        with mock.patch("lifelines.KaplanMeierFitter.fit") as fit, \
+                warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # cox: a group without events
+            res = km(self.time, self.status, self.group, plot=False)
+            fit.assert_not_called()
+            self.assertNotIn("fit", res)
+        expected = km_estimates(self.time, self.status, self.group)
+        pd.testing.assert_frame_equal(res["quantiles"], expected["quantiles"])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            res = km(self.time, self.status, self.group, plot=False,
+                     return_fits=True)
+        self.assertEqual(list(res["fit"]), ["a", "b", "c", "d"])
+        res = km(self.time, self.status, plot=False, return_fits=True)
+        self.assertIsInstance(res["fit"], KaplanMeierFitter)
+
+    def test_km_many(self):
+        df = pd.DataFrame({"t": self.time, "s": self.status, "g": self.group,
+                           "h": pd.Categorical(self.group.isin(["a", "b"]))})
+        with tempfile.TemporaryDirectory() as tmp:
+            for max_workers in [1, 2]:
+                plot_dir = os.path.join(tmp, str(max_workers))
+                res = km_many(df, "t", "s", groups=[None, "g", "h"],
+                              quantiles=self.quantiles, plot_dir=plot_dir,
+                              plot_formats=["png", "pdf"],
+                              max_workers=max_workers, xlab="Months")
+                self.assertEqual(sorted(os.listdir(plot_dir)),
+                                 ["km.pdf", "km.png", "km_g.pdf", "km_g.png",
+                                  "km_h.pdf", "km_h.png"])
+        for group in [None, "g", "h"]:
+            expected = km_estimates(df.t, df.s,
+                                    None if group is None else df[group],
+                                    quantiles=self.quantiles)
+            pd.testing.assert_frame_equal(res[group]["quantiles"],
+                                          expected["quantiles"])
+        with self.assertRaises(ValueError):
+            km_many(df, "t", "s", plot_dir=tmp, fig=None)
+
+
+if __name__ == "__main__":
+    unittest.main()